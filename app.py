@@ -6,8 +6,12 @@ from werkzeug.security import check_password_hash
 import uuid
 import os
 from datetime import datetime, timedelta
-from utils.database import get_user_by_username, update_last_login, create_session, get_user_groups, get_user_by_id
+from utils.database import get_user_by_username, get_user_groups
 from utils.logging_config import init_dashboard_logging, get_logger
+from utils.metrics import register_metrics
+from utils.query_cache import register_query_memo
+from utils.user_cache import get_user_with_groups
+from utils.write_behind import queue_login
 
 # Initialize logging
 init_dashboard_logging()
@@ -21,6 +25,12 @@ server.config['SESSION_COOKIE_SECURE'] = os.environ.get('ENV', 'development') ==
 server.config['SESSION_COOKIE_HTTPONLY'] = True
 server.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=1)
 
+# Collapse duplicate database reads within a request / page load
+register_query_memo(server)
+
+# Prometheus metrics (connection pool usage etc.) for all workers on /metrics
+register_metrics(server)
+
 # Initialize the Dash app with the Flask server
 app = dash.Dash(
     __name__,
@@ -38,13 +48,13 @@ login_manager.login_view = '/login'
 
 # User class that works with our database
 class User(UserMixin):
-    def __init__(self, user_data):
+    def __init__(self, user_data, groups=None):
         self.id = user_data.get('id')
         self.username = user_data.get('username')
         self.role = user_data.get('role', 'participant')
         
-        # Load groups for user (for participants)
-        self._groups = None
+        # Groups for participants and supervisors, loaded lazily unless given
+        self._groups = groups
         
     @property
     def groups(self):
@@ -77,12 +87,14 @@ class User(UserMixin):
     def display_name(self):
         return self.username
     
-    def check_password(self, password):
-        # Get fresh user data to check password
-        user_data = get_user_by_username(self.username)
-        if user_data:
-            return check_password_hash(user_data['password_hash'], password)
-        return False
+    def check_password(self, password, password_hash=None):
+        # Get fresh user data to check password unless the caller already has it
+        if password_hash is None:
+            user_data = get_user_by_username(self.username)
+            if not user_data:
+                return False
+            password_hash = user_data['password_hash']
+        return check_password_hash(password_hash, password)
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -91,10 +103,10 @@ def load_user(user_id):
         # Convert string ID to integer
         user_id = int(user_id)
         
-        # Get user from database
-        user_data = get_user_by_id(user_id)
+        # Get user and groups, cached across requests
+        user_data, groups = get_user_with_groups(user_id)
         if user_data:
-            return User(user_data)
+            return User(user_data, groups)
         return None
     except Exception as e:
         logger.error(f" loading user: {e}")
@@ -106,9 +118,6 @@ def login_and_create_session(user):
     try:
         login_user(user)
         
-        # Update last login timestamp
-        update_last_login(user.id)
-        
         # Create a session record
         session_token = str(uuid.uuid4())
         expires_at = datetime.now() + timedelta(days=1)
@@ -117,8 +126,8 @@ def login_and_create_session(user):
         ip_address = request.remote_addr
         user_agent = request.user_agent.string
         
-        # Create session in database
-        create_session(user.id, session_token, ip_address, user_agent, expires_at)
+        # Last login and the session row are written in batches off the request
+        queue_login(user.id, session_token, ip_address, user_agent, expires_at)
         
         return True
     except Exception as e:
@@ -11,6 +11,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // - assets/js/login.js: Handles login form interactions
     // - assets/js/sidebar-transitions.js: Manages sidebar toggling and mobile responsiveness
     // - assets/js/responsive-charts.js: Ensures charts resize properly with the layout
+    // - assets/js/lazy-sections.js: Loads participant sections once they scroll into view
     
     // Additional JavaScript functionality can be added here if needed
 });
\ No newline at end of file
@@ -0,0 +1,87 @@
+// Lazy loading of dashboard sections
+// Elements with the "lazy-section" class name a dcc.Store in their
+// data-visible-store attribute. When the section scrolls into view, that store
+// is set to true, which lets the section's callbacks query and render it.
+// Whether a section was already loaded is read from its store, which the
+// lazy.track clientside callback reports here; the DOM node itself can be
+// reused by React after the store was reset to false on navigation.
+(function() {
+    // Start loading a little before the section actually appears
+    const ROOT_MARGIN = '200px 0px';
+
+    // Last value of each *-section-visible store
+    const storeValues = {};
+
+    function markVisible(section) {
+        const storeId = section.getAttribute('data-visible-store');
+        if (!storeId || storeValues[storeId]) {
+            return;
+        }
+        if (!window.dash_clientside || !window.dash_clientside.set_props) {
+            // Dash renderer not ready yet - the next DOM change retries
+            return;
+        }
+        storeValues[storeId] = true;
+        window.dash_clientside.set_props(storeId, {data: true});
+    }
+
+    const observer = 'IntersectionObserver' in window
+        ? new IntersectionObserver(function(entries) {
+            entries.forEach(function(entry) {
+                if (entry.isIntersecting) {
+                    markVisible(entry.target);
+                    observer.unobserve(entry.target);
+                    const storeId = entry.target.getAttribute('data-visible-store');
+                    if (!storeValues[storeId]) {
+                        // Observed again (and re-checked) on the next DOM change
+                        entry.target.removeAttribute('data-lazy-observed');
+                    }
+                }
+            });
+        }, {rootMargin: ROOT_MARGIN})
+        : null;
+
+    function watchSections() {
+        document.querySelectorAll('.lazy-section').forEach(function(section) {
+            if (storeValues[section.getAttribute('data-visible-store')]) {
+                return;
+            }
+            if (!observer) {
+                // No IntersectionObserver support: load everything at once
+                markVisible(section);
+            } else if (!section.hasAttribute('data-lazy-observed')) {
+                section.setAttribute('data-lazy-observed', 'true');
+                observer.observe(section);
+            }
+        });
+    }
+
+    if (!window.dash_clientside) {
+        window.dash_clientside = {};
+    }
+
+    window.dash_clientside.lazy = {
+        // Clientside callback on each *-section-visible store
+        track: function(visible, storeId) {
+            storeValues[storeId] = Boolean(visible);
+            if (!visible) {
+                // Reset (e.g. the page was rendered again): watch the section anew
+                document.querySelectorAll('[data-visible-store="' + storeId + '"]').forEach(function(section) {
+                    if (observer) {
+                        observer.unobserve(section);
+                    }
+                    section.removeAttribute('data-lazy-observed');
+                });
+                watchSections();
+            }
+            return window.dash_clientside.no_update;
+        }
+    };
+
+    document.addEventListener('DOMContentLoaded', function() {
+        // Pages are swapped into page-content by Dash, so keep looking for
+        // newly rendered sections
+        new MutationObserver(watchSections).observe(document.body, {childList: true, subtree: true});
+        watchSections();
+    });
+})();
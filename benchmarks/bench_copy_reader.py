@@ -0,0 +1,155 @@
+"""
+Benchmark the binary COPY reader against pd.read_sql for the largest extracts
+
+Seeds a scratch schema in the database pointed to by DATABASE_URL with
+per-minute anomaly scores for one participant (30 days by default) and a
+group history of 500 participants over 2 years. Each extract is then loaded
+with pd.read_sql and with read_frame_via_copy. The script reports the timings
+and checks that both readers return the same values. The schema is dropped
+afterwards unless --keep is given.
+
+Usage:
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_copy_reader \\
+        [--days 30] [--participants 500] [--history-days 730] [--repeat 3]
+"""
+import argparse
+import os
+import time
+from datetime import date, timedelta
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from utils.copy_reader import read_frame_via_copy
+
+SCHEMA = "bench_copy_reader"
+
+ANOMALY_QUERY = text("""
+    SELECT date, time_slot, score, label
+    FROM anomaly_scores
+    WHERE user_id = :user_id
+    AND date BETWEEN :start_date AND :end_date
+    ORDER BY date, time_slot
+""")
+
+HISTORY_QUERY = text("""
+    SELECT participant_id, date, has_physio
+    FROM group_history
+    WHERE date BETWEEN :start_date AND :end_date
+    ORDER BY participant_id, date
+""")
+
+
+def _schema_url(url):
+    separator = "&" if "?" in url else "?"
+    return f"{url}{separator}options={quote(f'-csearch_path={SCHEMA}')}"
+
+
+def _seed(engine, days, participants, history_days, end_date):
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        conn.execute(text(f"SET search_path TO {SCHEMA}"))
+        conn.execute(text("""
+            CREATE TABLE anomaly_scores (
+                user_id INTEGER NOT NULL,
+                date DATE NOT NULL,
+                time_slot INTEGER NOT NULL,
+                score REAL,
+                label TEXT,
+                PRIMARY KEY (user_id, date, time_slot)
+            );
+            CREATE TABLE group_history (
+                participant_id INTEGER NOT NULL,
+                date DATE NOT NULL,
+                has_physio BOOLEAN NOT NULL,
+                PRIMARY KEY (participant_id, date)
+            );
+        """))
+        conn.execute(text("""
+            INSERT INTO anomaly_scores (user_id, date, time_slot, score, label)
+            SELECT 1, d::date, s, CASE WHEN random() < 0.02 THEN NULL ELSE random() END,
+                   CASE WHEN random() < 0.05 THEN 'anomaly' ELSE 'normal' END
+            FROM generate_series(CAST(:start AS date), CAST(:end AS date), interval '1 day') d
+            CROSS JOIN generate_series(0, 1439) s
+        """), {"start": end_date - timedelta(days=days - 1), "end": end_date})
+        conn.execute(text("""
+            INSERT INTO group_history (participant_id, date, has_physio)
+            SELECT p, d::date, random() < 0.85
+            FROM generate_series(1, :participants) p
+            CROSS JOIN generate_series(CAST(:start AS date), CAST(:end AS date), interval '1 day') d
+        """), {"participants": participants, "start": end_date - timedelta(days=history_days - 1), "end": end_date})
+        conn.execute(text("ANALYZE"))
+
+
+def _time(func, repeat):
+    best = float("inf")
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def _same_values(left, right):
+    if list(left.columns) != list(right.columns) or len(left) != len(right):
+        return False
+    for column in left.columns:
+        a, b = left[column].to_numpy(), right[column].to_numpy()
+        if a.dtype.kind == "f" or b.dtype.kind == "f":
+            if not np.allclose(a.astype(float), b.astype(float), equal_nan=True):
+                return False
+        elif not pd.Series(a).equals(pd.Series(b)):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--participants", type=int, default=500)
+    parser.add_argument("--history-days", type=int, default=730)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema")
+    args = parser.parse_args()
+
+    base_url = os.environ.get("DATABASE_URL")
+    if not base_url:
+        parser.error("DATABASE_URL must point to a Postgres database the benchmark may create a schema in")
+    engine = create_engine(_schema_url(base_url))
+
+    end_date = date.today()
+    print(f"Seeding {args.days} days of per-minute scores and "
+          f"{args.participants} participants x {args.history_days} days of history in schema {SCHEMA}...")
+    _seed(engine, args.days, args.participants, args.history_days, end_date)
+
+    extracts = {
+        "anomaly_scores": (ANOMALY_QUERY, {
+            "user_id": 1, "start_date": end_date - timedelta(days=args.days - 1), "end_date": end_date,
+        }),
+        "group history": (HISTORY_QUERY, {
+            "start_date": end_date - timedelta(days=args.history_days - 1), "end_date": end_date,
+        }),
+    }
+
+    try:
+        for name, (query, params) in extracts.items():
+            with engine.connect() as conn:
+                read_sql_time, expected = _time(lambda: pd.read_sql(query, conn, params=params), args.repeat)
+                copy_time, actual = _time(lambda: read_frame_via_copy(conn, query, params), args.repeat)
+            status = "match" if _same_values(expected, actual) else "MISMATCH"
+            print(
+                f"  {name:<15} {len(expected):>9} rows: pd.read_sql {read_sql_time * 1000:8.1f} ms, "
+                f"COPY {copy_time * 1000:8.1f} ms  ({read_sql_time / copy_time:4.1f}x, {status})"
+            )
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Benchmark get_group_data_summary against the six-way LEFT JOIN query it replaced
+
+Seeds a scratch schema in the database pointed to by DATABASE_URL with a
+synthetic study (500 participants over 2 years by default), then times the
+old query and the current implementation for a few selected dates and
+checks that both return the same counts. The schema is dropped afterwards
+unless --keep is given.
+
+Usage:
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_group_data_summary \\
+        [--participants 500] [--days 730] [--groups 10] [--repeat 3]
+"""
+import argparse
+import os
+import time
+from datetime import date, timedelta
+from urllib.parse import quote
+
+from sqlalchemy import text
+
+SCHEMA = "bench_group_data_summary"
+
+# get_group_data_summary before the rewrite
+LEGACY_QUERY = text("""
+    WITH group_summary AS (
+        SELECT 
+            g.id as group_id,
+            g.group_name,
+            -- Current day physiological data count
+            COUNT(DISTINCT CASE 
+                WHEN hm_current.date = :selected_date 
+                THEN hm_current.user_id 
+            END) as physio_current_day_count,
+            -- Current day questionnaire data count
+            COUNT(DISTINCT CASE 
+                WHEN qd_current.date = :selected_date 
+                THEN qd_current.user_id 
+            END) as questionnaire_current_day_count,
+            -- Past 7 days physiological data count
+            COUNT(DISTINCT CASE 
+                WHEN hm7.date BETWEEN :past_7_start AND :selected_date 
+                THEN hm7.user_id 
+            END) as physio_7_day_count,
+            -- Past 30 days physiological data count
+            COUNT(DISTINCT CASE 
+                WHEN hm30.date BETWEEN :past_30_start AND :selected_date 
+                THEN hm30.user_id 
+            END) as physio_30_day_count,
+            -- Past 7 days questionnaire data count
+            COUNT(DISTINCT CASE 
+                WHEN qd7.date BETWEEN :past_7_start AND :selected_date 
+                THEN qd7.user_id 
+            END) as questionnaire_7_day_count,
+            -- Past 30 days questionnaire data count
+            COUNT(DISTINCT CASE 
+                WHEN qd30.date BETWEEN :past_30_start AND :selected_date 
+                THEN qd30.user_id 
+            END) as questionnaire_30_day_count,
+            -- Total participants in group
+            COUNT(DISTINCT u.id) as total_participants
+        FROM groups g
+        JOIN user_groups ug ON g.id = ug.group_id
+        JOIN users u ON ug.user_id = u.id
+        LEFT JOIN health_metrics hm_current ON u.id = hm_current.user_id 
+            AND hm_current.date = :selected_date
+        LEFT JOIN questionnaire_data qd_current ON u.id = qd_current.user_id 
+            AND qd_current.date = :selected_date
+        LEFT JOIN health_metrics hm7 ON u.id = hm7.user_id 
+            AND hm7.date BETWEEN :past_7_start AND :selected_date
+        LEFT JOIN health_metrics hm30 ON u.id = hm30.user_id 
+            AND hm30.date BETWEEN :past_30_start AND :selected_date
+        LEFT JOIN questionnaire_data qd7 ON u.id = qd7.user_id 
+            AND qd7.date BETWEEN :past_7_start AND :selected_date
+        LEFT JOIN questionnaire_data qd30 ON u.id = qd30.user_id 
+            AND qd30.date BETWEEN :past_30_start AND :selected_date
+        WHERE u.role = 'participant'
+        GROUP BY g.id, g.group_name
+        ORDER BY g.group_name
+    )
+    SELECT 
+        group_id,
+        group_name,
+        physio_current_day_count,
+        questionnaire_current_day_count,
+        physio_7_day_count,
+        physio_30_day_count,
+        questionnaire_7_day_count,
+        questionnaire_30_day_count,
+        total_participants
+    FROM group_summary
+""")
+
+
+def _schema_url(url):
+    separator = "&" if "?" in url else "?"
+    return f"{url}{separator}options={quote(f'-csearch_path={SCHEMA}')}"
+
+
+def _seed(engine, participants, days, groups, end_date):
+    start_date = end_date - timedelta(days=days - 1)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        conn.execute(text(f"SET search_path TO {SCHEMA}"))
+        conn.execute(text("""
+            CREATE TABLE users (
+                id SERIAL PRIMARY KEY,
+                username TEXT NOT NULL,
+                role TEXT NOT NULL
+            );
+            CREATE TABLE groups (
+                id SERIAL PRIMARY KEY,
+                group_name TEXT NOT NULL
+            );
+            CREATE TABLE user_groups (
+                user_id INTEGER NOT NULL,
+                group_id INTEGER NOT NULL,
+                PRIMARY KEY (user_id, group_id)
+            );
+            CREATE TABLE health_metrics (
+                user_id INTEGER NOT NULL,
+                date DATE NOT NULL,
+                resting_hr DOUBLE PRECISION,
+                PRIMARY KEY (user_id, date)
+            );
+            CREATE TABLE questionnaire_data (
+                user_id INTEGER NOT NULL,
+                date DATE NOT NULL,
+                fatigue_level DOUBLE PRECISION,
+                PRIMARY KEY (user_id, date)
+            );
+        """))
+        conn.execute(text("""
+            INSERT INTO groups (group_name)
+            SELECT 'Group ' || g FROM generate_series(1, :groups) g
+        """), {"groups": groups})
+        conn.execute(text("""
+            INSERT INTO users (username, role)
+            SELECT 'participant' || p, 'participant' FROM generate_series(1, :participants) p
+        """), {"participants": participants})
+        conn.execute(text("""
+            INSERT INTO user_groups (user_id, group_id)
+            SELECT id, 1 + (id % :groups) FROM users
+        """), {"groups": groups})
+        # Roughly 85% physiological and 60% questionnaire compliance
+        conn.execute(text("""
+            INSERT INTO health_metrics (user_id, date, resting_hr)
+            SELECT u.id, d::date, 50 + random() * 30
+            FROM users u
+            CROSS JOIN generate_series(CAST(:start AS date), CAST(:end AS date), interval '1 day') d
+            WHERE random() < 0.85
+        """), {"start": start_date, "end": end_date})
+        conn.execute(text("""
+            INSERT INTO questionnaire_data (user_id, date, fatigue_level)
+            SELECT u.id, d::date, random() * 10
+            FROM users u
+            CROSS JOIN generate_series(CAST(:start AS date), CAST(:end AS date), interval '1 day') d
+            WHERE random() < 0.6
+        """), {"start": start_date, "end": end_date})
+        conn.execute(text("ANALYZE"))
+
+
+def _run_legacy(engine, selected_date):
+    params = {
+        "selected_date": selected_date,
+        "past_7_start": selected_date - timedelta(days=6),
+        "past_30_start": selected_date - timedelta(days=29),
+    }
+    with engine.connect() as conn:
+        result = conn.execute(LEGACY_QUERY, params)
+        keys = tuple(result.keys())
+        return [dict(zip(keys, row)) for row in result]
+
+
+def _time(func, repeat):
+    best = float("inf")
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", type=int, default=500)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema")
+    args = parser.parse_args()
+
+    base_url = os.environ.get("DATABASE_URL")
+    if not base_url:
+        parser.error("DATABASE_URL must point to a Postgres database the benchmark may create a schema in")
+
+    # utils.database builds its engine from DATABASE_URL at import time, so point
+    # it at the scratch schema and keep the shared result cache out of the timings
+    os.environ["DATABASE_URL"] = _schema_url(base_url)
+    os.environ["RESULT_CACHE_BACKEND"] = "none"
+    from utils.database import engine, get_group_data_summary
+
+    end_date = date.today()
+    print(f"Seeding {args.participants} participants x {args.days} days in schema {SCHEMA}...")
+    _seed(engine, args.participants, args.days, args.groups, end_date)
+
+    try:
+        for offset in (0, args.days // 2, args.days - 30):
+            selected_date = end_date - timedelta(days=offset)
+            legacy_time, legacy_rows = _time(lambda: _run_legacy(engine, selected_date), args.repeat)
+            current_time, current_rows = _time(lambda: get_group_data_summary(selected_date), args.repeat)
+            status = "match" if legacy_rows == current_rows else "MISMATCH"
+            print(
+                f"  {selected_date}: legacy {legacy_time * 1000:9.1f} ms, "
+                f"current {current_time * 1000:7.1f} ms  ({legacy_time / current_time:6.1f}x, {status})"
+            )
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
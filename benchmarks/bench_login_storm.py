@@ -0,0 +1,170 @@
+"""
+Benchmark a storm of concurrent logins against the old login path
+
+Seeds a scratch schema in the database pointed to by DATABASE_URL with
+users (sharing one werkzeug password hash) and a sessions table. It then
+fires 200 logins at once from a thread pool, first through the old path and
+then through the current one and through the write-behind queue:
+- Old path: two user lookups, the hash checked inline, and separate
+  last_login and session commits.
+- Current path: one lookup, the hash checked inline, and
+  record_login.
+- Queued path: as the current path, but the writes go through queue_login
+  and are flushed in batches; the queue is flushed before sessions are
+  counted.
+The script reports wall time, throughput and latency percentiles, and checks
+that every login wrote exactly one session. The schema is dropped afterwards
+unless --keep is given.
+
+Usage:
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_login_storm \\
+        [--logins 200] [--threads 200]
+"""
+import argparse
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from urllib.parse import quote
+
+import numpy as np
+from sqlalchemy import text
+from werkzeug.security import check_password_hash, generate_password_hash
+
+SCHEMA = "bench_login_storm"
+PASSWORD = "correct horse battery staple"
+
+
+def _schema_url(url):
+    separator = "&" if "?" in url else "?"
+    return f"{url}{separator}options={quote(f'-csearch_path={SCHEMA}')}"
+
+
+def _seed(engine, users):
+    password_hash = generate_password_hash(PASSWORD)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        conn.execute(text(f"SET search_path TO {SCHEMA}"))
+        conn.execute(text("""
+            CREATE TABLE users (
+                id SERIAL PRIMARY KEY,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                role TEXT NOT NULL,
+                last_login TIMESTAMP,
+                is_active BOOLEAN NOT NULL DEFAULT TRUE
+            );
+            CREATE TABLE sessions (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users(id),
+                session_token TEXT NOT NULL,
+                ip_address TEXT,
+                user_agent TEXT,
+                expires_at TIMESTAMP NOT NULL,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+        """))
+        conn.execute(text("""
+            INSERT INTO users (username, password_hash, role)
+            SELECT 'participant' || p, :password_hash, 'participant'
+            FROM generate_series(1, :users) p
+        """), {"users": users, "password_hash": password_hash})
+
+
+def _legacy_login(database, username):
+    """The login callback before it fetched the user once"""
+    user_data = database.get_user_by_username(username)
+    fresh = database.get_user_by_username(username)
+    if not check_password_hash(fresh['password_hash'], PASSWORD):
+        return False
+    database.update_last_login(user_data['id'])
+    database.create_session(
+        user_data['id'], str(uuid.uuid4()), '127.0.0.1', 'bench', datetime.now() + timedelta(days=1)
+    )
+    return True
+
+
+def _current_login(database, username):
+    user_data = database.get_user_by_username(username)
+    if not check_password_hash(user_data['password_hash'], PASSWORD):
+        return False
+    database.record_login(
+        user_data['id'], str(uuid.uuid4()), '127.0.0.1', 'bench', datetime.now() + timedelta(days=1)
+    )
+    return True
+
+
+def _queued_login(database, write_behind, username):
+    user_data = database.get_user_by_username(username)
+    if not check_password_hash(user_data['password_hash'], PASSWORD):
+        return False
+    write_behind.queue_login(
+        user_data['id'], str(uuid.uuid4()), '127.0.0.1', 'bench', datetime.now() + timedelta(days=1)
+    )
+    return True
+
+
+def _storm(login, logins, threads):
+    def timed(username):
+        start = time.perf_counter()
+        ok = login(username)
+        return ok, time.perf_counter() - start
+
+    usernames = [f"participant{i + 1}" for i in range(logins)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(timed, usernames))
+    wall = time.perf_counter() - start
+    latencies = np.array([elapsed for _, elapsed in results])
+    return wall, latencies, sum(ok for ok, _ in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema")
+    args = parser.parse_args()
+
+    base_url = os.environ.get("DATABASE_URL")
+    if not base_url:
+        parser.error("DATABASE_URL must point to a Postgres database the benchmark may create a schema in")
+
+    # utils.database builds its engine from DATABASE_URL at import time
+    os.environ["DATABASE_URL"] = _schema_url(base_url)
+    os.environ["RESULT_CACHE_BACKEND"] = "none"
+    from utils import database, write_behind
+
+    print(f"Seeding {args.logins} users in schema {SCHEMA}...")
+    _seed(database.engine, args.logins)
+
+    try:
+        paths = {
+            "legacy": partial(_legacy_login, database),
+            "current": partial(_current_login, database),
+            "queued": partial(_queued_login, database, write_behind),
+        }
+        for name, login in paths.items():
+            with database.engine.begin() as conn:
+                conn.execute(text("TRUNCATE sessions"))
+            wall, latencies, succeeded = _storm(login, args.logins, args.threads)
+            write_behind.flush()
+            with database.engine.connect() as conn:
+                sessions = conn.execute(text("SELECT COUNT(*) FROM sessions")).scalar()
+            status = "ok" if succeeded == sessions == args.logins else "MISMATCH"
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            print(
+                f"  {name:<8} {args.logins} logins in {wall:6.2f} s ({args.logins / wall:6.1f}/s), "
+                f"p50 {p50:7.1f} ms, p95 {p95:7.1f} ms, p99 {p99:7.1f} ms  ({status}, {sessions} sessions)"
+            )
+    finally:
+        if not args.keep:
+            with database.engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark the result mapping helpers against the old per-row dict building
+
+Uses an in-memory SQLite table shaped like the get_group_daily_data_counts
+result (90 days x all groups) so it runs without a Postgres instance.
+
+Usage:
+    python -m benchmarks.bench_result_mapping [--rows 200000] [--repeat 5]
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, text
+
+from utils.result_mapping import COUNT_DTYPES, rows_to_columns, rows_to_dicts, rows_to_frame
+
+
+def _legacy_rows_to_dicts(result):
+    """The loop utils/database.py used before the result mapping module"""
+    rows = []
+    for row in result:
+        row_dict = {}
+        for idx, col in enumerate(result.keys()):
+            row_dict[col] = row[idx]
+        rows.append(row_dict)
+    return rows
+
+
+def _seed(engine, n_rows):
+    start = date(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE daily_counts (
+                date DATE, group_id INTEGER, group_name TEXT,
+                physio_count INTEGER, questionnaire_count INTEGER
+            )
+        """))
+        conn.execute(
+            text("""
+                INSERT INTO daily_counts
+                VALUES (:date, :group_id, :group_name, :physio_count, :questionnaire_count)
+            """),
+            [
+                {
+                    "date": start + timedelta(days=i // 40),
+                    "group_id": i % 40,
+                    "group_name": f"Group {i % 40}",
+                    "physio_count": i % 150,
+                    "questionnaire_count": (i * 7) % 150,
+                }
+                for i in range(n_rows)
+            ],
+        )
+
+
+def _time(frozen, mapper, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        # Replaying a frozen result keeps driver fetch time out of the measurement
+        result = frozen()
+        start = time.perf_counter()
+        mapper(result)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    _seed(engine, args.rows)
+    with engine.connect() as conn:
+        frozen = conn.execute(text("SELECT * FROM daily_counts")).freeze()
+
+    mappers = {
+        "legacy per-row dicts": _legacy_rows_to_dicts,
+        "rows_to_dicts": rows_to_dicts,
+        "rows_to_columns": lambda result: rows_to_columns(result, COUNT_DTYPES),
+        "rows_to_frame": lambda result: rows_to_frame(result, COUNT_DTYPES),
+    }
+
+    baseline = None
+    print(f"{args.rows} rows, best of {args.repeat}")
+    for name, mapper in mappers.items():
+        elapsed = _time(frozen, mapper, args.repeat)
+        baseline = baseline or elapsed
+        print(f"  {name:<22} {elapsed * 1000:9.1f} ms  ({baseline / elapsed:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,12 @@ from datetime import datetime, timedelta
 from dash import callback, callback_context, Input, Output, State, html, dcc
 from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-import pandas as pd
 
 from components.admin.group_comparison import create_group_comparison
 from components.admin.group_summary import create_group_summary
 from components.admin.participant_detail import create_participant_detail
 from components.admin.group_data_summary import create_group_data_summary_visualization
+from components.admin.anomaly_episodes import create_anomaly_episodes
 
 from utils.formatting import parse_and_format_date
 from utils.database import (
@@ -17,10 +17,13 @@ from utils.database import (
     get_user_by_id,
     get_user_latest_data_date,
     load_anomaly_data,
+    load_anomaly_hourly,
     load_participant_data,
+    load_participants_data,
     load_questionnaire_data,
     get_group_data_summary,
     get_group_daily_data_counts,
+    get_group_anomaly_episodes,
 )
 from utils.visualization import (
     create_empty_chart,
@@ -202,6 +205,25 @@ def update_participant_store(participant_id, show_all, group_id):
     return None
 
 
+# Callback to set today's dates when the page loads, since the layout is cached
+@callback(
+    [Output("admin-current-date", "date", allow_duplicate=True),
+     Output("admin-custom-start-date", "date"),
+     Output("admin-date-range", "data", allow_duplicate=True)],
+    Input("admin-date-bootstrap", "data"),
+    prevent_initial_call='initial_duplicate'
+)
+def fill_admin_dates(_):
+    """Default to the last 7 days ending today"""
+    today = datetime.now().date()
+    start_date = today - timedelta(days=6)
+    return today, start_date, {
+        "start_date": start_date.isoformat(),
+        "end_date": today.isoformat(),
+        "mode": "last_7"  # Track which mode is active
+    }
+
+
 # Callback to handle date navigation arrows
 @callback(
     Output("admin-current-date", "date"),
@@ -611,24 +633,26 @@ def create_group_summary_data(group_id, start_date, end_date, mode):
         if not participants:
             return html.Div("No participants found in this group")
 
-        # Accumulate data from all participants
-        participant_data = []
-        for participant in participants:
-            # Load data for this participant over the date range
-            df = load_participant_data(participant["id"], start_date, end_date)
-            if not df.empty:
-                df["participant_id"] = participant["id"]
-                df["participant_name"] = participant["username"]
-                participant_data.append(df)
+        # Load data for all participants in one query
+        group_df = load_participants_data(
+            [participant["id"] for participant in participants], start_date, end_date
+        )
 
-        # Combine all participant data
-        if not participant_data:
-            return html.Div("No data available for the selected date range")
+        # Episodes come from their own index, independent of the health data
+        episodes = get_group_anomaly_episodes(group_id, start_date, end_date)
+        episodes_view = create_anomaly_episodes(episodes, group_name)
 
-        group_df = pd.concat(participant_data)
+        if group_df.empty:
+            return html.Div([
+                html.Div("No data available for the selected date range"),
+                episodes_view,
+            ])
 
         # Create visualizations
-        return create_group_summary(group_df, group_name)
+        return html.Div([
+            create_group_summary(group_df, group_name),
+            episodes_view,
+        ])
     except Exception as e:
         print(f"Error creating group summary visualizations: {e}")
         return html.Div(
@@ -755,8 +779,8 @@ def update_admin_anomaly_heatmap(participant_id, date_range):
         return create_empty_chart("Invalid date range")
 
     try:
-        # Load data for date range
-        df = load_anomaly_data(participant_id, start_date=start_date, end_date=end_date)
+        # Load hourly rollups for the date range
+        df = load_anomaly_hourly(participant_id, start_date, end_date)
         
         if df.empty:
             return create_empty_chart("No anomaly data available for the selected date range")
@@ -1,4 +1,5 @@
-from datetime import datetime, timedelta
+from datetime import datetime
+from functools import partial
 
 from dash import callback, Input, Output, html, dcc
 import dash_bootstrap_components as dbc
@@ -18,9 +19,14 @@ from utils.database import (
     get_participant_ranking,
     get_all_group_participants_ranking,
     get_all_group_questionnaire_ranking,
-    get_group_historical_data,
+    get_group_history_periods,
     get_participant_questionnaire_ranking,
+    decode_ranking_snapshot,
+    get_group_period_counts,
+    STUDY_START_DATE,
 )
+from utils.concurrency import run_concurrently
+from utils.presence_index import get_presence_index
 from utils.visualization import (
     create_fatigue_motivation_trend_chart,
     create_heart_rate_trend_chart,
@@ -33,42 +39,80 @@ from utils.visualization import (
     create_step_count_summary,
     create_ranking_over_time_figure,
 )
+from utils.ranking_engine import count_days_per_period, rank_over_time
+
+
+def _ranking_history_periods(user_id, start_date, end_date, interval):
+    """Count days with data per participant and period for the user's group"""
+    if interval == 'week' and start_date == STUDY_START_DATE:
+        # Weekly counters carried forward by the participant_period_counts refresh step
+        period_counts = get_group_period_counts(user_id)
+        if not period_counts.empty:
+            return period_counts
+
+    presence_index = get_presence_index(wait=False)
+    if presence_index is not None:
+        # Straight from memory
+        return count_days_per_period(presence_index.group_history(user_id, start_date, end_date), interval)
+
+    # Stream the history so memory stays flat however long the study runs
+    return get_group_history_periods(user_id, start_date, end_date, interval)
 
 
 # SECTION 1: RANKING - Uses whole dataset
 @callback(
     Output("participant-ranking-container", "children"),
-    Input("url", "pathname")  # Triggered when page loads
+    Input("participant-bootstrap", "data"),  # Set when the page loads
+    Input("ranking-section-visible", "data"),
 )
-def update_participant_ranking_whole_dataset(pathname):
+def update_participant_ranking_whole_dataset(bootstrap, visible):
     """Update participant ranking using entire dataset"""
-    if not current_user.is_authenticated:
+    # Wait until the section scrolls into view
+    if not current_user.is_authenticated or not bootstrap or not visible:
         raise PreventUpdate
 
     user_id = current_user.id
 
     try:
         # Get ranking over entire dataset (no date restrictions)
-        far_past = datetime(2024, 1, 1).date()
+        far_past = STUDY_START_DATE
         today = datetime.now().date() # For questionnaire ranking
         
-        # Get data consistency ranking
-        ranking_data = get_participant_ranking(user_id, far_past, today)
-        all_participants_data = get_all_group_participants_ranking(user_id, far_past, today)
-        
-        # Get questionnaire completion ranking
-        questionnaire_ranking_data = get_participant_questionnaire_ranking(user_id, far_past, today)
-        all_questionnaire_data = get_all_group_questionnaire_ranking(user_id, far_past, today)
+        # Rankings precomputed by the ranking_snapshots refresh step, read
+        # along with the page bootstrap
+        snapshot = decode_ranking_snapshot(bootstrap.get("ranking_snapshot"), user_id)
         
-        # Get historical data for ranking over time
-        df_history = get_group_historical_data(user_id, far_past, today)
+        if snapshot is not None:
+            ranking_data = snapshot["ranking"]
+            all_participants_data = snapshot["all_participants"]
+            questionnaire_ranking_data = snapshot["questionnaire_ranking"]
+            all_questionnaire_data = snapshot["all_questionnaire"]
+            # Days with data per week for ranking over time
+            history_periods = _ranking_history_periods(user_id, far_past, today, 'week')
+        else:
+            # No recent snapshot - run the ranking lookups side by side
+            (
+                ranking_data,
+                all_participants_data,
+                questionnaire_ranking_data,
+                all_questionnaire_data,
+                history_periods,
+            ) = run_concurrently(
+                # Data consistency ranking
+                partial(get_participant_ranking, user_id, far_past, today),
+                partial(get_all_group_participants_ranking, user_id, far_past, today),
+                # Questionnaire completion ranking
+                partial(get_participant_questionnaire_ranking, user_id, far_past, today),
+                partial(get_all_group_questionnaire_ranking, user_id, far_past, today),
+                # Days with data per week for ranking over time
+                partial(_ranking_history_periods, user_id, far_past, today, 'week'),
+            )
         
         # Create ranking over time figure
         ranking_history_fig = None
-        if not df_history.empty:
+        if not history_periods.empty:
             ranking_history_fig = create_ranking_over_time_figure(
-                user_id, 
-                df_history, 
+                rank_over_time(history_periods, user_id, 'week'),
                 interval='week'
             )
         
@@ -107,11 +151,14 @@ def update_participant_ranking_whole_dataset(pathname):
 # SECTION 2: DAILY SNAPSHOT - Single day
 @callback(
     Output("daily-snapshot-container", "children"),
-    Input("snapshot-date-picker", "date")
+    Input("snapshot-date-picker", "date"),
+    Input("snapshot-section-visible", "data"),
 )
-def update_daily_snapshot(selected_date):
+def update_daily_snapshot(selected_date, visible):
     """Update daily snapshot for selected single day"""
-    if not current_user.is_authenticated:
+    # The date arrives with the participant-bootstrap store; nothing loads
+    # until the section scrolls into view
+    if not current_user.is_authenticated or not selected_date or not visible:
         raise PreventUpdate
 
     user_id = current_user.id
@@ -202,11 +249,13 @@ def update_daily_snapshot(selected_date):
 # SECTION 3: HEALTH METRICS - Trends over period (Reorganized into 2 rows)
 @callback(
     Output("health-metrics-container", "children"),
-    Input("trends-date-range", "data")
+    Input("trends-date-range", "data"),
+    Input("trends-section-visible", "data"),
 )
-def update_health_metrics_trends(date_range_data):
+def update_health_metrics_trends(date_range_data, visible):
     """Update health metrics based on selected date range"""
-    if not current_user.is_authenticated or not date_range_data:
+    # Wait until the section scrolls into view
+    if not current_user.is_authenticated or not date_range_data or not visible:
         raise PreventUpdate
 
     user_id = current_user.id
@@ -373,62 +422,3 @@ def update_health_metrics_trends(date_range_data):
     except Exception as e:
         return dbc.Alert(f"Error loading health metrics: {str(e)}", color="danger")
 
-
-@callback(
-    [Output("snapshot-date-picker", "date"),
-     Output("trends-end-date-picker", "date"),
-     Output("trends-date-range", "data", allow_duplicate=True)],
-    Input("url", "pathname"),
-    prevent_initial_call=True
-)
-def initialize_dates_with_user_data(pathname):
-    """Initialize date pickers with the user's most recent data date"""
-    if not current_user.is_authenticated:
-        raise PreventUpdate
-    
-    # Import here to avoid circular imports
-    from utils.database import get_user_latest_data_date
-    
-    user_id = current_user.id
-    latest_date = get_user_latest_data_date(user_id)
-    
-    # Use latest data date or fall back to current date
-    end_date = latest_date if latest_date else datetime.now().date()
-    start_date = end_date - timedelta(days=6)  # Default to 7 days for trends
-    
-    # Return the dates for both pickers and the trends range
-    return (
-        end_date,  # snapshot date picker
-        end_date,  # trends end date picker
-        {
-            "end_date": end_date.isoformat(),
-            "start_date": start_date.isoformat(),
-            "days_back": 7
-        }
-    )
-
-
-@callback(
-    Output("data-availability-info", "children"),
-    Input("url", "pathname")
-)
-def update_data_availability_info(pathname):
-    """Update info about data availability"""
-    if not current_user.is_authenticated:
-        return ""
-    
-    from utils.database import get_user_latest_data_date
-    
-    latest_date = get_user_latest_data_date(current_user.id)
-    
-    if latest_date:
-        days_ago = (datetime.now().date() - latest_date).days
-        if days_ago == 0:
-            return f"✅ Data available through today ({latest_date.strftime('%B %d, %Y')})"
-        elif days_ago == 1:
-            return f"📊 Most recent data from yesterday ({latest_date.strftime('%B %d, %Y')})"
-        else:
-            return f"📊 Most recent data from {days_ago} days ago ({latest_date.strftime('%B %d, %Y')})"
-    else:
-        return "⚠️ No health data found for your account"
-
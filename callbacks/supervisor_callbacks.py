@@ -40,6 +40,10 @@ def update_supervisor_date_range(n_7, n_30, n_90, end_date, current_data):
     """Update the supervisor date range based on button clicks or date changes"""
     logger.debug(f"Updating supervisor date range: n_7={n_7}, n_30={n_30}, n_90={n_90}, end_date={end_date}")
     
+    # The skeleton has no date until the supervisor-bootstrap store is applied
+    if not end_date:
+        raise PreventUpdate
+    
     ctx = callback_context
     if not ctx.triggered:
         logger.debug("No trigger context, returning current data")
@@ -0,0 +1,61 @@
+from dash import html
+import dash_bootstrap_components as dbc
+
+
+def create_anomaly_episodes(episodes, group_name):
+    """
+    Create a table listing the anomaly episodes of a group
+
+    Args:
+        episodes: List of episode dictionaries from get_group_anomaly_episodes
+        group_name: Name of the group
+
+    Returns:
+        A dash component with the episode table
+    """
+    total = episodes[0]['total_episodes'] if episodes else 0
+    participants = episodes[0]['total_participants'] if episodes else 0
+
+    if not episodes:
+        body = html.P("No anomaly episodes in the selected date range", className="text-muted mb-0")
+    else:
+        rows = [
+            html.Tr([
+                html.Td(episode['username']),
+                html.Td(episode['start_time'].strftime('%b %d, %H:%M')),
+                html.Td(episode['end_time'].strftime('%b %d, %H:%M')),
+                html.Td(f"{episode['slot_count']} min"),
+                html.Td(f"{episode['peak_score']:.3f}"),
+                html.Td(f"{episode['mean_score']:.3f}"),
+            ])
+            for episode in episodes
+        ]
+        body = dbc.Table([
+            html.Thead(html.Tr([
+                html.Th("Participant"),
+                html.Th("Start"),
+                html.Th("End"),
+                html.Th("Duration"),
+                html.Th("Peak Score"),
+                html.Th("Mean Score"),
+            ])),
+            html.Tbody(rows),
+        ], striped=True, bordered=True, hover=True, responsive=True, size="sm")
+        if len(episodes) < total:
+            body = html.Div([
+                body,
+                html.P(f"Showing the {len(episodes)} most recent of {total} episodes",
+                       className="text-muted small mb-0"),
+            ])
+
+    return dbc.Row([
+        dbc.Col([
+            dbc.Card([
+                dbc.CardHeader(html.H5(
+                    f"Anomaly Episodes for {group_name} ({total} episodes, {participants} participants)",
+                    className="card-title"
+                )),
+                dbc.CardBody([body])
+            ])
+        ], width=12, className="mb-4"),
+    ])
@@ -1,5 +1,3 @@
-from datetime import datetime, timedelta
-
 from dash import html, dcc, callback, Input, Output, State, callback_context
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
@@ -9,13 +7,13 @@ def create_admin_date_selector():
     """
     Create a date selector component for admin dashboard
     with single current date and optional custom start date
+
+    The dates are left empty and filled in by the fill_admin_dates callback
+    when the page loads, so the component can be built once and reused.
     
     Returns:
         A dash component with date selection controls
     """
-    # Set default current date
-    today = datetime.now()
-    
     return html.Div([
         html.H5("Select Analysis Period", className="mb-2"),
         
@@ -27,7 +25,7 @@ def create_admin_date_selector():
                 html.Div([
                     dcc.DatePickerSingle(
                         id="admin-current-date",
-                        date=today,
+                        date=None,
                         display_format="YYYY-MM-DD",
                         className="date-input",
                         first_day_of_week=1,),
@@ -48,16 +46,15 @@ def create_admin_date_selector():
             html.Label("Start Date:", className="date-range-label"),
             dcc.DatePickerSingle(
                 id="admin-custom-start-date",
-                date=today - timedelta(days=6),
+                date=None,
                 display_format="YYYY-MM-DD",
                 className="date-input",
             ),
         ], id="custom-date-container", className="date-range-row", style={"display": "none"}),
         
-        # Data store for date range (for callbacks to use)
-        dcc.Store(id="admin-date-range", data={
-            "start_date": (today - timedelta(days=6)).isoformat(),
-            "end_date": today.isoformat(),
-            "mode": "last_7"  # Track which mode is active
-        })
+        # Data store for date range (for callbacks to use), filled on page load
+        dcc.Store(id="admin-date-range", data=None),
+
+        # Fires fill_admin_dates once per page load
+        dcc.Store(id="admin-date-bootstrap", data=True)
     ], className="date-selector") 
\ No newline at end of file
@@ -1,17 +1,24 @@
 # layouts/footer.py
-from dash import html
+from dash import html, clientside_callback, Output, Input
 import dash_bootstrap_components as dbc
 from datetime import datetime
 
 def create_footer():
-    current_year = datetime.now().year
-    
+    """
+    Create the page footer
+
+    The layouts that include it are cached for the life of the worker, so the
+    year starts as the current one and is refreshed in the browser whenever
+    the footer is rendered.
+    """
     footer = html.Footer(
         dbc.Container(
             [
                 html.P(
                     [
-                        f"Copyright © {current_year} | CYD Campus x BASPO"
+                        "Copyright © ",
+                        html.Span(str(datetime.now().year), id="footer-year"),
+                        " | CYD Campus x BASPO"
                     ],
                     className="text-center text-muted"
                 )
@@ -21,4 +28,12 @@ def create_footer():
         className="mt-auto py-3"
     )
     
-    return footer
\ No newline at end of file
+    return footer
+
+
+# Runs each time a cached layout with the footer is rendered
+clientside_callback(
+    "function(_) { return String(new Date().getFullYear()); }",
+    Output("footer-year", "children"),
+    Input("footer-year", "id"),
+)
@@ -68,8 +68,8 @@ def login(n_clicks, username, password):
         from app import User
         user = User(user_data)
         
-        # Check password
-        if user.check_password(password):
+        # Check password against the hash fetched above
+        if user.check_password(password, user_data['password_hash']):
             # Log user in and create session
             success = login_and_create_session(user)
             
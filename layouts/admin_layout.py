@@ -1,13 +1,20 @@
+from functools import lru_cache
+
 from dash import html, dcc
 
 from components.admin.sidebar import create_admin_sidebar
 from components.footer import create_footer
 
 # Admin Dashboard Layout
+@lru_cache(maxsize=None)
 def create_layout():
     """
     Create the admin dashboard layout with full-height sidebar and no navbar
     
+    Nothing in it depends on the user or the day (the date selector is
+    filled in by a callback on page load), so the tree is built once per
+    process.
+    
     Returns:
         A dash component with the admin dashboard
     """
@@ -1,13 +1,15 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 
-from dash import html, dcc, callback, callback_context, Input, Output, State
+from dash import html, dcc, callback, callback_context, clientside_callback, ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 from flask_login import current_user
 
 # Import custom components
 from components.participant.navbar import create_navbar
 from components.footer import create_footer
-from utils.database import get_user_latest_data_date
+from utils.database import get_participant_bootstrap
 
 def create_layout():
     """
@@ -16,22 +18,67 @@ def create_layout():
     2. Daily Snapshot (single day picker)
     3. Health Metrics (single day + n days prior)
     
+    The component tree is built once and shared by every participant; the
+    per-user bits travel in the participant-bootstrap store and are filled in
+    by hydrate_participant_layout. Each section only loads once it scrolls
+    into view: assets/js/lazy-sections.js sets its *-section-visible store.
+    
     Returns:
         A dash component with the participant dashboard
     """
-    # Get the current participant's information
-    display_name = current_user.display_name if current_user.is_authenticated else "Not logged in"
+    return html.Div([
+        create_skeleton(),
+        dcc.Store(id="participant-bootstrap", data=create_bootstrap()),
+    ])
+
+
+def create_bootstrap():
+    """
+    Collect the per-user values every participant section starts from
     
-    # Get group information
-    group = current_user.group if current_user.is_authenticated else None
+    Returns:
+        Dictionary with display_name, group, latest_date and
+        latest_questionnaire_date (ISO strings or None), default_date for the
+        date pickers and ranking_snapshot (rows for decode_ranking_snapshot,
+        or None)
+    """
+    today = datetime.now().date()
+    if not current_user.is_authenticated:
+        return {
+            "display_name": "Not logged in",
+            "group": None,
+            "latest_date": None,
+            "latest_questionnaire_date": None,
+            "default_date": today.isoformat(),
+            "ranking_snapshot": None,
+        }
     
-    # Set default dates based on user's actual data
-    if current_user.is_authenticated:
-        latest_date = get_user_latest_data_date(current_user.id)
-        today = latest_date if latest_date else datetime.now().date()
-    else:
-        today = datetime.now().date()
+    # Dates, group and ranking snapshot in one round trip
+    bootstrap = get_participant_bootstrap(current_user.id)
+    latest_date = bootstrap["latest_health_date"]
+    latest_questionnaire_date = bootstrap["latest_questionnaire_date"]
+    
+    # Default to the most recent health data, then questionnaire data, then today
+    default_date = latest_date or latest_questionnaire_date or today
+    
+    return {
+        "display_name": current_user.display_name,
+        "group": bootstrap["group"] or current_user.group,
+        "latest_date": latest_date.isoformat() if latest_date else None,
+        "latest_questionnaire_date": latest_questionnaire_date.isoformat() if latest_questionnaire_date else None,
+        "default_date": default_date.isoformat(),
+        "ranking_snapshot": bootstrap["ranking_snapshot"],
+    }
+
+
+@lru_cache(maxsize=None)
+def create_skeleton():
+    """
+    Build the user-independent participant dashboard, once per process
     
+    Returns:
+        A dash component with empty dates and header text
+    """
     return html.Div([
         # Navigation bar - outside the container for full width
         create_navbar(),
@@ -42,8 +89,8 @@ def create_layout():
             dbc.Row([
                 dbc.Col([
                     html.H1("Your FitonDuty Dashboard", className="display-5 mb-3"),
-                    html.P(f"Welcome {display_name}!", className="lead mb-2"),
-                    html.P(f"Group: {group}" if group else "", className="text-muted mb-3"),
+                    html.P(id="participant-welcome", className="lead mb-2"),
+                    html.P(id="participant-group", className="text-muted mb-3"),
                     html.Hr(className="my-3"),
                 ])
             ], className="mb-4"),
@@ -53,7 +100,9 @@ def create_layout():
                 html.H4("Your Performance Rankings", className="section-title text-primary"),
                 html.P("Your rankings are calculated across your entire data history and compared within your group", className="text-muted mb-3"),
                 html.Div(id="participant-ranking-container"),
-            ], className="mb-5"),
+                # Set by assets/js/lazy-sections.js once the section is in view
+                dcc.Store(id="ranking-section-visible", data=False),
+            ], className="mb-5 lazy-section", **{"data-visible-store": "ranking-section-visible"}),
             
             # SECTION 2: DAILY SNAPSHOT (Single day)
             html.Div([
@@ -63,21 +112,19 @@ def create_layout():
                         html.H6("Select Date", className="mb-2"),
                         dcc.DatePickerSingle(
                             id="snapshot-date-picker",
-                            date=today,
                             display_format="YYYY-MM-DD",
                             className="date-input mb-3",
                         ),
                         html.P("View your health metrics for a specific day", className="text-muted small"),
                         # Add info about data availability
-                        html.P(f"Showing data from your most recent available date: {today.strftime('%B %d, %Y')}" if current_user.is_authenticated else "", 
-                               className="text-info small", 
-                               id="data-availability-info"),
+                        html.P(className="text-info small", id="data-availability-info"),
                     ], xs=12, md=4, className="mb-3"),
                     dbc.Col([
                         html.Div(id="daily-snapshot-container"),
                     ], xs=12, md=8),
                 ]),
-            ], className="mb-5"),
+                dcc.Store(id="snapshot-section-visible", data=False),
+            ], className="mb-5 lazy-section", **{"data-visible-store": "snapshot-section-visible"}),
             
             # SECTION 3: HEALTH METRICS TRENDS (Single day + n days prior)
             html.Div([
@@ -89,7 +136,6 @@ def create_layout():
                         html.H6("Select End Date & Period", className="mb-2"),
                         dcc.DatePickerSingle(
                             id="trends-end-date-picker",
-                            date=today,
                             display_format="YYYY-MM-DD",
                             className="date-input mb-3",
                         ),
@@ -101,11 +147,7 @@ def create_layout():
                         html.P("View trends leading up to your selected date", className="text-muted small"),
                         
                         # Store for the calculated start date
-                        dcc.Store(id="trends-date-range", data={
-                            "end_date": today.isoformat(),
-                            "start_date": (today - timedelta(days=6)).isoformat(),
-                            "days_back": 7
-                        })
+                        dcc.Store(id="trends-date-range")
                     ], xs=12, md=6, lg=4, className="mb-3"),
                     dbc.Col([
                         html.Div(id="trends-period-info", className="mb-3"),
@@ -118,7 +160,8 @@ def create_layout():
                         html.Div(id="health-metrics-container"),
                     ], xs=12),
                 ]),
-            ], className="mb-5"),
+                dcc.Store(id="trends-section-visible", data=False),
+            ], className="mb-5 lazy-section", **{"data-visible-store": "trends-section-visible"}),
             
             # Footer
             create_footer()
@@ -126,6 +169,20 @@ def create_layout():
     ])
 
 
+# Stores set by assets/js/lazy-sections.js when their section scrolls into view
+LAZY_SECTION_STORES = ("ranking-section-visible", "snapshot-section-visible", "trends-section-visible")
+
+# Report every value of the stores to lazy-sections.js, including the reset
+# to False when the cached skeleton is rendered again
+for store_id in LAZY_SECTION_STORES:
+    clientside_callback(
+        ClientsideFunction(namespace='lazy', function_name='track'),
+        Output(store_id, "data"),
+        Input(store_id, "data"),
+        State(store_id, "id"),
+    )
+
+
 @callback(
     Output("navbar-collapse", "is_open"),
     [Input("navbar-toggler", "n_clicks")],
@@ -138,6 +195,45 @@ def toggle_navbar_collapse(n_clicks, is_open):
     return is_open
 
 
+@callback(
+    [Output("participant-welcome", "children"),
+     Output("participant-group", "children"),
+     Output("snapshot-date-picker", "date"),
+     Output("trends-end-date-picker", "date"),
+     Output("data-availability-info", "children")],
+    Input("participant-bootstrap", "data"),
+)
+def hydrate_participant_layout(bootstrap):
+    """Fill the cached skeleton with the user's name, group and default dates"""
+    if not bootstrap:
+        raise PreventUpdate
+    
+    group = bootstrap.get("group")
+    latest_date = bootstrap.get("latest_date")
+    default_date = bootstrap.get("default_date")
+    today = datetime.now().date()
+    
+    if latest_date:
+        latest_date = datetime.strptime(latest_date, "%Y-%m-%d").date()
+        days_ago = (today - latest_date).days
+        if days_ago == 0:
+            availability = f"✅ Data available through today ({latest_date.strftime('%B %d, %Y')})"
+        elif days_ago == 1:
+            availability = f"📊 Most recent data from yesterday ({latest_date.strftime('%B %d, %Y')})"
+        else:
+            availability = f"📊 Most recent data from {days_ago} days ago ({latest_date.strftime('%B %d, %Y')})"
+    else:
+        availability = "⚠️ No health data found for your account"
+    
+    return (
+        f"Welcome {bootstrap.get('display_name')}!",
+        f"Group: {group}" if group else "",
+        default_date,
+        default_date,
+        availability,
+    )
+
+
 @callback(
     [Output("trends-date-range", "data"),
      Output("trends-period-info", "children")],
@@ -155,6 +251,11 @@ def update_trends_date_range(n_7, n_30, n_90, end_date, current_data):
     # if not ctx.triggered:
     #     return current_data, ""
     
+    # The skeleton has no date until the bootstrap store is applied
+    if not end_date:
+        raise PreventUpdate
+    
+    current_data = current_data or {}
     trigger_id = ctx.triggered[0]["prop_id"].split(".")[0]
     
     # Convert end_date to date object if it's a string
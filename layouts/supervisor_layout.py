@@ -1,12 +1,13 @@
-from datetime import datetime, timedelta
+from datetime import datetime
+from functools import lru_cache
 
-from dash import html, dcc, callback, callback_context, Input, Output, State
+from dash import html, dcc, callback, Input, Output
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 from flask_login import current_user
 
 from components.supervisor.navbar import create_navbar
 from components.footer import create_footer
-from utils.database import get_supervisor_group_info
 from utils.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -16,29 +17,32 @@ def create_layout():
     """
     Create the layout for the supervisor dashboard
     
+    The component tree is built once and shared by every supervisor; the
+    per-user bits travel in the supervisor-bootstrap store and are filled in
+    by hydrate_supervisor_layout.
+    
     Returns:
         A dash component with the supervisor dashboard
     """
-    logger.info("Creating supervisor layout")
-    
-    # Get the current supervisor's information
     display_name = current_user.display_name if current_user.is_authenticated else "Not logged in"
-    logger.debug(f"Current user: {display_name} (authenticated: {current_user.is_authenticated})")
-    
-    # Get supervisor's group information
-    group_info = None
-    if current_user.is_authenticated:
-        logger.debug(f"Getting group info for supervisor user_id={current_user.id}")
-        group_info = get_supervisor_group_info(current_user.id)
-        if group_info:
-            logger.info(f"Supervisor user_id={current_user.id} assigned to group: {group_info['group_name']} (id={group_info['id']})")
-        else:
-            logger.warning(f"No group assigned to supervisor user_id={current_user.id}")
+    return html.Div([
+        create_skeleton(),
+        dcc.Store(id="supervisor-bootstrap", data={
+            "display_name": display_name,
+            "end_date": datetime.now().date().isoformat(),
+        }),
+    ])
+
+
+@lru_cache(maxsize=None)
+def create_skeleton():
+    """
+    Build the user-independent supervisor dashboard, once per process
     
-    # Set default dates
-    today = datetime.now().date()
-    seven_days_ago = today - timedelta(days=6)
-    logger.debug(f"Default date range: {seven_days_ago} to {today}")
+    Returns:
+        A dash component with empty dates and header text
+    """
+    logger.info("Creating supervisor layout")
     
     layout = html.Div([
         # Navigation bar - outside the container for full width
@@ -50,7 +54,7 @@ def create_layout():
             dbc.Row([
                 dbc.Col([
                     html.H1("Supervisor Dashboard", className="display-5 mb-3"),
-                    html.P(f"Welcome {display_name}!", className="lead mb-2"),
+                    html.P(id="supervisor-welcome", className="lead mb-2"),
                     html.Hr(className="my-3"),
                 ])
             ], className="mb-4"),
@@ -74,7 +78,6 @@ def create_layout():
                                     html.Label("End Date:", className="date-range-label"),
                                     dcc.DatePickerSingle(
                                         id="supervisor-end-date-picker",
-                                        date=today.isoformat(),
                                         display_format="YYYY-MM-DD",
                                         className="date-input mb-3",
                                     ),
@@ -112,10 +115,7 @@ def create_layout():
             ], className="mb-4"),
             
             # Store for date range
-            dcc.Store(id="supervisor-date-range", data={
-                "start_date": seven_days_ago.isoformat(),
-                "end_date": today.isoformat()
-            }),
+            dcc.Store(id="supervisor-date-range"),
             
             # Footer
             create_footer()
@@ -123,4 +123,16 @@ def create_layout():
     ])
     
     logger.info("Successfully created supervisor layout")
-    return layout
\ No newline at end of file
+    return layout
+
+
+@callback(
+    [Output("supervisor-welcome", "children"),
+     Output("supervisor-end-date-picker", "date")],
+    Input("supervisor-bootstrap", "data"),
+)
+def hydrate_supervisor_layout(bootstrap):
+    """Fill the cached skeleton with the user's name and default end date"""
+    if not bootstrap:
+        raise PreventUpdate
+    return f"Welcome {bootstrap.get('display_name')}!", bootstrap.get("end_date")
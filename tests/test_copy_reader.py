@@ -0,0 +1,121 @@
+"""
+Tests for the binary COPY reader
+
+The decoder tests build COPY output by hand and run anywhere. The tests
+against pd.read_sql need a Postgres database and run when TEST_DATABASE_URL
+is set:
+
+    TEST_DATABASE_URL=postgresql://... python -m unittest tests.test_copy_reader
+"""
+import os
+import struct
+import unittest
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from utils.copy_reader import decode_binary_copy, decode_text_array, read_frame_via_copy
+
+SIGNATURE = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+TRAILER = struct.pack('>h', -1)
+
+FIXTURE_QUERY = text("""
+    SELECT *
+    FROM (VALUES
+        (1, 9007199254740993::int8, 1.5::float8, 2.25::numeric, TRUE,
+         DATE '2024-02-29', TIMESTAMP '2024-02-29 23:59:59.123456', 'b'::text),
+        (2, NULL, NULL, NULL, NULL, NULL, NULL, NULL),
+        (3, -5, -0.5, 10, FALSE, DATE '1999-12-31', TIMESTAMP '1970-01-01 00:00:00', 'a'),
+        (4, 7, 3, 0.1, TRUE, DATE '2000-01-01', TIMESTAMP '2000-01-01 00:00:00.000001', 'b')
+    ) AS t(id, big, ratio, amount, flag, day, stamp, label)
+    WHERE id <= :max_id
+    ORDER BY id DESC
+""")
+
+
+def _field(payload):
+    if payload is None:
+        return struct.pack('>i', -1)
+    return struct.pack('>i', len(payload)) + payload
+
+
+def _tuple(*payloads):
+    return struct.pack('>h', len(payloads)) + b''.join(_field(payload) for payload in payloads)
+
+
+def _text_array(values):
+    body = struct.pack('>iiIii', 1, 0, 25, len(values), 1)
+    return body + b''.join(_field(value.encode()) for value in values)
+
+
+class DecodeBinaryCopyTest(unittest.TestCase):
+    def test_fixed_width_tuples(self):
+        data = SIGNATURE + b''.join(
+            _tuple(struct.pack('>i', value), struct.pack('>q', big), struct.pack('>d', ratio))
+            for value, big, ratio in [(1, 2 ** 62 + 1, 0.5), (-7, -3, float('nan'))]
+        ) + TRAILER
+
+        header, (ints, bigs, ratios) = decode_binary_copy(data, ['>i4', '>i8', '>f8'])
+
+        self.assertIsNone(header)
+        self.assertEqual(ints.tolist(), [1, -7])
+        self.assertEqual(bigs.tolist(), [2 ** 62 + 1, -3])
+        self.assertEqual(ratios[0], 0.5)
+        self.assertTrue(np.isnan(ratios[1]))
+
+    def test_header_tuple_and_null_fields(self):
+        data = SIGNATURE + _tuple(None, _text_array(['a', 'é'])) + b''.join(
+            _tuple(struct.pack('>i', code), None) for code in [2, 0, 1]
+        ) + TRAILER
+
+        header, (codes,) = decode_binary_copy(data, ['>i4', None], header=True)
+
+        self.assertEqual(decode_text_array(header[1]), ['a', 'é'])
+        self.assertEqual(codes.tolist(), [2, 0, 1])
+
+    def test_empty_text_array(self):
+        self.assertEqual(decode_text_array(struct.pack('>iiI', 0, 0, 25)), [])
+        self.assertEqual(decode_text_array(None), [])
+
+    def test_rejects_variable_width_body(self):
+        data = SIGNATURE + _tuple(b'\x00\x00\x00\x01') + _tuple(b'\x00\x01') + TRAILER
+        with self.assertRaises(ValueError):
+            decode_binary_copy(data, ['>i4'])
+
+
+@unittest.skipUnless(os.environ.get('TEST_DATABASE_URL'), "TEST_DATABASE_URL is not set")
+class ReadFrameViaCopyTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = create_engine(os.environ['TEST_DATABASE_URL'])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.dispose()
+
+    def _assert_matches_read_sql(self, params):
+        with self.engine.connect() as conn:
+            expected = pd.read_sql(FIXTURE_QUERY, conn, params=params)
+            actual = read_frame_via_copy(conn, FIXTURE_QUERY, params)
+        pd.testing.assert_frame_equal(actual, expected)
+        return actual
+
+    def test_matches_read_sql_with_nulls(self):
+        frame = self._assert_matches_read_sql({"max_id": 4})
+        self.assertEqual(frame['id'].tolist(), [4, 3, 2, 1])
+        self.assertEqual(frame['day'].iloc[3], date(2024, 2, 29))
+        self.assertEqual(frame['stamp'].iloc[3], pd.Timestamp(datetime(2024, 2, 29, 23, 59, 59, 123456)))
+
+    def test_matches_read_sql_without_nulls(self):
+        frame = self._assert_matches_read_sql({"max_id": 1})
+        # Above 2**53, so a float8 round trip would change it
+        self.assertEqual(frame['big'].iloc[0], 9007199254740993)
+
+    def test_matches_read_sql_without_rows(self):
+        self._assert_matches_read_sql({"max_id": 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,351 @@
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+from .database import engine
+from .logging_config import get_logger
+from .shared_cache import DATA_VERSION_TTL, get_data_version
+
+logger = get_logger(__name__)
+
+# Source tables whose writes make group_daily_aggregates stale. Changes to
+# users are tracked through _users_fingerprint instead, since every login
+# updates users.last_login
+GROUP_AGGREGATE_SOURCES = ('health_metrics', 'questionnaire_data', 'user_groups')
+
+# Trailing days re-derived by refresh steps that cannot tell which rows are new
+REFRESH_LOOKBACK_DAYS = int(os.environ.get('AGGREGATES_REFRESH_LOOKBACK_DAYS', '14'))
+
+# New rows can commit with a created_at slightly older than the last watermark
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+def ensure_aggregate_tables():
+    """Create the materialized aggregate tables if they do not exist yet"""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS group_daily_aggregates (
+                group_id INTEGER NOT NULL,
+                date DATE NOT NULL,
+                physio_data_count INTEGER NOT NULL DEFAULT 0,
+                questionnaire_data_count INTEGER NOT NULL DEFAULT 0,
+                avg_resting_hr DOUBLE PRECISION,
+                avg_max_hr DOUBLE PRECISION,
+                avg_sleep_hours DOUBLE PRECISION,
+                avg_hrv_rest DOUBLE PRECISION,
+                avg_step_count DOUBLE PRECISION,
+                avg_sleep_quality DOUBLE PRECISION,
+                avg_fatigue_level DOUBLE PRECISION,
+                avg_motivation_level DOUBLE PRECISION,
+                refreshed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (group_id, date)
+            )
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS group_daily_aggregates_date_idx
+            ON group_daily_aggregates (date)
+        """))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS aggregate_refresh_state (
+                name TEXT PRIMARY KEY,
+                watermark TIMESTAMP,
+                source_versions BIGINT[],
+                refreshed_at TIMESTAMP NOT NULL
+            )
+        """))
+        conn.execute(text("""
+            ALTER TABLE aggregate_refresh_state
+            ADD COLUMN IF NOT EXISTS rewrite_versions BIGINT[]
+        """))
+
+
+def get_refresh_state(conn, name):
+    """
+    Get the stored refresh state for one materialized table
+
+    Args:
+        conn: Open SQLAlchemy connection
+        name: Name of the materialized table
+
+    Returns:
+        Dictionary with watermark, source_versions, rewrite_versions and
+        refreshed_at, or None
+    """
+    row = conn.execute(text("""
+        SELECT watermark, source_versions, rewrite_versions, refreshed_at
+        FROM aggregate_refresh_state
+        WHERE name = :name
+    """), {"name": name}).fetchone()
+    if row is None:
+        return None
+    return {
+        "watermark": row[0],
+        "source_versions": row[1],
+        "rewrite_versions": row[2],
+        "refreshed_at": row[3],
+    }
+
+
+def save_refresh_state(conn, name, watermark, source_versions, rewrite_versions=None):
+    """
+    Record how far a materialized table has been refreshed
+
+    Args:
+        conn: Open SQLAlchemy connection
+        name: Name of the materialized table
+        watermark: Newest source created_at the refresh covered
+        source_versions: Source table versions the table now reflects
+        rewrite_versions: Optional counters of the writes an incremental
+            refresh cannot follow, compared before the next one
+    """
+    conn.execute(text("""
+        INSERT INTO aggregate_refresh_state (name, watermark, source_versions, rewrite_versions, refreshed_at)
+        VALUES (:name, :watermark, :source_versions, :rewrite_versions, CURRENT_TIMESTAMP)
+        ON CONFLICT (name) DO UPDATE SET
+            watermark = EXCLUDED.watermark,
+            source_versions = EXCLUDED.source_versions,
+            rewrite_versions = EXCLUDED.rewrite_versions,
+            refreshed_at = EXCLUDED.refreshed_at
+    """), {
+        "name": name,
+        "watermark": watermark,
+        "source_versions": list(source_versions),
+        "rewrite_versions": list(rewrite_versions) if rewrite_versions is not None else None,
+    })
+
+
+def has_column(conn, table, column):
+    """Check whether a table in the current schema has a column"""
+    row = conn.execute(text("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column
+    """), {"table": table, "column": column}).fetchone()
+    return row is not None
+
+
+def _latest_created_at(conn):
+    """
+    Get the newest created_at across the health and questionnaire tables
+
+    Returns:
+        Timestamp, or None if the tables do not track created_at
+    """
+    if not (has_column(conn, 'health_metrics', 'created_at')
+            and has_column(conn, 'questionnaire_data', 'created_at')):
+        return None
+    latest = conn.execute(text("""
+        SELECT GREATEST(
+            (SELECT MAX(created_at) FROM health_metrics),
+            (SELECT MAX(created_at) FROM questionnaire_data)
+        )
+    """)).scalar()
+    return latest or datetime.min
+
+
+def _users_fingerprint(conn):
+    """
+    Get a number that changes when users are added, removed or change role
+
+    Unlike the pg_stat_user_tables counters it ignores last_login updates.
+    """
+    return conn.execute(text("""
+        SELECT COALESCE(SUM(hashtext(id::text || ':' || role)::bigint), 0) FROM users
+    """)).scalar()
+
+
+def rewrite_counters(conn):
+    """
+    Count the writes the created_at watermark cannot follow
+
+    Updates and deletes of health and questionnaire rows (of any date) and
+    group membership changes all require a full refresh.
+
+    Returns:
+        Tuple of counters to compare with the ones saved by the last refresh
+    """
+    rows = dict(conn.execute(text("""
+        SELECT relname, n_tup_upd + n_tup_del
+        FROM pg_stat_user_tables
+        WHERE relname IN ('health_metrics', 'questionnaire_data')
+    """)).fetchall())
+    memberships = get_data_version(('user_groups',), fresh=True)
+    return (
+        int(rows.get('health_metrics', 0)),
+        int(rows.get('questionnaire_data', 0)),
+        *memberships,
+        int(_users_fingerprint(conn)),
+    )
+
+
+def _changed_dates(conn, watermark, latest):
+    """
+    Find the dates that received health or questionnaire rows since the watermark
+
+    Returns:
+        Tuple of (list of dates, new watermark)
+    """
+    since = watermark - WATERMARK_OVERLAP
+    rows = conn.execute(text("""
+        SELECT DISTINCT date FROM health_metrics WHERE created_at > :since
+        UNION
+        SELECT DISTINCT date FROM questionnaire_data WHERE created_at > :since
+    """), {"since": since}).fetchall()
+    return [row[0] for row in rows], max(latest, watermark)
+
+
+def refresh_group_daily_aggregates(full=False):
+    """
+    Bring group_daily_aggregates up to date
+
+    Only dates that received new health_metrics or questionnaire_data rows
+    since the last refresh are recomputed. Everything is rebuilt when full is
+    set, on the first refresh, when the sources have no created_at column,
+    and after updates, deletes, membership or role changes, which new-row
+    tracking cannot see.
+
+    Args:
+        full: Recompute every date
+
+    Returns:
+        Number of dates recomputed, or None for a full refresh
+    """
+    ensure_aggregate_tables()
+
+    with engine.begin() as conn:
+        # Read before computing so writes made during the refresh count as stale
+        rewrites = rewrite_counters(conn)
+        source_versions = get_data_version(GROUP_AGGREGATE_SOURCES, fresh=True) + (rewrites[-1],)
+        latest = _latest_created_at(conn)
+        state = get_refresh_state(conn, 'group_daily_aggregates')
+
+        incremental = (
+            not full
+            and state is not None
+            and state["watermark"] is not None
+            and latest is not None
+            and tuple(state["rewrite_versions"] or ()) == rewrites
+        )
+        if not incremental:
+            dates = None
+            date_filter_hm = date_filter_qd = ""
+            params = {}
+            watermark = latest or datetime.now()
+            conn.execute(text("DELETE FROM group_daily_aggregates"))
+        else:
+            dates, watermark = _changed_dates(conn, state["watermark"], latest)
+            if not dates:
+                save_refresh_state(conn, 'group_daily_aggregates', watermark, source_versions, rewrites)
+                logger.info("group_daily_aggregates already up to date")
+                return 0
+            date_filter_hm = "AND hm.date = ANY(:dates)"
+            date_filter_qd = "AND qd.date = ANY(:dates)"
+            params = {"dates": dates}
+            conn.execute(text("DELETE FROM group_daily_aggregates WHERE date = ANY(:dates)"), params)
+
+        conn.execute(text(f"""
+            WITH group_participants AS (
+                SELECT ug.group_id, u.id as user_id
+                FROM users u
+                JOIN user_groups ug ON u.id = ug.user_id
+                WHERE u.role = 'participant'
+            ),
+            daily_health_aggregates AS (
+                SELECT
+                    gp.group_id,
+                    hm.date,
+                    COUNT(DISTINCT hm.user_id) as physio_data_count,
+                    AVG(hm.resting_hr) as avg_resting_hr,
+                    AVG(hm.max_hr) as avg_max_hr,
+                    AVG(hm.sleep_hours) as avg_sleep_hours,
+                    AVG(hm.hrv_rest) as avg_hrv_rest,
+                    AVG(hm.step_count) as avg_step_count
+                FROM health_metrics hm
+                JOIN group_participants gp ON hm.user_id = gp.user_id
+                WHERE TRUE {date_filter_hm}
+                GROUP BY gp.group_id, hm.date
+            ),
+            daily_questionnaire_aggregates AS (
+                SELECT
+                    gp.group_id,
+                    qd.date,
+                    COUNT(DISTINCT qd.user_id) as questionnaire_data_count,
+                    AVG(qd.perceived_sleep_quality) as avg_sleep_quality,
+                    AVG(qd.fatigue_level) as avg_fatigue_level,
+                    AVG(qd.motivation_level) as avg_motivation_level
+                FROM questionnaire_data qd
+                JOIN group_participants gp ON qd.user_id = gp.user_id
+                WHERE TRUE {date_filter_qd}
+                GROUP BY gp.group_id, qd.date
+            )
+            INSERT INTO group_daily_aggregates (
+                group_id, date, physio_data_count, questionnaire_data_count,
+                avg_resting_hr, avg_max_hr, avg_sleep_hours, avg_hrv_rest, avg_step_count,
+                avg_sleep_quality, avg_fatigue_level, avg_motivation_level, refreshed_at
+            )
+            SELECT
+                COALESCE(dha.group_id, dqa.group_id),
+                COALESCE(dha.date, dqa.date),
+                COALESCE(dha.physio_data_count, 0),
+                COALESCE(dqa.questionnaire_data_count, 0),
+                dha.avg_resting_hr,
+                dha.avg_max_hr,
+                dha.avg_sleep_hours,
+                dha.avg_hrv_rest,
+                dha.avg_step_count,
+                dqa.avg_sleep_quality,
+                dqa.avg_fatigue_level,
+                dqa.avg_motivation_level,
+                CURRENT_TIMESTAMP
+            FROM daily_health_aggregates dha
+            FULL OUTER JOIN daily_questionnaire_aggregates dqa
+                ON dha.date = dqa.date AND dha.group_id = dqa.group_id
+        """), params)
+
+        save_refresh_state(conn, 'group_daily_aggregates', watermark, source_versions, rewrites)
+
+    if dates is None:
+        logger.info("Rebuilt group_daily_aggregates")
+    else:
+        logger.info(f"Refreshed group_daily_aggregates for {len(dates)} dates")
+    return None if dates is None else len(dates)
+
+
+_fresh_lock = threading.Lock()
+_fresh_cache = {}
+
+
+def group_aggregates_fresh():
+    """
+    Check whether group_daily_aggregates reflects the current source tables
+
+    The answer is kept per worker for DATA_VERSION_TTL seconds.
+
+    Returns:
+        True if no relevant writes happened since the last refresh
+    """
+    now = time.monotonic()
+    with _fresh_lock:
+        cached = _fresh_cache.get('group_daily_aggregates')
+        if cached and cached[0] > now:
+            return cached[1]
+
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(text("""
+                SELECT source_versions FROM aggregate_refresh_state
+                WHERE name = 'group_daily_aggregates'
+            """)).fetchone()
+            fresh = (
+                row is not None and row[0] is not None
+                and tuple(row[0]) == get_data_version(GROUP_AGGREGATE_SOURCES) + (_users_fingerprint(conn),)
+            )
+    except Exception as e:
+        logger.debug(f"group_daily_aggregates not available: {e}")
+        fresh = False
+
+    with _fresh_lock:
+        _fresh_cache['group_daily_aggregates'] = (now + DATA_VERSION_TTL, fresh)
+    return fresh
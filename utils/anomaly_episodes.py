@@ -0,0 +1,152 @@
+from datetime import date as date_type, datetime, timedelta
+import os
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from .aggregates import REFRESH_LOOKBACK_DAYS
+from .database import engine
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Scores above this count towards an anomaly episode
+ANOMALY_EPISODE_THRESHOLD = float(os.environ.get('ANOMALY_EPISODE_THRESHOLD', '0.8'))
+
+EPISODE_COLUMNS = ['user_id', 'start_time', 'end_time', 'slot_count', 'peak_score', 'mean_score']
+
+_EPOCH = np.datetime64('1970-01-01T00:00', 'm')
+
+
+def ensure_anomaly_episodes_table():
+    """Create the anomaly_episodes table if it does not exist yet"""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS anomaly_episodes (
+                user_id INTEGER NOT NULL,
+                start_time TIMESTAMP NOT NULL,
+                end_time TIMESTAMP NOT NULL,
+                slot_count INTEGER NOT NULL,
+                peak_score DOUBLE PRECISION NOT NULL,
+                mean_score DOUBLE PRECISION NOT NULL,
+                PRIMARY KEY (user_id, start_time)
+            )
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS anomaly_episodes_end_time_idx
+            ON anomaly_episodes (end_time)
+        """))
+
+
+def find_episodes(df):
+    """
+    Find runs of consecutive minutes scoring above the threshold
+
+    A run ends at the first slot that is missing or not above the threshold,
+    and may cross midnight. Works on the whole frame at once: slots become
+    minutes since the epoch, run starts are where that minute does not follow
+    the previous one (or the participant changes), and each run is reduced
+    with np.maximum.reduceat / np.add.reduceat.
+
+    Args:
+        df: DataFrame with user_id, date, time_slot and score columns
+
+    Returns:
+        DataFrame with one row per episode and EPISODE_COLUMNS
+    """
+    above = df[df['score'] > ANOMALY_EPISODE_THRESHOLD].sort_values(['user_id', 'date', 'time_slot'])
+    if above.empty:
+        return pd.DataFrame(columns=EPISODE_COLUMNS)
+
+    users = above['user_id'].to_numpy(dtype='int64')
+    days = pd.to_datetime(above['date']).to_numpy().astype('datetime64[D]').astype('int64')
+    minutes = days * 1440 + above['time_slot'].to_numpy(dtype='int64')
+    scores = above['score'].to_numpy(dtype='float64')
+
+    new_run = np.ones(len(minutes), dtype=bool)
+    new_run[1:] = (np.diff(minutes) != 1) | (np.diff(users) != 0)
+    starts = np.flatnonzero(new_run)
+    ends = np.append(starts[1:], len(minutes)) - 1
+    counts = ends - starts + 1
+
+    return pd.DataFrame({
+        'user_id': users[starts],
+        'start_time': _EPOCH + minutes[starts].astype('timedelta64[m]'),
+        'end_time': _EPOCH + minutes[ends].astype('timedelta64[m]'),
+        'slot_count': counts,
+        'peak_score': np.maximum.reduceat(scores, starts),
+        'mean_score': np.add.reduceat(scores, starts) / counts,
+    }, columns=EPISODE_COLUMNS)
+
+
+def refresh_anomaly_episodes(full=False):
+    """
+    Rebuild anomaly_episodes from anomaly_scores
+
+    Only the trailing REFRESH_LOOKBACK_DAYS are rebuilt unless full is set.
+    The re-scan starts where no stored episode is running and replaces every
+    episode overlapping it, so a run crossing midnight is never split or
+    stored twice. Only slots above the threshold are read.
+
+    Args:
+        full: Rebuild every episode instead of the trailing days
+
+    Returns:
+        Number of episodes written
+    """
+    ensure_anomaly_episodes_table()
+
+    params = {"threshold": ANOMALY_EPISODE_THRESHOLD}
+
+    with engine.begin() as conn:
+        since = None
+        if not full:
+            # Move the window start back to the start of any episode still
+            # running there, until no episode crosses it; episodes of other
+            # participants can straddle the new start, hence the loop
+            since = datetime.combine(date_type.today() - timedelta(days=REFRESH_LOOKBACK_DAYS), datetime.min.time())
+            while True:
+                running_since = conn.execute(text("""
+                    SELECT MIN(start_time) FROM anomaly_episodes
+                    WHERE end_time >= :since AND start_time < :since
+                """), {"since": since}).scalar()
+                if running_since is None:
+                    break
+                since = running_since
+            params["since"] = since
+            params["since_slot"] = since.hour * 60 + since.minute
+        since_filter = """
+            AND (date > CAST(:since AS date)
+                 OR (date = CAST(:since AS date) AND time_slot >= :since_slot))
+        """ if since is not None else ""
+
+        scores = pd.read_sql(text(f"""
+            SELECT user_id, date, time_slot, score
+            FROM anomaly_scores
+            WHERE score > :threshold {since_filter}
+        """), conn, params=params)
+        episodes = find_episodes(scores)
+
+        conn.execute(text(f"""
+            DELETE FROM anomaly_episodes
+            {"WHERE end_time >= :since" if since is not None else ""}
+        """), params)
+        if not episodes.empty:
+            conn.execute(text("""
+                INSERT INTO anomaly_episodes (user_id, start_time, end_time, slot_count, peak_score, mean_score)
+                VALUES (:user_id, :start_time, :end_time, :slot_count, :peak_score, :mean_score)
+            """), [
+                {
+                    "user_id": int(row.user_id),
+                    "start_time": row.start_time.to_pydatetime(),
+                    "end_time": row.end_time.to_pydatetime(),
+                    "slot_count": int(row.slot_count),
+                    "peak_score": float(row.peak_score),
+                    "mean_score": float(row.mean_score),
+                }
+                for row in episodes.itertuples(index=False)
+            ])
+
+    logger.info(f"Indexed {len(episodes)} anomaly episodes")
+    return len(episodes)
@@ -0,0 +1,197 @@
+from datetime import datetime
+import threading
+import time
+
+from sqlalchemy import text
+
+from .aggregates import ensure_aggregate_tables, get_refresh_state, save_refresh_state
+from .database import engine
+from .logging_config import get_logger
+from .shared_cache import DATA_VERSION_TTL
+
+logger = get_logger(__name__)
+
+
+def ensure_anomaly_hourly():
+    """
+    Create anomaly_hourly and the triggers that keep it in sync
+
+    Statement-level triggers on anomaly_scores recompute only the hourly
+    cells (participant, day, hour) whose slots a statement touched, in the
+    same transaction, so the rollup is maintained at ingestion time without
+    the loader changing. A single-row insert re-reads at most 60 slots.
+    Concurrent writers of the same participant-day are serialized with an
+    advisory lock and the cells are upserted, so a rollup conflict can never
+    abort the ingestion write. TRUNCATE of anomaly_scores empties the rollup.
+    """
+    ensure_aggregate_tables()
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS anomaly_hourly (
+                user_id INTEGER NOT NULL,
+                date DATE NOT NULL,
+                hour SMALLINT NOT NULL,
+                mean_score DOUBLE PRECISION,
+                max_score DOUBLE PRECISION,
+                slot_count INTEGER NOT NULL,
+                PRIMARY KEY (user_id, date, hour)
+            )
+        """))
+        conn.execute(text("""
+            CREATE OR REPLACE FUNCTION anomaly_hourly_rebuild(user_ids INTEGER[], dates DATE[], hours SMALLINT[])
+            RETURNS void AS $$
+            BEGIN
+                -- Serialize writers of the same participant-day, in a fixed
+                -- order so two transactions cannot deadlock. Each statement
+                -- below takes a new snapshot, so it sees the rows of any
+                -- transaction that held the lock before
+                PERFORM pg_advisory_xact_lock(key)
+                FROM (
+                    SELECT DISTINCT hashtextextended('anomaly_hourly:' || user_id || ':' || date, 0) AS key
+                    FROM unnest(user_ids, dates) AS k(user_id, date)
+                    ORDER BY 1
+                ) keys;
+
+                -- Cells whose slots are all gone
+                DELETE FROM anomaly_hourly h
+                USING unnest(user_ids, dates, hours) AS k(user_id, date, hour)
+                WHERE h.user_id = k.user_id AND h.date = k.date AND h.hour = k.hour
+                AND NOT EXISTS (
+                    SELECT 1 FROM anomaly_scores s
+                    WHERE s.user_id = k.user_id AND s.date = k.date
+                    AND s.time_slot BETWEEN k.hour * 60 AND k.hour * 60 + 59
+                );
+
+                INSERT INTO anomaly_hourly (user_id, date, hour, mean_score, max_score, slot_count)
+                SELECT k.user_id, k.date, k.hour, AVG(s.score), MAX(s.score), COUNT(s.score)
+                FROM (SELECT DISTINCT * FROM unnest(user_ids, dates, hours) AS k(user_id, date, hour)) k
+                JOIN anomaly_scores s
+                    ON s.user_id = k.user_id AND s.date = k.date
+                    AND s.time_slot BETWEEN k.hour * 60 AND k.hour * 60 + 59
+                GROUP BY k.user_id, k.date, k.hour
+                ON CONFLICT (user_id, date, hour) DO UPDATE SET
+                    mean_score = EXCLUDED.mean_score,
+                    max_score = EXCLUDED.max_score,
+                    slot_count = EXCLUDED.slot_count;
+            END;
+            $$ LANGUAGE plpgsql
+        """))
+        conn.execute(text("""
+            CREATE OR REPLACE FUNCTION anomaly_hourly_sync() RETURNS trigger AS $$
+            DECLARE
+                user_ids INTEGER[];
+                dates DATE[];
+                hours SMALLINT[];
+            BEGIN
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    SELECT array_agg(user_id), array_agg(date), array_agg(hour) INTO user_ids, dates, hours
+                    FROM (SELECT DISTINCT user_id, date, (time_slot / 60)::smallint AS hour FROM new_rows) k;
+                    PERFORM anomaly_hourly_rebuild(user_ids, dates, hours);
+                END IF;
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    SELECT array_agg(user_id), array_agg(date), array_agg(hour) INTO user_ids, dates, hours
+                    FROM (SELECT DISTINCT user_id, date, (time_slot / 60)::smallint AS hour FROM old_rows) k;
+                    PERFORM anomaly_hourly_rebuild(user_ids, dates, hours);
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """))
+        conn.execute(text("""
+            CREATE OR REPLACE FUNCTION anomaly_hourly_truncate() RETURNS trigger AS $$
+            BEGIN
+                TRUNCATE anomaly_hourly;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """))
+        # Superseded by the per-hour version above
+        conn.execute(text("DROP FUNCTION IF EXISTS anomaly_hourly_rebuild(INTEGER[], DATE[])"))
+        # Transition tables allow a single event per trigger. DROP + CREATE
+        # rather than CREATE OR REPLACE TRIGGER, which needs PostgreSQL 14
+        triggers = [
+            ('INSERT', 'REFERENCING NEW TABLE AS new_rows', 'anomaly_hourly_sync'),
+            ('UPDATE', 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows', 'anomaly_hourly_sync'),
+            ('DELETE', 'REFERENCING OLD TABLE AS old_rows', 'anomaly_hourly_sync'),
+            ('TRUNCATE', '', 'anomaly_hourly_truncate'),
+        ]
+        for event, referencing, function in triggers:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS anomaly_hourly_{event.lower()} ON anomaly_scores"))
+            conn.execute(text(f"""
+                CREATE TRIGGER anomaly_hourly_{event.lower()}
+                AFTER {event} ON anomaly_scores
+                {referencing}
+                FOR EACH STATEMENT EXECUTE FUNCTION {function}()
+            """))
+
+
+def refresh_anomaly_hourly(full=False):
+    """
+    Install the anomaly_hourly triggers and backfill the rollup
+
+    Once backfilled the triggers keep the table current, so later runs only
+    rebuild it when full is set.
+
+    Args:
+        full: Rebuild every participant-day
+
+    Returns:
+        Number of hourly cells written
+    """
+    ensure_anomaly_hourly()
+
+    with engine.begin() as conn:
+        state = get_refresh_state(conn, 'anomaly_hourly')
+        if state is not None and not full:
+            logger.info("anomaly_hourly is maintained by triggers, nothing to do")
+            return 0
+
+        conn.execute(text("DELETE FROM anomaly_hourly"))
+        written = conn.execute(text("""
+            INSERT INTO anomaly_hourly (user_id, date, hour, mean_score, max_score, slot_count)
+            SELECT user_id, date, time_slot / 60, AVG(score), MAX(score), COUNT(score)
+            FROM anomaly_scores
+            GROUP BY user_id, date, time_slot / 60
+            ON CONFLICT (user_id, date, hour) DO UPDATE SET
+                mean_score = EXCLUDED.mean_score,
+                max_score = EXCLUDED.max_score,
+                slot_count = EXCLUDED.slot_count
+        """)).rowcount
+        save_refresh_state(conn, 'anomaly_hourly', datetime.now(), ())
+
+    logger.info(f"Rebuilt anomaly_hourly with {written} cells")
+    return written
+
+
+_ready_lock = threading.Lock()
+_ready_until = 0.0
+_ready = False
+
+
+def anomaly_hourly_ready():
+    """
+    Check whether anomaly_hourly has been backfilled
+
+    The answer is kept per worker for DATA_VERSION_TTL seconds.
+
+    Returns:
+        True if the rollup can be read instead of anomaly_scores
+    """
+    global _ready_until, _ready
+    now = time.monotonic()
+    with _ready_lock:
+        if _ready_until > now:
+            return _ready
+
+    try:
+        with engine.connect() as conn:
+            ready = conn.execute(text("""
+                SELECT 1 FROM aggregate_refresh_state WHERE name = 'anomaly_hourly'
+            """)).fetchone() is not None
+    except Exception as e:
+        logger.debug(f"anomaly_hourly not available: {e}")
+        ready = False
+
+    with _ready_lock:
+        _ready_until, _ready = now + DATA_VERSION_TTL, ready
+    return ready
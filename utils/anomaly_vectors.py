@@ -0,0 +1,213 @@
+"""
+Compact storage of anomaly scores as one row per participant and day
+
+anomaly_scores keeps one row per (user, date, time_slot), so a month of
+per-minute scores is ~43k rows to fetch and convert. anomaly_score_vectors
+packs a day into a single row: the time slots as big-endian int2, the scores
+as big-endian float4 (NULL stored as NaN) and the labels as int2 codes into a
+per-day list of distinct labels. Loading decodes each vector with
+numpy.frombuffer instead of building Python objects per minute.
+
+Usage:
+    python -m utils.anomaly_vectors [--user-id 12] [--start 2024-05-01] [--end 2024-05-31]
+"""
+import argparse
+from datetime import date as date_type, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from .aggregates import REFRESH_LOOKBACK_DAYS
+from .database import engine
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+ANOMALY_VECTOR_COLUMNS = ['date', 'time_slot', 'score', 'label']
+
+
+def ensure_anomaly_vector_table():
+    """Create the anomaly_score_vectors table if it does not exist yet"""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS anomaly_score_vectors (
+                user_id INTEGER NOT NULL,
+                date DATE NOT NULL,
+                slot_count INTEGER NOT NULL,
+                time_slots BYTEA NOT NULL,
+                scores BYTEA NOT NULL,
+                label_codes BYTEA NOT NULL,
+                labels TEXT[] NOT NULL,
+                packed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, date)
+            )
+        """))
+
+
+def migrate_anomaly_vectors(user_id=None, start_date=None, end_date=None):
+    """
+    Pack anomaly_scores rows into anomaly_score_vectors
+
+    Days already packed are overwritten, so running it again after new scores
+    arrived brings them up to date. The packing happens in Postgres with
+    int2send/float4send, nothing is pulled into Python.
+
+    Args:
+        user_id: Only pack this participant (optional)
+        start_date: First date to pack (optional)
+        end_date: Last date to pack (optional)
+
+    Returns:
+        Number of participant-days written
+    """
+    ensure_anomaly_vector_table()
+
+    filters = []
+    params = {}
+    if user_id is not None:
+        filters.append("s.user_id = :user_id")
+        params["user_id"] = user_id
+    if start_date is not None:
+        filters.append("s.date >= :start_date")
+        params["start_date"] = start_date
+    if end_date is not None:
+        filters.append("s.date <= :end_date")
+        params["end_date"] = end_date
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+
+    with engine.begin() as conn:
+        result = conn.execute(text(f"""
+            WITH day_labels AS (
+                SELECT
+                    s.user_id, s.date,
+                    COALESCE(
+                        array_agg(DISTINCT s.label ORDER BY s.label) FILTER (WHERE s.label IS NOT NULL),
+                        '{{}}'
+                    ) AS labels
+                FROM anomaly_scores s
+                {where}
+                GROUP BY s.user_id, s.date
+            )
+            INSERT INTO anomaly_score_vectors (
+                user_id, date, slot_count, time_slots, scores, label_codes, labels, packed_at
+            )
+            SELECT
+                s.user_id,
+                s.date,
+                COUNT(*),
+                string_agg(int2send(s.time_slot::int2), '' ORDER BY s.time_slot),
+                string_agg(float4send(COALESCE(s.score::float4, 'NaN')), '' ORDER BY s.time_slot),
+                string_agg(
+                    int2send(COALESCE(array_position(dl.labels, s.label) - 1, -1)::int2),
+                    '' ORDER BY s.time_slot
+                ),
+                dl.labels,
+                CURRENT_TIMESTAMP
+            FROM anomaly_scores s
+            JOIN day_labels dl ON dl.user_id = s.user_id AND dl.date = s.date
+            {where}
+            GROUP BY s.user_id, s.date, dl.labels
+            ON CONFLICT (user_id, date) DO UPDATE SET
+                slot_count = EXCLUDED.slot_count,
+                time_slots = EXCLUDED.time_slots,
+                scores = EXCLUDED.scores,
+                label_codes = EXCLUDED.label_codes,
+                labels = EXCLUDED.labels,
+                packed_at = EXCLUDED.packed_at
+        """), params)
+        written = result.rowcount
+
+    logger.info(f"Packed {written} participant-days into anomaly_score_vectors")
+    return written
+
+
+def refresh_anomaly_vectors(full=False):
+    """
+    Refresh step keeping anomaly_score_vectors in line with anomaly_scores
+
+    Scores are written for recent days, so only the trailing
+    REFRESH_LOOKBACK_DAYS are repacked unless full is set.
+    """
+    if full:
+        return migrate_anomaly_vectors()
+    return migrate_anomaly_vectors(start_date=date_type.today() - timedelta(days=REFRESH_LOOKBACK_DAYS))
+
+
+def decode_anomaly_vectors(rows):
+    """
+    Decode packed days into the same frame the row-per-minute query returns
+
+    Args:
+        rows: Sequence of (date, time_slots, scores, label_codes, labels) tuples,
+              ordered by date
+
+    Returns:
+        Pandas DataFrame with date, time_slot, score and label columns
+    """
+    if not rows:
+        return pd.DataFrame(columns=ANOMALY_VECTOR_COLUMNS)
+
+    dates, slots, scores, labels = [], [], [], []
+    for day, time_slots, day_scores, label_codes, day_labels in rows:
+        day_slots = np.frombuffer(time_slots, dtype='>i2')
+        slots.append(day_slots)
+        scores.append(np.frombuffer(day_scores, dtype='>f4'))
+        dates.append(np.full(len(day_slots), day, dtype=object))
+        # Code -1 (no label) picks the trailing None
+        lookup = np.array(list(day_labels) + [None], dtype=object)
+        labels.append(lookup[np.frombuffer(label_codes, dtype='>i2')])
+
+    return pd.DataFrame({
+        'date': np.concatenate(dates),
+        'time_slot': np.concatenate(slots).astype(np.int64),
+        'score': np.concatenate(scores).astype(np.float64),
+        'label': np.concatenate(labels),
+    }, columns=ANOMALY_VECTOR_COLUMNS)
+
+
+def load_anomaly_vectors(conn, user_id, date=None, start_date=None, end_date=None):
+    """
+    Load anomaly scores for a participant from anomaly_score_vectors
+
+    Args:
+        conn: Open SQLAlchemy connection
+        user_id: User ID
+        date: Specific date to load (optional)
+        start_date: Start date for range (optional)
+        end_date: End date for range (optional)
+
+    Returns:
+        Pandas DataFrame with date, time_slot, score and label columns
+    """
+    if date:
+        condition = "date = :date"
+        params = {"user_id": user_id, "date": date}
+    elif start_date and end_date:
+        condition = "date BETWEEN :start_date AND :end_date"
+        params = {"user_id": user_id, "start_date": start_date, "end_date": end_date}
+    else:
+        condition = "date = (SELECT MAX(date) FROM anomaly_score_vectors WHERE user_id = :user_id)"
+        params = {"user_id": user_id}
+
+    rows = conn.execute(text(f"""
+        SELECT date, time_slots, scores, label_codes, labels
+        FROM anomaly_score_vectors
+        WHERE user_id = :user_id AND {condition}
+        ORDER BY date
+    """), params).fetchall()
+    return decode_anomaly_vectors(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", type=int, help="only pack this participant")
+    parser.add_argument("--start", type=date_type.fromisoformat, help="first date to pack")
+    parser.add_argument("--end", type=date_type.fromisoformat, help="last date to pack")
+    args = parser.parse_args()
+
+    migrate_anomaly_vectors(user_id=args.user_id, start_date=args.start, end_date=args.end)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import os
+import threading
+
+from .database import engine
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Never run more queries at once than the pool holds without overflowing, so
+# a fan-out cannot starve other requests in the same worker of connections
+MAX_WORKERS = int(os.environ.get('DB_FANOUT_MAX_WORKERS', str(engine.pool.size())))
+
+_executor = None
+_executor_lock = threading.Lock()
+_local = threading.local()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='db-fanout')
+    return _executor
+
+
+def _run_in_pool(context, call):
+    _local.in_pool = True
+    try:
+        return context.run(call)
+    finally:
+        _local.in_pool = False
+
+
+def run_concurrently(*calls):
+    """
+    Run independent blocking calls in parallel and wait for all of them
+
+    Each call runs in a copy of the caller's context, so the Flask request,
+    flask.g (and with it the per-request query memo) and Dash's callback
+    context stay available. Calls made from inside a pool thread, or with
+    MAX_WORKERS set to 1, run one after the other instead.
+
+    Args:
+        *calls: Zero-argument callables, e.g. functools.partial objects
+
+    Returns:
+        List with the result of each call, in the order given
+
+    Raises:
+        The first exception raised by any call, after all of them finished
+    """
+    if len(calls) < 2 or MAX_WORKERS < 2 or getattr(_local, 'in_pool', False):
+        return [call() for call in calls]
+
+    executor = _get_executor()
+    futures = [
+        executor.submit(_run_in_pool, contextvars.copy_context(), call)
+        for call in calls
+    ]
+
+    results = []
+    error = None
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            if error is None:
+                error = e
+            results.append(None)
+    if error is not None:
+        raise error
+    return results
+
@@ -0,0 +1,283 @@
+import io
+import struct
+import threading
+
+import numpy as np
+import pandas as pd
+from psycopg2.extensions import encodings as pg_encodings
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Postgres type OID -> (SQL type sent, big-endian NumPy dtype, kind). Every
+# column is sent without NULLs so all data tuples have the same width: floats
+# carry NULL as NaN, the other kinds get an extra "is null" flag field
+_FIXED_TYPES = {
+    21: ('int2', '>i2', 'int'),
+    23: ('int4', '>i4', 'int'),
+    20: ('int8', '>i8', 'int'),
+    700: ('float4', '>f4', 'float'),
+    701: ('float8', '>f8', 'float'),
+    1700: ('float8', '>f8', 'float'),  # numeric, read as float like pd.read_sql does
+    16: ('bool', 'u1', 'bool'),
+    1082: ('date', '>i4', 'date'),
+    1114: ('timestamp', '>i8', 'timestamp'),
+}
+# Text columns are sent as int4 codes into a sorted dictionary (0 is NULL)
+_TEXT_TYPES = {25, 1043}  # text, varchar
+
+# Binary dates and timestamps count from 2000-01-01
+_POSTGRES_EPOCH_DAYS = 10957
+_POSTGRES_EPOCH_MICROS = _POSTGRES_EPOCH_DAYS * 86400 * 1000000
+
+# "PGCOPY\n\377\r\n\0" followed by the flags and header extension length
+_COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+
+# Result columns per query text, so the describe round trip happens once
+_descriptions = {}
+_descriptions_lock = threading.Lock()
+
+
+class UnsupportedCopyType(Exception):
+    """The result has a column type the binary COPY reader cannot decode"""
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _describe(cursor, template, sql):
+    """Get the (name, type oid) of each result column without running the query"""
+    with _descriptions_lock:
+        columns = _descriptions.get(template)
+    if columns is None:
+        # A constant-false filter is checked once, before the query runs
+        cursor.execute(f"SELECT * FROM ({sql}) q WHERE false")
+        columns = [(column.name, column.type_code) for column in cursor.description]
+        with _descriptions_lock:
+            _descriptions[template] = columns
+    return columns
+
+
+def _copy_plan(sql, columns):
+    """
+    Build the COPY statement for a query and the layout of its tuples
+
+    Returns:
+        Tuple of (COPY statement, list of field dtypes, whether the first
+        tuple is the text dictionary header)
+    """
+    fields = []       # (SQL expression, SQL type, dtype)
+    dictionaries = []
+    for name, type_oid in columns:
+        column = f"q.{_quote(name)}"
+        if type_oid in _TEXT_TYPES:
+            alias = _quote(f"d{len(dictionaries)}")
+            dictionaries.append((alias, column))
+            fields.append((f"COALESCE(array_position(d.{alias}, {column}::text), 0)::int4", 'int4', '>i4'))
+            continue
+        if type_oid not in _FIXED_TYPES:
+            raise UnsupportedCopyType(f"column {name} has type oid {type_oid}")
+        sql_type, dtype, kind = _FIXED_TYPES[type_oid]
+        if kind == 'float':
+            fields.append((f"COALESCE({column}::{sql_type}, 'NaN')", sql_type, dtype))
+            continue
+        placeholder = {
+            'int': "0", 'bool': "false", 'date': "DATE '2000-01-01'", 'timestamp': "TIMESTAMP '2000-01-01'",
+        }[kind]
+        fields.append((f"COALESCE({column}, {placeholder})", sql_type, dtype))
+        fields.append((f"{column} IS NULL", 'bool', 'u1'))
+
+    data = ', '.join(expression for expression, _, _ in fields)
+    dtypes = [dtype for _, _, dtype in fields]
+    if not dictionaries:
+        return f"COPY (SELECT {data} FROM ({sql}) q) TO STDOUT WITH (FORMAT binary)", dtypes, False
+
+    # One header tuple carries the dictionaries; every data tuple has NULL
+    # there, which keeps the data tuples fixed-width
+    arrays = ', '.join(
+        f"ARRAY(SELECT DISTINCT {column}::text FROM q WHERE {column} IS NOT NULL ORDER BY 1) AS {alias}"
+        for alias, column in dictionaries
+    )
+    header = ', '.join(
+        [f"NULL::{sql_type}" for _, sql_type, _ in fields] + [f"d.{alias}" for alias, _ in dictionaries]
+    )
+    data_row = ', '.join([data] + ["NULL::text[]"] * len(dictionaries))
+    statement = f"""
+        COPY (
+            WITH q AS MATERIALIZED ({sql}),
+            d AS (SELECT {arrays})
+            SELECT {header} FROM d
+            UNION ALL
+            SELECT {data_row} FROM q CROSS JOIN d
+        ) TO STDOUT WITH (FORMAT binary)
+    """
+    return statement, dtypes + [None] * len(dictionaries), True
+
+
+def _read_tuple(view, offset):
+    """Parse one variable-width tuple into raw field bytes (None for NULL)"""
+    n_fields = int.from_bytes(view[offset:offset + 2], 'big', signed=True)
+    offset += 2
+    values = []
+    for _ in range(n_fields):
+        length = int.from_bytes(view[offset:offset + 4], 'big', signed=True)
+        offset += 4
+        if length < 0:
+            values.append(None)
+        else:
+            values.append(bytes(view[offset:offset + length]))
+            offset += length
+    return values, offset
+
+
+def decode_text_array(raw, encoding='utf-8'):
+    """Decode a one-dimensional text[] in binary format into a list of str"""
+    if raw is None:
+        return []
+    ndim = struct.unpack_from('>i', raw, 0)[0]
+    if ndim == 0:
+        return []
+    size = struct.unpack_from('>i', raw, 12)[0]
+    offset = 20
+    values = []
+    for _ in range(size):
+        length = struct.unpack_from('>i', raw, offset)[0]
+        offset += 4
+        values.append(raw[offset:offset + length].decode(encoding))
+        offset += length
+    return values
+
+
+def decode_binary_copy(data, field_dtypes, header=False):
+    """
+    Decode COPY ... TO STDOUT (FORMAT binary) output with fixed-width tuples
+
+    Every data tuple has the same layout (field count, then a length and a
+    value per field), so the whole body is viewed as one big-endian NumPy
+    structured array instead of being parsed row by row.
+
+    Args:
+        data: Bytes written by COPY
+        field_dtypes: NumPy dtype of each field, or None for fields that are
+            NULL in every data tuple
+        header: Whether the first tuple is a variable-width header
+
+    Returns:
+        Tuple of (raw header fields or None, list of arrays, one per field
+        with a dtype)
+    """
+    view = memoryview(data)
+    if bytes(view[:11]) != _COPY_SIGNATURE:
+        raise ValueError("not binary COPY output")
+    extension_length = int.from_bytes(view[15:19], 'big')
+    offset = 19 + extension_length
+    end = len(view) - 2  # the trailer is a -1 field count
+
+    header_fields = None
+    if header:
+        header_fields, offset = _read_tuple(view, offset)
+
+    fields = [('field_count', '>i2')]
+    for i, dtype in enumerate(field_dtypes):
+        fields.append((f'length{i}', '>i4'))
+        if dtype is not None:
+            fields.append((f'value{i}', dtype))
+    row_dtype = np.dtype(fields)
+    body = view[offset:end]
+    if len(body) % row_dtype.itemsize:
+        raise ValueError("COPY output does not have fixed-width rows")
+
+    rows = np.frombuffer(body, dtype=row_dtype)
+    return header_fields, [
+        rows[f'value{i}'] for i, dtype in enumerate(field_dtypes) if dtype is not None
+    ]
+
+
+def _to_pandas(values, is_null, kind, dictionary=None):
+    """Turn a decoded column into what pd.read_sql would return"""
+    if kind == 'float':
+        return values.astype(np.float64)
+    if kind == 'text':
+        lookup = np.array([None] + dictionary, dtype=object)
+        return lookup[values.astype(np.int64)]
+
+    missing = is_null.astype(bool)
+    if kind == 'int':
+        if missing.any():
+            result = values.astype(np.float64)
+            result[missing] = np.nan
+            return result
+        return values.astype(np.int64)
+    if kind == 'bool':
+        if missing.any():
+            result = values.astype(bool).astype(object)
+            result[missing] = None
+            return result
+        return values.astype(bool)
+    if kind == 'date':
+        dates = (values.astype(np.int64) + _POSTGRES_EPOCH_DAYS).astype('datetime64[D]').astype(object)
+        dates[missing] = None
+        return dates
+    # Timestamp: microseconds are kept exactly
+    stamps = (values.astype(np.int64) + _POSTGRES_EPOCH_MICROS).astype('datetime64[us]').astype('datetime64[ns]')
+    stamps[missing] = np.datetime64('NaT')
+    return stamps
+
+
+def read_frame_via_copy(conn, query, params=None):
+    """
+    Run a SELECT and load its result through binary COPY into a DataFrame
+
+    The query runs inside COPY (...) TO STDOUT (FORMAT binary). Each column is
+    sent in its own binary type without NULLs, so every tuple has the same
+    width and decode_binary_copy reads the whole result as one NumPy array,
+    with no Python object per row or field. Text columns are sent as codes
+    into a dictionary that travels in a header tuple of the same COPY.
+
+    The result columns are described once per query text; after that every
+    read is a single round trip.
+
+    Args:
+        conn: Open SQLAlchemy connection using psycopg2
+        query: SQLAlchemy text() query
+        params: Bind parameters for the query
+
+    Returns:
+        Pandas DataFrame with the same columns, values and row order as
+        pd.read_sql
+
+    Raises:
+        UnsupportedCopyType: If a column type has no decoder
+    """
+    compiled = query.compile(dialect=conn.dialect)
+    template = str(compiled)
+    cursor = conn.connection.cursor()
+    try:
+        sql = cursor.mogrify(template, compiled.construct_params(params or {})).decode()
+        columns = _describe(cursor, template, sql)
+        statement, dtypes, header = _copy_plan(sql, columns)
+        buffer = io.BytesIO()
+        cursor.copy_expert(statement, buffer)
+        encoding = pg_encodings.get(cursor.connection.encoding, 'utf-8')
+    finally:
+        cursor.close()
+
+    header_fields, decoded = decode_binary_copy(buffer.getvalue(), dtypes, header)
+    if decoded and len(decoded[0]) == 0:
+        # pd.read_sql cannot infer types without rows either
+        return pd.DataFrame(columns=[name for name, _ in columns])
+    dictionaries = iter(decode_text_array(raw, encoding) for raw in header_fields[len(decoded):]) if header else None
+
+    frame = {}
+    values = iter(decoded)
+    for name, type_oid in columns:
+        if type_oid in _TEXT_TYPES:
+            frame[name] = _to_pandas(next(values), None, 'text', next(dictionaries))
+            continue
+        kind = _FIXED_TYPES[type_oid][2]
+        column = next(values)
+        is_null = None if kind == 'float' else next(values)
+        frame[name] = _to_pandas(column, is_null, kind)
+    return pd.DataFrame(frame, columns=[name for name, _ in columns])
@@ -1,10 +1,17 @@
 from datetime import datetime, timedelta
 import os
+import numpy as np
 import pandas as pd
 from sqlalchemy import create_engine, text
-from sqlalchemy.pool import QueuePool
 
+from .copy_reader import UnsupportedCopyType, read_frame_via_copy
+from .instrumentation import instrument_query, instrument_statements
 from .logging_config import get_logger
+from .metrics import InstrumentedQueuePool, instrument_pool
+from .query_cache import memoize_query
+from .ranking_engine import summarize_history_chunks
+from .shared_cache import shared_cached
+from .result_mapping import AVERAGE_DTYPES, COUNT_DTYPES, row_to_dict, rows_to_dicts, rows_to_frame
 
 logger = get_logger(__name__)
 
@@ -14,14 +21,20 @@ DATABASE_URL = os.environ.get('DATABASE_URL', 'postgresql://username:password@lo
 # Create SQLAlchemy engine with connection pooling
 engine = create_engine(
     DATABASE_URL,
-    poolclass=QueuePool,
+    poolclass=InstrumentedQueuePool,
     pool_size=5,
     max_overflow=10,
     pool_timeout=30,
     pool_recycle=3600  # Recycle connections after 1 hour
 )
+instrument_pool(engine)
+instrument_statements(engine)
 
 
+# Request scope only: load_user re-reads users through this once the user
+# cache sees a deactivation or role change, which must not come back stale
+@memoize_query()
+@instrument_query
 def get_user_by_id(user_id):
     """Get user by username from the database"""
     
@@ -37,18 +50,11 @@ def get_user_by_id(user_id):
     
     with engine.connect() as conn:
         result = conn.execute(query, {"user_id": user_id})
-        user_data = result.fetchone()
-
-    if user_data is None:
-        return None
-    
-    user_dict = {}
-    for idx, col in enumerate(result.keys()):
-        user_dict[col] = user_data[idx]
-        
-    return user_dict
+        return row_to_dict(result, result.fetchone())
 
 
+@memoize_query()
+@instrument_query
 def get_user_by_username(username):
     """Get user by username from the database"""
     query = text("""
@@ -59,18 +65,11 @@ def get_user_by_username(username):
     
     with engine.connect() as conn:
         result = conn.execute(query, {"username": username})
-        user_data = result.fetchone()
-
-    if user_data is None:
-        return None
-    
-    user_dict = {}
-    for idx, col in enumerate(result.keys()):
-        user_dict[col] = user_data[idx]
-        
-    return user_dict
+        return row_to_dict(result, result.fetchone())
 
 
+@memoize_query(page_scope=True)
+@instrument_query
 def get_user_groups(user_id):
     """Get groups for a specific user"""
     query = text("""
@@ -82,16 +81,46 @@ def get_user_groups(user_id):
     
     with engine.connect() as conn:
         result = conn.execute(query, {"user_id": user_id})
-        groups = []
-        for row in result:
-            group_dict = {}
-            for idx, col in enumerate(result.keys()):
-                group_dict[col] = row[idx]
-            groups.append(group_dict)
+        groups = rows_to_dicts(result)
         
     return groups
 
 
+def _group_scope(user_id, start_date, end_date):
+    """Cache key for stored functions whose result is the same for every member of a group"""
+    group_ids = tuple(sorted(group['id'] for group in get_user_groups(user_id)))
+    return (group_ids or ('user', user_id), start_date, end_date)
+
+
+# First day of the study; rankings are computed from here on
+STUDY_START_DATE = datetime.strptime(os.environ.get('STUDY_START_DATE', '2024-01-01'), '%Y-%m-%d').date()
+
+# Load the largest extracts through binary COPY instead of pd.read_sql
+FAST_COPY_READS = os.environ.get('FAST_COPY_READS', 'false').lower() == 'true'
+
+# Where anomaly scores are read from: 'rows' (anomaly_scores, one row per
+# minute) or 'vectors' (anomaly_score_vectors, one packed row per day)
+ANOMALY_STORAGE = os.environ.get('ANOMALY_STORAGE', 'rows').lower()
+
+# Time labels for the 1440 per-minute anomaly slots of a day
+_TIME_SLOT_LABELS = np.array([f"{slot // 60:02d}:{slot % 60:02d}" for slot in range(24 * 60)], dtype=object)
+
+# Rows per chunk when streaming long histories through a server-side cursor
+HISTORY_STREAM_CHUNK_SIZE = int(os.environ.get('HISTORY_STREAM_CHUNK_SIZE', '10000'))
+
+# Ranking snapshots and period counters refreshed longer ago than this many
+# days are ignored in favour of the live queries
+RANKING_SNAPSHOT_MAX_AGE_DAYS = int(os.environ.get('RANKING_SNAPSHOT_MAX_AGE_DAYS', '1'))
+
+# Most recent anomaly episodes sent to the admin group view
+ANOMALY_EPISODES_LIMIT = int(os.environ.get('ANOMALY_EPISODES_LIMIT', '200'))
+
+# Tables the ranking stored functions read from
+RANKING_TABLES = ('health_metrics', 'users', 'user_groups', 'groups')
+QUESTIONNAIRE_RANKING_TABLES = ('questionnaire_data', 'users', 'user_groups', 'groups')
+
+
+@instrument_query
 def update_last_login(user_id):
     """Update the last login timestamp for a user"""
     query = text("""
@@ -105,6 +134,7 @@ def update_last_login(user_id):
         conn.commit()
 
 
+@instrument_query
 def create_session(user_id, session_token, ip_address, user_agent, expires_at):
     """Create a new session record"""
     query = text("""
@@ -123,6 +153,37 @@ def create_session(user_id, session_token, ip_address, user_agent, expires_at):
         conn.commit()
 
 
+@instrument_query
+def record_login(user_id, session_token, ip_address, user_agent, expires_at):
+    """
+    Update the last login timestamp and create the session record
+    
+    Both writes go out as a single statement in one transaction.
+    """
+    query = text("""
+        WITH logged_in AS (
+            UPDATE users 
+            SET last_login = CURRENT_TIMESTAMP 
+            WHERE id = :user_id
+            RETURNING id
+        )
+        INSERT INTO sessions (user_id, session_token, ip_address, user_agent, expires_at)
+        SELECT id, :session_token, :ip_address, :user_agent, :expires_at
+        FROM logged_in
+    """)
+    
+    with engine.begin() as conn:
+        conn.execute(query, {
+            "user_id": user_id,
+            "session_token": session_token,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "expires_at": expires_at
+        })
+
+
+@memoize_query(page_scope=True)
+@instrument_query
 def get_num_participants_by_group(group_id=None):
     """Get the number of participants in the group"""
     if group_id:
@@ -150,6 +211,8 @@ def get_num_participants_by_group(group_id=None):
         return 0
 
 
+@memoize_query(page_scope=True)
+@instrument_query
 def get_participants_by_group(group_id=None):
     """Get all participants grouped by their group"""
     if group_id:
@@ -175,17 +238,7 @@ def get_participants_by_group(group_id=None):
     
     with engine.connect() as conn:
         result = conn.execute(query, params)
-        user_data = result.fetchall()
-
-        if user_data is None:
-            return None
-
-        participants = []
-        for row in user_data:
-            user_dict = {}
-            for idx, col in enumerate(result.keys()):
-                user_dict[col] = row[idx]
-            participants.append(user_dict)
+        participants = rows_to_dicts(result)
     
     # Organize by group
     groups = {}
@@ -204,6 +257,8 @@ def get_participants_by_group(group_id=None):
     return groups
 
 
+@memoize_query(page_scope=True)
+@instrument_query
 def get_all_groups():
     """Get list of all groups"""
     query = text("""
@@ -214,21 +269,11 @@ def get_all_groups():
     
     with engine.connect() as conn:
         result = conn.execute(query)
-        group_data = result.fetchall()
-
-    if group_data is None:
-        return None
-    
-    group_list = []
-    for row in group_data:
-        group_dict = {}
-        for idx, col in enumerate(result.keys()):
-            group_dict[col] = row[idx]
-        group_list.append(group_dict)
-    
-    return group_list
+        return rows_to_dicts(result)
 
 
+@memoize_query(page_scope=True)
+@instrument_query
 def get_user_latest_data_date(user_id):
     """
     Get the most recent date where the user has health data
@@ -262,6 +307,99 @@ def get_user_latest_data_date(user_id):
         return None
     
 
+# Snapshot rows of the user's group, or NULL when ranking_snapshots is missing.
+# The rows end up in a browser store, so other participants' rows only carry
+# their ranks (which order the race charts) and the fields the race charts
+# plot: participant_id, data_volume_mb and completion_rate
+_BOOTSTRAP_SNAPSHOT_SQL = """
+    (SELECT json_agg(json_build_object(
+        'user_id', rs.user_id,
+        'consistency_rank', rs.consistency_rank,
+        'questionnaire_rank', rs.questionnaire_rank,
+        'consistency', CASE WHEN rs.user_id = :user_id THEN rs.consistency END,
+        'questionnaire', CASE WHEN rs.user_id = :user_id THEN rs.questionnaire END,
+        'group_consistency', CASE
+            WHEN rs.user_id = :user_id THEN rs.group_consistency
+            WHEN rs.group_consistency IS NOT NULL THEN jsonb_build_object(
+                'participant_id', rs.group_consistency->'participant_id',
+                'data_volume_mb', rs.group_consistency->'data_volume_mb')
+        END,
+        'group_questionnaire', CASE
+            WHEN rs.user_id = :user_id THEN rs.group_questionnaire
+            WHEN rs.group_questionnaire IS NOT NULL THEN jsonb_build_object(
+                'participant_id', rs.group_questionnaire->'participant_id',
+                'completion_rate', rs.group_questionnaire->'completion_rate')
+        END
+    ))
+    FROM ranking_snapshots rs
+    JOIN (
+        SELECT group_id, snapshot_date
+        FROM ranking_snapshots
+        WHERE user_id = :user_id AND snapshot_date >= :min_date
+        ORDER BY snapshot_date DESC
+        LIMIT 1
+    ) latest ON rs.group_id = latest.group_id AND rs.snapshot_date = latest.snapshot_date)
+"""
+
+
+@memoize_query(page_scope=True)
+@instrument_query
+def get_participant_bootstrap(user_id):
+    """
+    Get everything the participant page needs before its sections load
+    
+    Args:
+        user_id: User ID
+        
+    Returns:
+        Dictionary with latest_health_date and latest_questionnaire_date
+        (date or None), group (first group name or None) and ranking_snapshot
+        (the group's ranking_snapshots rows for decode_ranking_snapshot, or
+        None without a recent snapshot)
+    """
+    def bootstrap_query(snapshot_sql):
+        return text(f"""
+            SELECT
+                (SELECT MAX(date) FROM health_metrics WHERE user_id = :user_id) AS latest_health_date,
+                (SELECT MAX(date) FROM questionnaire_data WHERE user_id = :user_id) AS latest_questionnaire_date,
+                (SELECT g.group_name
+                 FROM groups g
+                 JOIN user_groups ug ON g.id = ug.group_id
+                 WHERE ug.user_id = :user_id
+                 ORDER BY ug.group_id
+                 LIMIT 1) AS "group",
+                {snapshot_sql} AS ranking_snapshot
+        """)
+    
+    params = {
+        "user_id": user_id,
+        "min_date": datetime.now().date() - timedelta(days=RANKING_SNAPSHOT_MAX_AGE_DAYS)
+    }
+    empty = {
+        "latest_health_date": None,
+        "latest_questionnaire_date": None,
+        "group": None,
+        "ranking_snapshot": None,
+    }
+    
+    try:
+        with engine.connect() as conn:
+            result = conn.execute(bootstrap_query(_BOOTSTRAP_SNAPSHOT_SQL), params)
+            return row_to_dict(result, result.fetchone()) or empty
+    except Exception as e:
+        logger.debug(f"Ranking snapshot not available for bootstrap: {e}")
+    
+    try:
+        with engine.connect() as conn:
+            result = conn.execute(bootstrap_query("NULL::json"), params)
+            return row_to_dict(result, result.fetchone()) or empty
+    except Exception as e:
+        logger.error(f"Error loading participant bootstrap for user {user_id}: {e}")
+        return empty
+
+
+@memoize_query()
+@instrument_query
 def load_participant_data(user_id, start_date=None, end_date=None):
     """
     Load health data for a participant from the database
@@ -365,6 +503,69 @@ def load_participant_data(user_id, start_date=None, end_date=None):
         return pd.DataFrame()  # Return empty dataframe on error
 
 
+@memoize_query()
+@instrument_query
+def load_participants_data(user_ids, start_date=None, end_date=None):
+    """
+    Load health data for several participants in a single query
+
+    Args:
+        user_ids: Iterable of user IDs
+        start_date: Start date for data range (optional)
+        end_date: End date for data range (optional)
+
+    Returns:
+        Pandas DataFrame with health data plus participant_id and participant_name columns
+    """
+    user_ids = [int(user_id) for user_id in user_ids if user_id != "all"]
+    if not user_ids:
+        return pd.DataFrame()
+
+    # Build the date filter the same way load_participant_data does
+    if start_date and end_date:
+        date_filter = "AND hm.date BETWEEN :start_date AND :end_date"
+        params = {"start_date": start_date, "end_date": end_date}
+    elif start_date:
+        date_filter = "AND hm.date >= :start_date"
+        params = {"start_date": start_date}
+    elif end_date:
+        date_filter = "AND hm.date <= :end_date"
+        params = {"end_date": end_date}
+    else:
+        # If no dates provided, get last 30 days
+        today = datetime.now().date()
+        date_filter = "AND hm.date >= :thirty_days_ago"
+        params = {"thirty_days_ago": today - timedelta(days=30)}
+
+    query = text(f"""
+        SELECT
+            hm.date, hm.resting_hr, hm.max_hr, hm.sleep_hours, hm.hrv_rest, hm.step_count,
+            hrz.very_light_percent, hrz.light_percent, hrz.moderate_percent,
+            hrz.intense_percent, hrz.beast_mode_percent,
+            ms.walking_minutes, ms.walking_fast_minutes, ms.jogging_minutes, ms.running_minutes,
+            u.id as participant_id, u.username as participant_name
+        FROM health_metrics hm
+        JOIN users u ON hm.user_id = u.id
+        LEFT JOIN heart_rate_zones hrz ON hm.id = hrz.health_metric_id
+        LEFT JOIN movement_speeds ms ON hm.id = ms.health_metric_id
+        WHERE hm.user_id = ANY(:user_ids)
+        {date_filter}
+        ORDER BY u.username, hm.date
+    """)
+    params["user_ids"] = user_ids
+
+    try:
+        with engine.connect() as conn:
+            df = pd.read_sql(query, conn, params=params)
+        return df
+    except Exception as e:
+        logger.error(f"Error loading data for {len(user_ids)} participants from database: {e}")
+        return pd.DataFrame()
+
+
+@memoize_query()
+@shared_cached(RANKING_TABLES)
+@instrument_query
 def get_participant_ranking(user_id, start_date, end_date):
     """
     Get the participant's data consistency ranking within their group
@@ -389,19 +590,15 @@ def get_participant_ranking(user_id, start_date, end_date):
                 "start_date": start_date,
                 "end_date": end_date
             })
-            row = result.fetchone()
-            
-            if row:
-                ranking_data = {}
-                for idx, col in enumerate(result.keys()):
-                    ranking_data[col] = row[idx]
-                return ranking_data
-            return None
+            return row_to_dict(result, result.fetchone())
     except Exception as e:
         logger.error(f"Error getting participant ranking: {e}")
         return None
     
 
+@memoize_query()
+@shared_cached(RANKING_TABLES, key_func=_group_scope)
+@instrument_query
 def get_all_group_participants_ranking(user_id, start_date, end_date):
     """
     Get ranking data for all participants in the user's group
@@ -427,19 +624,155 @@ def get_all_group_participants_ranking(user_id, start_date, end_date):
                 "end_date": end_date
             })
             
-            participants_data = []
-            for row in result:
-                participant_dict = {}
-                for idx, col in enumerate(result.keys()):
-                    participant_dict[col] = row[idx]
-                participants_data.append(participant_dict)
-                
-            return participants_data
+            return rows_to_dicts(result)
     except Exception as e:
         logger.error(f"Error getting group participants ranking: {e}")
         return []
     
 
+@memoize_query(page_scope=True)
+@instrument_query
+def get_group_period_counts(user_id):
+    """
+    Get days with data per week for everyone in the user's group
+    
+    Read from the participant_week_counts store kept by the
+    participant_period_counts refresh step, so no history is scanned.
+    
+    Args:
+        user_id: User ID to determine the group
+        
+    Returns:
+        DataFrame with period, participant_id and days_with_data columns
+        (the shape of count_days_per_period), empty if the store is missing
+        or was not refreshed recently
+    """
+    query = text("""
+        SELECT wc.week_start, wc.participant_id, wc.days_with_data
+        FROM participant_week_counts wc
+        WHERE wc.participant_id IN (
+            SELECT mates.user_id
+            FROM user_groups mine
+            JOIN user_groups mates ON mates.group_id = mine.group_id
+            JOIN users u ON u.id = mates.user_id AND u.role = 'participant'
+            WHERE mine.user_id = :user_id
+        )
+        AND EXISTS (
+            SELECT 1 FROM aggregate_refresh_state
+            WHERE name = 'participant_period_counts' AND refreshed_at >= :fresh_since
+        )
+        ORDER BY wc.week_start, wc.participant_id
+    """)
+    
+    try:
+        with engine.connect() as conn:
+            df = pd.read_sql(query, conn, params={
+                "user_id": user_id,
+                "fresh_since": datetime.now() - timedelta(days=RANKING_SNAPSHOT_MAX_AGE_DAYS)
+            })
+    except Exception as e:
+        logger.debug(f"Participant period counts not available: {e}")
+        return pd.DataFrame(columns=['period', 'participant_id', 'days_with_data'])
+    
+    df['period'] = pd.to_datetime(df.pop('week_start')).dt.to_period('W')
+    return df[['period', 'participant_id', 'days_with_data']]
+
+
+def _from_snapshot_json(value):
+    """Turn a stored function row saved as JSON back into what the function returns"""
+    if value is None:
+        return None
+    row = dict(value)
+    for key, item in row.items():
+        # JSON has no date type - restore the *_date columns
+        if key.endswith('_date') and isinstance(item, str):
+            parsed = datetime.fromisoformat(item)
+            row[key] = parsed.date() if len(item) == 10 else parsed
+    return row
+
+
+def decode_ranking_snapshot(rows, user_id):
+    """
+    Rebuild the four ranking results from the snapshot rows of a group
+    
+    Args:
+        rows: ranking_snapshots rows (user_id, consistency_rank,
+            questionnaire_rank and the four JSON columns) of the user's group
+        user_id: User ID
+        
+    Returns:
+        Dictionary with ranking, all_participants, questionnaire_ranking and
+        all_questionnaire entries, or None when the user has no snapshot
+    """
+    own = next((row for row in rows or () if row['user_id'] == user_id), None)
+    if own is None or own['consistency'] is None:
+        return None
+    
+    def by_rank(rank_column, json_column):
+        ranked = sorted(
+            (row for row in rows if row[json_column] is not None),
+            key=lambda row: (row[rank_column] is None, row[rank_column] or 0)
+        )
+        return [_from_snapshot_json(row[json_column]) for row in ranked]
+    
+    return {
+        "ranking": _from_snapshot_json(own['consistency']),
+        "all_participants": by_rank('consistency_rank', 'group_consistency'),
+        "questionnaire_ranking": _from_snapshot_json(own['questionnaire']),
+        "all_questionnaire": by_rank('questionnaire_rank', 'group_questionnaire'),
+    }
+
+
+@memoize_query(page_scope=True)
+@instrument_query
+def get_ranking_snapshot(user_id):
+    """
+    Get the participant's rankings from the latest ranking snapshot
+    
+    One indexed lookup returns the snapshot rows of every participant in the
+    user's group, from which all four ranking results are rebuilt.
+    
+    Args:
+        user_id: User ID
+        
+    Returns:
+        Dictionary with ranking, all_participants, questionnaire_ranking and
+        all_questionnaire entries shaped like get_participant_ranking,
+        get_all_group_participants_ranking,
+        get_participant_questionnaire_ranking and
+        get_all_group_questionnaire_ranking, or None without a recent snapshot
+    """
+    query = text("""
+        WITH latest AS (
+            SELECT group_id, snapshot_date
+            FROM ranking_snapshots
+            WHERE user_id = :user_id AND snapshot_date >= :min_date
+            ORDER BY snapshot_date DESC
+            LIMIT 1
+        )
+        SELECT 
+            rs.user_id, rs.consistency_rank, rs.questionnaire_rank,
+            rs.consistency, rs.questionnaire, rs.group_consistency, rs.group_questionnaire
+        FROM ranking_snapshots rs
+        JOIN latest ON rs.group_id = latest.group_id AND rs.snapshot_date = latest.snapshot_date
+    """)
+    
+    try:
+        with engine.connect() as conn:
+            rows = rows_to_dicts(conn.execute(query, {
+                "user_id": user_id,
+                "min_date": datetime.now().date() - timedelta(days=RANKING_SNAPSHOT_MAX_AGE_DAYS)
+            }))
+    except Exception as e:
+        logger.debug(f"Ranking snapshot not available: {e}")
+        return None
+    
+    return decode_ranking_snapshot(rows, user_id)
+
+
+@memoize_query()
+@shared_cached(RANKING_TABLES, key_func=_group_scope)
+@instrument_query
 def get_group_historical_data(user_id, start_date, end_date):
     """
     Get historical data for all participants in the user's group
@@ -459,7 +792,7 @@ def get_group_historical_data(user_id, start_date, end_date):
     
     try:
         with engine.connect() as conn:
-            df = pd.read_sql(query, conn, params={
+            df = _read_frame(conn, query, {
                 "user_id": user_id,
                 "start_date": start_date,
                 "end_date": end_date
@@ -470,6 +803,93 @@ def get_group_historical_data(user_id, start_date, end_date):
         return pd.DataFrame()
     
 
+def _read_frame(conn, query, params):
+    """
+    Read a query into a DataFrame, through binary COPY when FAST_COPY_READS is set
+    
+    Falls back to pd.read_sql for result types the COPY reader does not handle.
+    """
+    if FAST_COPY_READS:
+        try:
+            return read_frame_via_copy(conn, query, params)
+        except UnsupportedCopyType as e:
+            logger.debug(f"Falling back to pd.read_sql: {e}")
+    return pd.read_sql(query, conn, params=params)
+
+
+def stream_group_historical_data(user_id, start_date, end_date, chunk_size=HISTORY_STREAM_CHUNK_SIZE):
+    """
+    Stream historical data for all participants in the user's group
+    
+    Rows are fetched through a server-side cursor and yielded as DataFrames
+    of at most chunk_size rows, so memory use does not grow with the length
+    of the study. Same columns as get_group_historical_data.
+    
+    Args:
+        user_id: User ID to determine the group
+        start_date: Start date for data range
+        end_date: End date for data range
+        chunk_size: Rows per yielded DataFrame
+        
+    Yields:
+        DataFrames with historical data for ranking calculations
+        
+    Raises:
+        The database error, so a failure mid-stream is not mistaken for a
+        shorter history
+    """
+    
+    query = text("""
+        SELECT * FROM get_group_historical_data(:user_id, :start_date, :end_date)
+    """)
+    
+    try:
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(query, {
+                "user_id": user_id,
+                "start_date": start_date,
+                "end_date": end_date
+            })
+            columns = list(result.keys())
+            for rows in result.partitions():
+                yield pd.DataFrame.from_records(rows, columns=columns)
+    except Exception as e:
+        logger.error(f"Error streaming group historical data: {e}")
+        raise
+
+
+def _group_interval_scope(user_id, start_date, end_date, interval='week'):
+    """Cache key for per-period history, shared by every member of a group"""
+    return _group_scope(user_id, start_date, end_date) + (interval,)
+
+
+@memoize_query()
+@shared_cached(RANKING_TABLES, key_func=_group_interval_scope)
+@instrument_query
+def get_group_history_periods(user_id, start_date, end_date, interval='week'):
+    """
+    Count days with data per participant and period for the user's group
+    
+    The history is streamed through stream_group_historical_data and folded
+    into per-period counts as it arrives.
+    
+    Args:
+        user_id: User ID to determine the group
+        start_date: Start date for data range
+        end_date: End date for data range
+        interval: 'week' or 'month'
+        
+    Returns:
+        DataFrame with period, participant_id and days_with_data columns
+        
+    Raises:
+        The database error if the history could not be read completely
+    """
+    return summarize_history_chunks(stream_group_historical_data(user_id, start_date, end_date), interval)
+
+
+@memoize_query()
+@instrument_query
 def load_anomaly_data(user_id, date=None, start_date=None, end_date=None):
     """
     Load anomaly score data for a participant
@@ -487,6 +907,16 @@ def load_anomaly_data(user_id, date=None, start_date=None, end_date=None):
     if user_id == "all":
         return pd.DataFrame()
 
+    if ANOMALY_STORAGE == 'vectors':
+        from .anomaly_vectors import load_anomaly_vectors
+        try:
+            with engine.connect() as conn:
+                df = load_anomaly_vectors(conn, user_id, date, start_date, end_date)
+                return _add_anomaly_time_columns(df)
+        except Exception as e:
+            logger.error(f"Error loading anomaly vectors: {e}")
+            return pd.DataFrame()
+
     if date:
         # Single day query
         query = text("""
@@ -522,30 +952,156 @@ def load_anomaly_data(user_id, date=None, start_date=None, end_date=None):
     
     try:
         with engine.connect() as conn:
-            df = pd.read_sql(query, conn, params=params)
-            
-            # Add calculated time column (for easier plotting)
-            if not df.empty:
-                # Convert time_slot (minutes) to time string
-                df['time'] = df['time_slot'].apply(
-                    lambda x: f"{x // 60:02d}:{x % 60:02d}"
-                )
-                
-                # Create datetime column for plotting
-                df['datetime'] = df.apply(
-                    lambda row: pd.Timestamp(
-                        row['date'].year, row['date'].month, row['date'].day, 
-                        row['time_slot'] // 60, row['time_slot'] % 60
-                    ), 
-                    axis=1
-                )
-            
-            return df
+            df = _read_frame(conn, query, params)
+            return _add_anomaly_time_columns(df)
     except Exception as e:
         logger.error(f"Error loading anomaly data: {e}")
         return pd.DataFrame()
+
+
+def _add_anomaly_time_columns(df):
+    """
+    Add the time label and datetime columns the anomaly charts plot against
+
+    Slots outside 0-1439 (or missing) get an empty label and NaT rather than
+    wrapping around or failing the whole load.
+    """
+    if not df.empty:
+        raw = pd.to_numeric(df['time_slot'], errors='coerce').to_numpy(dtype='float64')
+        valid = (raw >= 0) & (raw < len(_TIME_SLOT_LABELS)) & (raw == np.floor(raw))
+        slots = np.where(valid, raw, 0).astype('int64')
+
+        # "HH:MM" label per minute of the day
+        labels = _TIME_SLOT_LABELS[slots]
+        labels[~valid] = ''
+        df['time'] = labels
+
+        # Midnight of each date plus the slot in minutes
+        datetimes = pd.to_datetime(df['date']) + pd.to_timedelta(slots, unit='min')
+        df['datetime'] = datetimes.where(valid)
+
+        invalid = int((~valid).sum())
+        if invalid:
+            logger.warning(f"Ignoring {invalid} anomaly rows with an invalid time_slot")
+
+    return df
+
+
+@memoize_query()
+@instrument_query
+def load_anomaly_hourly(user_id, start_date, end_date):
+    """
+    Load hourly anomaly score rollups for a participant
+    
+    Reads anomaly_hourly once it has been backfilled, otherwise aggregates
+    anomaly_scores in the query, so only one row per hour leaves the database
+    either way.
+    
+    Args:
+        user_id: User ID
+        start_date: Start date for range
+        end_date: End date for range
+        
+    Returns:
+        Pandas DataFrame with date, hour, score (hourly mean), max_score and
+        slot_count columns
+    """
+    # Imported here because utils.anomaly_rollups builds on this module's engine
+    from .anomaly_rollups import anomaly_hourly_ready
+
+    if user_id == "all":
+        return pd.DataFrame()
+
+    if anomaly_hourly_ready():
+        query = text("""
+            SELECT date, hour, mean_score as score, max_score, slot_count
+            FROM anomaly_hourly
+            WHERE user_id = :user_id
+            AND date BETWEEN :start_date AND :end_date
+            ORDER BY date, hour
+        """)
+    else:
+        query = text("""
+            SELECT 
+                date, time_slot / 60 as hour,
+                AVG(score) as score, MAX(score) as max_score, COUNT(score) as slot_count
+            FROM anomaly_scores
+            WHERE user_id = :user_id
+            AND date BETWEEN :start_date AND :end_date
+            GROUP BY date, time_slot / 60
+            ORDER BY date, hour
+        """)
+    
+    try:
+        with engine.connect() as conn:
+            return pd.read_sql(query, conn, params={
+                "user_id": user_id,
+                "start_date": start_date,
+                "end_date": end_date
+            })
+    except Exception as e:
+        logger.error(f"Error loading hourly anomaly data: {e}")
+        return pd.DataFrame()
     
 
+@memoize_query()
+@instrument_query
+def get_group_anomaly_episodes(group_id, start_date, end_date):
+    """
+    Get the most recent anomaly episodes of every participant in a group
+    
+    Answered from the anomaly_episodes index, without reading any scores.
+    At most ANOMALY_EPISODES_LIMIT episodes are returned; each row also
+    carries the totals over the whole date range.
+    
+    Args:
+        group_id: Group ID
+        start_date: Start date for range
+        end_date: End date for range
+        
+    Returns:
+        List of episode dictionaries (username, start_time, end_time,
+        slot_count, peak_score, mean_score, total_episodes,
+        total_participants), most recent first
+    """
+    query = text("""
+        WITH matched AS (
+            SELECT 
+                u.id as user_id, u.username,
+                ae.start_time, ae.end_time, ae.slot_count, ae.peak_score, ae.mean_score
+            FROM user_groups ug
+            JOIN users u ON u.id = ug.user_id
+            JOIN anomaly_episodes ae ON ae.user_id = ug.user_id
+            WHERE ug.group_id = :group_id
+            AND u.role = 'participant'
+            AND ae.start_time < CAST(:end_date AS date) + 1
+            AND ae.end_time >= CAST(:start_date AS date)
+        )
+        SELECT 
+            m.*,
+            COUNT(*) OVER () as total_episodes,
+            (SELECT COUNT(DISTINCT user_id) FROM matched) as total_participants
+        FROM matched m
+        ORDER BY m.start_time DESC
+        LIMIT :limit
+    """)
+    
+    try:
+        with engine.connect() as conn:
+            result = conn.execute(query, {
+                "group_id": group_id,
+                "start_date": start_date,
+                "end_date": end_date,
+                "limit": ANOMALY_EPISODES_LIMIT
+            })
+            return rows_to_dicts(result)
+    except Exception as e:
+        logger.error(f"Error getting group anomaly episodes: {e}")
+        return []
+
+
+@memoize_query()
+@instrument_query
 def load_questionnaire_data(user_id, start_date=None, end_date=None):
     """
     Load questionnaire data for a participant from the database
@@ -633,6 +1189,9 @@ def load_questionnaire_data(user_id, start_date=None, end_date=None):
         return pd.DataFrame()  # Return empty dataframe on error
     
 
+@memoize_query()
+@shared_cached(QUESTIONNAIRE_RANKING_TABLES)
+@instrument_query
 def get_participant_questionnaire_ranking(user_id, start_date, end_date):
     """
     Get the participant's questionnaire completion ranking within their group
@@ -657,19 +1216,15 @@ def get_participant_questionnaire_ranking(user_id, start_date, end_date):
                 "start_date": start_date,
                 "end_date": end_date
             })
-            row = result.fetchone()
-            
-            if row:
-                ranking_data = {}
-                for idx, col in enumerate(result.keys()):
-                    ranking_data[col] = row[idx]
-                return ranking_data
-            return None
+            return row_to_dict(result, result.fetchone())
     except Exception as e:
         logger.error(f"Error getting participant questionnaire ranking: {e}")
         return None
 
 
+@memoize_query()
+@shared_cached(QUESTIONNAIRE_RANKING_TABLES, key_func=_group_scope)
+@instrument_query
 def get_all_group_questionnaire_ranking(user_id, start_date, end_date):
     """
     Get questionnaire ranking data for all participants in the user's group
@@ -695,19 +1250,14 @@ def get_all_group_questionnaire_ranking(user_id, start_date, end_date):
                 "end_date": end_date
             })
             
-            participants_data = []
-            for row in result:
-                participant_dict = {}
-                for idx, col in enumerate(result.keys()):
-                    participant_dict[col] = row[idx]
-                participants_data.append(participant_dict)
-                
-            return participants_data
+            return rows_to_dicts(result)
     except Exception as e:
         logger.error(f"Error getting group questionnaire ranking: {e}")
         return []
 
 
+@memoize_query()
+@instrument_query
 def get_supervisor_group_data(user_id, start_date, end_date, num_participants=0):
     """
     Get aggregated data for a supervisor's assigned group
@@ -721,72 +1271,104 @@ def get_supervisor_group_data(user_id, start_date, end_date, num_participants=0)
     Returns:
         DataFrame with daily aggregated metrics and data counts
     """
-    query = text("""
-        WITH supervisor_group AS (
-            SELECT g.id as group_id, g.group_name
-            FROM groups g
-            JOIN user_groups ug ON g.id = ug.group_id
-            WHERE ug.user_id = :user_id
-            LIMIT 1
-        ),
-        group_participants AS (
-            SELECT u.id as user_id, u.username, sg.group_id, sg.group_name
-            FROM users u
-            JOIN user_groups ug ON u.id = ug.user_id
-            JOIN supervisor_group sg ON ug.group_id = sg.group_id
-            WHERE u.role = 'participant'
-        ),
-        daily_health_aggregates AS (
+    # Imported here because utils.aggregates builds on this module's engine
+    from .aggregates import group_aggregates_fresh
+
+    if group_aggregates_fresh():
+        query = text("""
+            WITH supervisor_group AS (
+                SELECT g.id as group_id, g.group_name
+                FROM groups g
+                JOIN user_groups ug ON g.id = ug.group_id
+                WHERE ug.user_id = :user_id
+                LIMIT 1
+            )
             SELECT 
-                hm.date,
-                gp.group_id,
-                gp.group_name,
-                COUNT(DISTINCT hm.user_id) as physio_data_count,
-                AVG(hm.resting_hr) as avg_resting_hr,
-                AVG(hm.max_hr) as avg_max_hr,
-                AVG(hm.sleep_hours) as avg_sleep_hours,
-                AVG(hm.hrv_rest) as avg_hrv_rest,
-                AVG(hm.step_count) as avg_step_count
-            FROM health_metrics hm
-            JOIN group_participants gp ON hm.user_id = gp.user_id
-            WHERE hm.date BETWEEN :start_date AND :end_date
-            GROUP BY hm.date, gp.group_id, gp.group_name
-        ),
-        daily_questionnaire_aggregates AS (
+                gda.date,
+                gda.group_id,
+                sg.group_name,
+                gda.physio_data_count,
+                gda.questionnaire_data_count,
+                gda.avg_resting_hr,
+                gda.avg_max_hr,
+                gda.avg_sleep_hours,
+                gda.avg_hrv_rest,
+                gda.avg_step_count,
+                gda.avg_sleep_quality,
+                gda.avg_fatigue_level,
+                gda.avg_motivation_level
+            FROM group_daily_aggregates gda
+            JOIN supervisor_group sg ON gda.group_id = sg.group_id
+            WHERE gda.date BETWEEN :start_date AND :end_date
+            ORDER BY gda.date
+        """)
+    else:
+        query = text("""
+            WITH supervisor_group AS (
+                SELECT g.id as group_id, g.group_name
+                FROM groups g
+                JOIN user_groups ug ON g.id = ug.group_id
+                WHERE ug.user_id = :user_id
+                LIMIT 1
+            ),
+            group_participants AS (
+                SELECT u.id as user_id, u.username, sg.group_id, sg.group_name
+                FROM users u
+                JOIN user_groups ug ON u.id = ug.user_id
+                JOIN supervisor_group sg ON ug.group_id = sg.group_id
+                WHERE u.role = 'participant'
+            ),
+            daily_health_aggregates AS (
+                SELECT 
+                    hm.date,
+                    gp.group_id,
+                    gp.group_name,
+                    COUNT(DISTINCT hm.user_id) as physio_data_count,
+                    AVG(hm.resting_hr) as avg_resting_hr,
+                    AVG(hm.max_hr) as avg_max_hr,
+                    AVG(hm.sleep_hours) as avg_sleep_hours,
+                    AVG(hm.hrv_rest) as avg_hrv_rest,
+                    AVG(hm.step_count) as avg_step_count
+                FROM health_metrics hm
+                JOIN group_participants gp ON hm.user_id = gp.user_id
+                WHERE hm.date BETWEEN :start_date AND :end_date
+                GROUP BY hm.date, gp.group_id, gp.group_name
+            ),
+            daily_questionnaire_aggregates AS (
+                SELECT 
+                    qd.date,
+                    gp.group_id,
+                    gp.group_name,
+                    COUNT(DISTINCT qd.user_id) as questionnaire_data_count,
+                    AVG(qd.perceived_sleep_quality) as avg_sleep_quality,
+                    AVG(qd.fatigue_level) as avg_fatigue_level,
+                    AVG(qd.motivation_level) as avg_motivation_level
+                FROM questionnaire_data qd
+                JOIN group_participants gp ON qd.user_id = gp.user_id
+                WHERE qd.date BETWEEN :start_date AND :end_date
+                GROUP BY qd.date, gp.group_id, gp.group_name
+            )
             SELECT 
-                qd.date,
-                gp.group_id,
-                gp.group_name,
-                COUNT(DISTINCT qd.user_id) as questionnaire_data_count,
-                AVG(qd.perceived_sleep_quality) as avg_sleep_quality,
-                AVG(qd.fatigue_level) as avg_fatigue_level,
-                AVG(qd.motivation_level) as avg_motivation_level
-            FROM questionnaire_data qd
-            JOIN group_participants gp ON qd.user_id = gp.user_id
-            WHERE qd.date BETWEEN :start_date AND :end_date
-            GROUP BY qd.date, gp.group_id, gp.group_name
-        )
-        SELECT 
-            COALESCE(dha.date, dqa.date) as date,
-            COALESCE(dha.group_id, dqa.group_id) as group_id,
-            COALESCE(dha.group_name, dqa.group_name) as group_name,
-            COALESCE(dha.physio_data_count, 0) as physio_data_count,
-            COALESCE(dqa.questionnaire_data_count, 0) as questionnaire_data_count,
-            dha.avg_resting_hr,
-            dha.avg_max_hr,
-            dha.avg_sleep_hours,
-            dha.avg_hrv_rest,
-            dha.avg_step_count,
-            dqa.avg_sleep_quality,
-            dqa.avg_fatigue_level,
-            dqa.avg_motivation_level
-        FROM daily_health_aggregates dha
-        FULL OUTER JOIN daily_questionnaire_aggregates dqa 
-            ON dha.date = dqa.date AND dha.group_id = dqa.group_id
-        WHERE COALESCE(dha.date, dqa.date) IS NOT NULL
-        ORDER BY date
-    """)
-    
+                COALESCE(dha.date, dqa.date) as date,
+                COALESCE(dha.group_id, dqa.group_id) as group_id,
+                COALESCE(dha.group_name, dqa.group_name) as group_name,
+                COALESCE(dha.physio_data_count, 0) as physio_data_count,
+                COALESCE(dqa.questionnaire_data_count, 0) as questionnaire_data_count,
+                dha.avg_resting_hr,
+                dha.avg_max_hr,
+                dha.avg_sleep_hours,
+                dha.avg_hrv_rest,
+                dha.avg_step_count,
+                dqa.avg_sleep_quality,
+                dqa.avg_fatigue_level,
+                dqa.avg_motivation_level
+            FROM daily_health_aggregates dha
+            FULL OUTER JOIN daily_questionnaire_aggregates dqa 
+                ON dha.date = dqa.date AND dha.group_id = dqa.group_id
+            WHERE COALESCE(dha.date, dqa.date) IS NOT NULL
+            ORDER BY date
+        """)
+
     try:
         with engine.connect() as conn:
             result = conn.execute(query, {
@@ -795,13 +1377,14 @@ def get_supervisor_group_data(user_id, start_date, end_date, num_participants=0)
                 "end_date": end_date
             })
             
-            df = pd.DataFrame(result.fetchall(), columns=result.keys())
-            return df
+            return rows_to_frame(result, {**COUNT_DTYPES, **AVERAGE_DTYPES})
     except Exception as e:
         logger.error(f"Error getting supervisor group data: {e}")
         return pd.DataFrame()
 
 
+@memoize_query(page_scope=True)
+@instrument_query
 def get_supervisor_group_info(user_id):
     """
     Get supervisor's assigned group information
@@ -823,19 +1406,14 @@ def get_supervisor_group_info(user_id):
     try:
         with engine.connect() as conn:
             result = conn.execute(query, {"user_id": user_id})
-            row = result.fetchone()
-            
-            if row:
-                group_info = {}
-                for idx, col in enumerate(result.keys()):
-                    group_info[col] = row[idx]
-                return group_info
-            return None
+            return row_to_dict(result, result.fetchone())
     except Exception as e:
         logger.error(f"Error getting supervisor group info: {e}")
         return None
 
 
+@memoize_query(page_scope=True)
+@instrument_query
 def get_supervisor_group_participants(user_id):
     """
     Get list of participants in supervisor's assigned group
@@ -865,19 +1443,14 @@ def get_supervisor_group_participants(user_id):
         with engine.connect() as conn:
             result = conn.execute(query, {"user_id": user_id})
             
-            participants = []
-            for row in result:
-                participant_dict = {}
-                for idx, col in enumerate(result.keys()):
-                    participant_dict[col] = row[idx]
-                participants.append(participant_dict)
-                
-            return participants
+            return rows_to_dicts(result)
     except Exception as e:
         logger.error(f"Error getting supervisor group participants: {e}")
         return []
 
 
+@memoize_query()
+@instrument_query
 def get_group_data_summary(selected_date):
     """
     Get summary of physiological and questionnaire data for all groups for a specific date.
@@ -892,73 +1465,49 @@ def get_group_data_summary(selected_date):
         past_7_start = selected_date - timedelta(days=6)  # 7 days including selected date
         past_30_start = selected_date - timedelta(days=29)  # 30 days including selected date
         
+        # Reduce each table to one row per participant with flags for each
+        # window, so every table is scanned once and nothing fans out
         query = text("""
-            WITH group_summary AS (
-                SELECT 
-                    g.id as group_id,
-                    g.group_name,
-                    -- Current day physiological data count
-                    COUNT(DISTINCT CASE 
-                        WHEN hm_current.date = :selected_date 
-                        THEN hm_current.user_id 
-                    END) as physio_current_day_count,
-                    -- Current day questionnaire data count
-                    COUNT(DISTINCT CASE 
-                        WHEN qd_current.date = :selected_date 
-                        THEN qd_current.user_id 
-                    END) as questionnaire_current_day_count,
-                    -- Past 7 days physiological data count
-                    COUNT(DISTINCT CASE 
-                        WHEN hm7.date BETWEEN :past_7_start AND :selected_date 
-                        THEN hm7.user_id 
-                    END) as physio_7_day_count,
-                    -- Past 30 days physiological data count
-                    COUNT(DISTINCT CASE 
-                        WHEN hm30.date BETWEEN :past_30_start AND :selected_date 
-                        THEN hm30.user_id 
-                    END) as physio_30_day_count,
-                    -- Past 7 days questionnaire data count
-                    COUNT(DISTINCT CASE 
-                        WHEN qd7.date BETWEEN :past_7_start AND :selected_date 
-                        THEN qd7.user_id 
-                    END) as questionnaire_7_day_count,
-                    -- Past 30 days questionnaire data count
-                    COUNT(DISTINCT CASE 
-                        WHEN qd30.date BETWEEN :past_30_start AND :selected_date 
-                        THEN qd30.user_id 
-                    END) as questionnaire_30_day_count,
-                    -- Total participants in group
-                    COUNT(DISTINCT u.id) as total_participants
-                FROM groups g
-                JOIN user_groups ug ON g.id = ug.group_id
-                JOIN users u ON ug.user_id = u.id
-                LEFT JOIN health_metrics hm_current ON u.id = hm_current.user_id 
-                    AND hm_current.date = :selected_date
-                LEFT JOIN questionnaire_data qd_current ON u.id = qd_current.user_id 
-                    AND qd_current.date = :selected_date
-                LEFT JOIN health_metrics hm7 ON u.id = hm7.user_id 
-                    AND hm7.date BETWEEN :past_7_start AND :selected_date
-                LEFT JOIN health_metrics hm30 ON u.id = hm30.user_id 
-                    AND hm30.date BETWEEN :past_30_start AND :selected_date
-                LEFT JOIN questionnaire_data qd7 ON u.id = qd7.user_id 
-                    AND qd7.date BETWEEN :past_7_start AND :selected_date
-                LEFT JOIN questionnaire_data qd30 ON u.id = qd30.user_id 
-                    AND qd30.date BETWEEN :past_30_start AND :selected_date
+            WITH participants AS (
+                SELECT ug.group_id, u.id as user_id
+                FROM users u
+                JOIN user_groups ug ON u.id = ug.user_id
                 WHERE u.role = 'participant'
-                GROUP BY g.id, g.group_name
-                ORDER BY g.group_name
+            ),
+            health_presence AS (
+                SELECT 
+                    user_id,
+                    BOOL_OR(date = :selected_date) as current_day,
+                    BOOL_OR(date >= :past_7_start) as past_7_days
+                FROM health_metrics
+                WHERE date BETWEEN :past_30_start AND :selected_date
+                GROUP BY user_id
+            ),
+            questionnaire_presence AS (
+                SELECT 
+                    user_id,
+                    BOOL_OR(date = :selected_date) as current_day,
+                    BOOL_OR(date >= :past_7_start) as past_7_days
+                FROM questionnaire_data
+                WHERE date BETWEEN :past_30_start AND :selected_date
+                GROUP BY user_id
             )
             SELECT 
-                group_id,
-                group_name,
-                physio_current_day_count,
-                questionnaire_current_day_count,
-                physio_7_day_count,
-                physio_30_day_count,
-                questionnaire_7_day_count,
-                questionnaire_30_day_count,
-                total_participants
-            FROM group_summary
+                g.id as group_id,
+                g.group_name,
+                COUNT(DISTINCT hp.user_id) FILTER (WHERE hp.current_day) as physio_current_day_count,
+                COUNT(DISTINCT qp.user_id) FILTER (WHERE qp.current_day) as questionnaire_current_day_count,
+                COUNT(DISTINCT hp.user_id) FILTER (WHERE hp.past_7_days) as physio_7_day_count,
+                COUNT(DISTINCT hp.user_id) as physio_30_day_count,
+                COUNT(DISTINCT qp.user_id) FILTER (WHERE qp.past_7_days) as questionnaire_7_day_count,
+                COUNT(DISTINCT qp.user_id) as questionnaire_30_day_count,
+                COUNT(DISTINCT p.user_id) as total_participants
+            FROM groups g
+            JOIN participants p ON g.id = p.group_id
+            LEFT JOIN health_presence hp ON p.user_id = hp.user_id
+            LEFT JOIN questionnaire_presence qp ON p.user_id = qp.user_id
+            GROUP BY g.id, g.group_name
+            ORDER BY g.group_name
         """)
         
         with engine.connect() as conn:
@@ -968,20 +1517,15 @@ def get_group_data_summary(selected_date):
                 "past_30_start": past_30_start
             })
             
-            groups_data = []
-            for row in result:
-                group_dict = {}
-                for idx, col in enumerate(result.keys()):
-                    group_dict[col] = row[idx]
-                groups_data.append(group_dict)
-                
-            return groups_data
+            return rows_to_dicts(result)
             
     except Exception as e:
         logger.error(f"Error getting group data summary: {e}")
         return []
 
 
+@memoize_query()
+@instrument_query
 def get_group_daily_data_counts(start_date, end_date):
     """
     Get daily counts of physiological and questionnaire data for all groups over a date range.
@@ -997,40 +1541,71 @@ def get_group_daily_data_counts(start_date, end_date):
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         
         logger.debug(f" After conversion - start_date={start_date}, end_date={end_date}")
-        
+
+        # Imported here because these modules build on this module's engine
+        from .aggregates import group_aggregates_fresh
+        from .presence_index import get_presence_index
+
+        index = get_presence_index(wait=False)
+        if index is not None and start_date >= index.epoch:
+            daily_data = index.daily_counts_rows(start_date, end_date)
+            logger.debug(f" Returning {len(daily_data)} rows of daily data from the presence index")
+            return daily_data
+
         # Generate date series and cross join with all groups to ensure all groups appear for all dates
-        query = text("""
-            WITH date_series AS (
-                SELECT generate_series(
-                    CAST(:start_date AS date),
-                    CAST(:end_date AS date),
-                    interval '1 day'
-                )::date AS date
-            ),
-            group_dates AS (
+        if group_aggregates_fresh():
+            query = text("""
+                WITH date_series AS (
+                    SELECT generate_series(
+                        CAST(:start_date AS date),
+                        CAST(:end_date AS date),
+                        interval '1 day'
+                    )::date AS date
+                )
                 SELECT 
                     ds.date,
                     g.id as group_id,
-                    g.group_name
+                    g.group_name,
+                    COALESCE(gda.physio_data_count, 0) as physio_count,
+                    COALESCE(gda.questionnaire_data_count, 0) as questionnaire_count
                 FROM date_series ds
                 CROSS JOIN groups g
-            )
-            SELECT 
-                gd.date,
-                gd.group_id,
-                gd.group_name,
-                -- Count participants with physiological data for this date
-                COUNT(DISTINCT hm.user_id) as physio_count,
-                -- Count participants with questionnaire data for this date
-                COUNT(DISTINCT qd.user_id) as questionnaire_count
-            FROM group_dates gd
-            LEFT JOIN user_groups ug ON gd.group_id = ug.group_id
-            LEFT JOIN users u ON ug.user_id = u.id AND u.role = 'participant'
-            LEFT JOIN health_metrics hm ON u.id = hm.user_id AND hm.date = gd.date
-            LEFT JOIN questionnaire_data qd ON u.id = qd.user_id AND qd.date = gd.date
-            GROUP BY gd.date, gd.group_id, gd.group_name
-            ORDER BY gd.date, gd.group_name
-        """)
+                LEFT JOIN group_daily_aggregates gda ON gda.group_id = g.id AND gda.date = ds.date
+                ORDER BY ds.date, g.group_name
+            """)
+        else:
+            query = text("""
+                WITH date_series AS (
+                    SELECT generate_series(
+                        CAST(:start_date AS date),
+                        CAST(:end_date AS date),
+                        interval '1 day'
+                    )::date AS date
+                ),
+                group_dates AS (
+                    SELECT 
+                        ds.date,
+                        g.id as group_id,
+                        g.group_name
+                    FROM date_series ds
+                    CROSS JOIN groups g
+                )
+                SELECT 
+                    gd.date,
+                    gd.group_id,
+                    gd.group_name,
+                    -- Count participants with physiological data for this date
+                    COUNT(DISTINCT hm.user_id) as physio_count,
+                    -- Count participants with questionnaire data for this date
+                    COUNT(DISTINCT qd.user_id) as questionnaire_count
+                FROM group_dates gd
+                LEFT JOIN user_groups ug ON gd.group_id = ug.group_id
+                LEFT JOIN users u ON ug.user_id = u.id AND u.role = 'participant'
+                LEFT JOIN health_metrics hm ON u.id = hm.user_id AND hm.date = gd.date
+                LEFT JOIN questionnaire_data qd ON u.id = qd.user_id AND qd.date = gd.date
+                GROUP BY gd.date, gd.group_id, gd.group_name
+                ORDER BY gd.date, gd.group_name
+            """)
         
         with engine.connect() as conn:
             result = conn.execute(query, {
@@ -1038,12 +1613,7 @@ def get_group_daily_data_counts(start_date, end_date):
                 "end_date": end_date
             })
             
-            daily_data = []
-            for row in result:
-                row_dict = {}
-                for idx, col in enumerate(result.keys()):
-                    row_dict[col] = row[idx]
-                daily_data.append(row_dict)
+            daily_data = rows_to_dicts(result)
             
             logger.debug(f" Returning {len(daily_data)} rows of daily data")
             if daily_data:
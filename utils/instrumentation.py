@@ -0,0 +1,259 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime
+import functools
+import hashlib
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import event
+
+from .logging_config import get_logger
+from .metrics import counter, histogram, summary
+
+logger = get_logger(__name__)
+
+# Statements slower than this get their plan captured with EXPLAIN
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', '1000'))
+
+# Capture the plan of the same statement at most this often
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', '300'))
+
+# Set to 'false' to only log slow statements without planning them
+SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', 'true').lower() == 'true'
+
+# Set to 'true' to capture EXPLAIN (ANALYZE, BUFFERS), which runs the
+# statement a second time; plain EXPLAIN only plans it
+SLOW_QUERY_EXPLAIN_ANALYZE = os.environ.get('SLOW_QUERY_EXPLAIN_ANALYZE', 'false').lower() == 'true'
+
+# Oldest slow query files are deleted beyond this many
+SLOW_QUERY_LOG_MAX_FILES = int(os.environ.get('SLOW_QUERY_LOG_MAX_FILES', '200'))
+
+# Plans go next to the dashboard log file
+_LOG_DIR = os.path.dirname(os.environ.get('LOG_FILE', '')) or os.path.join(os.path.dirname(__file__), '..', 'logs')
+SLOW_QUERY_LOG_DIR = os.environ.get('SLOW_QUERY_LOG_DIR', os.path.join(_LOG_DIR, 'slow_queries'))
+
+# Statements that change data are never re-run for EXPLAIN ANALYZE
+_WRITE_STATEMENT = re.compile(r'\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|COPY)\b', re.IGNORECASE)
+
+# Rows sampled to estimate the size of a list of result dictionaries
+_SIZE_SAMPLE_ROWS = 20
+
+FUNCTION_CALLS = counter('db_function_calls_total', 'Calls to utils.database functions', ('function',))
+FUNCTION_ERRORS = counter('db_function_errors_total', 'Calls that raised', ('function',))
+FUNCTION_ROWS = counter('db_function_rows_total', 'Rows returned', ('function',))
+FUNCTION_BYTES = counter('db_function_bytes_total', 'Estimated bytes materialized in Python', ('function',))
+FUNCTION_SECONDS = histogram('db_function_duration_seconds', 'Time spent in the function', ('function',))
+FUNCTION_LATENCY = summary('db_function_latency_seconds', 'Latency quantiles per function', ('function',))
+STATEMENT_SECONDS = histogram('db_statement_duration_seconds', 'Time spent executing single statements')
+SLOW_STATEMENTS = counter(
+    'db_slow_statements_total', 'Statements slower than SLOW_QUERY_THRESHOLD_MS', ('function',)
+)
+
+# Name of the utils.database function issuing the current statement
+_current_function = ContextVar('current_db_function', default=None)
+
+_explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-explain')
+_explain_lock = threading.Lock()
+_explained_at = {}
+_explain_pending = False
+
+# Per-process key for parameter fingerprints: equal values within one worker
+# can be matched up, but the values cannot be recovered from the logs
+_PARAMETER_KEY = os.urandom(16)
+
+
+def _count_rows(value):
+    if value is None:
+        return 0
+    if isinstance(value, (pd.DataFrame, list, tuple)):
+        return len(value)
+    return 1
+
+
+def _estimate_bytes(value):
+    """Roughly how much memory a result takes, without walking all of it"""
+    if value is None:
+        return 0
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, list):
+        if not value:
+            return sys.getsizeof(value)
+        sample = value[:_SIZE_SAMPLE_ROWS]
+        per_row = sum(_estimate_bytes(row) for row in sample) / len(sample)
+        return int(sys.getsizeof(value) + per_row * len(value))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+def instrument_query(func):
+    """
+    Record calls, rows, latency and result size of a database function
+
+    Applied innermost, below memoize_query and shared_cached, so only calls
+    that reach the database are measured.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current_function.set(name)
+        start = time.perf_counter()
+        try:
+            value = func(*args, **kwargs)
+        except Exception:
+            FUNCTION_ERRORS.inc(function=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_function.reset(token)
+            FUNCTION_CALLS.inc(function=name)
+            FUNCTION_SECONDS.observe(elapsed, function=name)
+            FUNCTION_LATENCY.observe(elapsed, function=name)
+
+        FUNCTION_ROWS.inc(_count_rows(value), function=name)
+        FUNCTION_BYTES.inc(_estimate_bytes(value), function=name)
+        return value
+
+    return wrapper
+
+
+def _describe_parameters(parameters):
+    """
+    Summarize bound parameters without their values
+
+    Returns:
+        String with the type of each parameter and a keyed fingerprint of
+        all of them
+    """
+    if isinstance(parameters, dict):
+        types = {name: type(value).__name__ for name, value in parameters.items()}
+    elif isinstance(parameters, (list, tuple)):
+        types = [type(value).__name__ for value in parameters]
+    else:
+        types = type(parameters).__name__
+    fingerprint = hmac.new(_PARAMETER_KEY, repr(parameters).encode(), hashlib.sha256).hexdigest()[:16]
+    return f"{types!r} (fingerprint {fingerprint})"
+
+
+def _prune_slow_queries():
+    files = sorted(name for name in os.listdir(SLOW_QUERY_LOG_DIR) if name.endswith('.txt'))
+    for name in files[:max(len(files) - SLOW_QUERY_LOG_MAX_FILES, 0)]:
+        try:
+            os.remove(os.path.join(SLOW_QUERY_LOG_DIR, name))
+        except OSError:
+            pass
+
+
+def _write_slow_query(function, elapsed_ms, statement, parameters, plan):
+    os.makedirs(SLOW_QUERY_LOG_DIR, mode=0o700, exist_ok=True)
+    digest = hashlib.sha1(statement.encode()).hexdigest()[:10]
+    filename = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{function or 'unknown'}-{digest}.txt"
+    with open(os.path.join(SLOW_QUERY_LOG_DIR, filename), 'w') as f:
+        f.write(f"function: {function}\n")
+        f.write(f"duration_ms: {elapsed_ms:.1f}\n")
+        f.write(f"pid: {os.getpid()}\n\n")
+        f.write(f"{statement.strip()}\n\n")
+        f.write(f"parameters: {_describe_parameters(parameters)}\n\n")
+        f.write(plan or "(plan not captured)\n")
+    _prune_slow_queries()
+
+
+def _capture_plan(engine, statement, parameters):
+    # A raw DBAPI connection does not fire the engine events again
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        options = "(ANALYZE, BUFFERS) " if SLOW_QUERY_EXPLAIN_ANALYZE else ""
+        cursor.execute(f"EXPLAIN {options}{statement}", parameters)
+        plan = '\n'.join(row[0] for row in cursor.fetchall()) + '\n'
+        cursor.close()
+        return plan
+    finally:
+        # EXPLAIN ANALYZE executes the statement - never keep its effects
+        raw.rollback()
+        raw.close()
+
+
+def _explain(engine, function, elapsed_ms, statement, parameters):
+    global _explain_pending
+    try:
+        plan = None
+        if SLOW_QUERY_EXPLAIN:
+            try:
+                plan = _capture_plan(engine, statement, parameters)
+            except Exception as e:
+                plan = f"(plan not captured: {e})\n"
+        _write_slow_query(function, elapsed_ms, statement, parameters, plan)
+        logger.warning(f"Slow query in {function}: {elapsed_ms:.0f} ms, details written to {SLOW_QUERY_LOG_DIR}")
+    except Exception as e:
+        logger.warning(f"Could not log slow query in {function}: {e}")
+    finally:
+        with _explain_lock:
+            _explain_pending = False
+
+
+def _queue_explain(engine, function, elapsed_ms, statement, parameters):
+    """Capture a plan in the background unless one is already being captured"""
+    global _explain_pending
+    digest = hashlib.sha1(statement.encode()).hexdigest()
+    now = time.monotonic()
+    with _explain_lock:
+        if _explain_pending or now - _explained_at.get(digest, float('-inf')) < SLOW_QUERY_EXPLAIN_INTERVAL:
+            return
+        _explain_pending = True
+        _explained_at[digest] = now
+    _explain_executor.submit(_explain, engine, function, elapsed_ms, statement, parameters)
+
+
+def instrument_statements(engine):
+    """
+    Time every statement the engine runs and capture plans of slow reads
+
+    Statements over SLOW_QUERY_THRESHOLD_MS are planned with EXPLAIN (or
+    re-run with EXPLAIN (ANALYZE, BUFFERS) when SLOW_QUERY_EXPLAIN_ANALYZE is
+    set) on a background thread, at most once per SLOW_QUERY_EXPLAIN_INTERVAL
+    per statement. The plan is written to SLOW_QUERY_LOG_DIR, one file per
+    capture, with parameter types instead of values; only the newest
+    SLOW_QUERY_LOG_MAX_FILES files are kept.
+
+    Args:
+        engine: SQLAlchemy engine
+    """
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'handle_error')
+    def _on_error(context):
+        starts = context.connection.info.get('query_start') if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('query_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        STATEMENT_SECONDS.observe(elapsed)
+
+        elapsed_ms = elapsed * 1000
+        if elapsed_ms < SLOW_QUERY_THRESHOLD_MS:
+            return
+        function = _current_function.get()
+        SLOW_STATEMENTS.inc(function=function or 'unknown')
+
+        # Only plain reads are safe to plan (and possibly run) a second time
+        is_read = statement.lstrip().upper().startswith(('SELECT', 'WITH')) and not _WRITE_STATEMENT.search(statement)
+        if executemany or not is_read:
+            logger.warning(f"Slow statement in {function}: {elapsed_ms:.0f} ms")
+            return
+        _queue_explain(engine, function, elapsed_ms, statement, parameters)
@@ -0,0 +1,474 @@
+import hmac
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from flask import Response, abort, request
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Every gunicorn worker writes its metrics here so whichever worker serves
+# /metrics can report all of them
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'fitonduty_metrics'))
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', '5'))
+
+# Snapshots older than this belong to workers that have exited
+METRICS_STALE_SECONDS = float(os.environ.get('METRICS_STALE_SECONDS', '60'))
+
+# Bearer token required to read /metrics. Without it the route is only served
+# when METRICS_PUBLIC is 'true', since query names and timings leak through it
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', 'false').lower() == 'true'
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            samples = [[list(key), value] for key, value in self._values.items()]
+        return {
+            "type": self.kind,
+            "help": self.help_text,
+            "labelnames": list(self.labelnames),
+            "samples": samples,
+        }
+
+
+class Counter(_Metric):
+    """Value that only goes up, e.g. a number of events"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, e.g. connections in use"""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_max(self, value, **labels):
+        """Raise the gauge to value if it is currently lower"""
+        key = self._key(labels)
+        with self._lock:
+            if value > self._values.get(key, float('-inf')):
+                self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            sample = self._values.get(key)
+            if sample is None:
+                sample = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample["buckets"][i] += 1
+            sample["sum"] += value
+            sample["count"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            samples = [
+                [list(key), {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]}]
+                for key, v in self._values.items()
+            ]
+        return {
+            "type": self.kind,
+            "help": self.help_text,
+            "labelnames": list(self.labelnames),
+            "bucket_bounds": list(self.buckets),
+            "samples": samples,
+        }
+
+
+class Summary(_Metric):
+    """
+    Distribution of observed values reported as quantiles
+
+    Keeps a uniform random sample (reservoir) of the observations so
+    snapshots from several workers can be merged before the quantiles are
+    computed.
+    """
+
+    kind = 'summary'
+
+    def __init__(self, name, help_text, labelnames=(), quantiles=(0.5, 0.95, 0.99), reservoir_size=512):
+        super().__init__(name, help_text, labelnames)
+        self.quantiles = tuple(quantiles)
+        self.reservoir_size = reservoir_size
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            sample = self._values.get(key)
+            if sample is None:
+                sample = self._values[key] = {"reservoir": [], "sum": 0.0, "count": 0}
+            sample["sum"] += value
+            sample["count"] += 1
+            reservoir = sample["reservoir"]
+            if len(reservoir) < self.reservoir_size:
+                reservoir.append(value)
+            else:
+                slot = random.randrange(sample["count"])
+                if slot < self.reservoir_size:
+                    reservoir[slot] = value
+
+    def snapshot(self):
+        with self._lock:
+            samples = [
+                [list(key), {"reservoir": list(v["reservoir"]), "sum": v["sum"], "count": v["count"]}]
+                for key, v in self._values.items()
+            ]
+        return {
+            "type": self.kind,
+            "help": self.help_text,
+            "labelnames": list(self.labelnames),
+            "quantiles": list(self.quantiles),
+            "samples": samples,
+        }
+
+
+def quantile(values, q):
+    """Nearest-rank quantile of a list of numbers, or None if it is empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+_collectors = []
+
+
+def _get_or_create(cls, name, help_text, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help_text, **kwargs)
+        return metric
+
+
+def counter(name, help_text, labelnames=()):
+    """Get or create a counter in the worker's registry"""
+    return _get_or_create(Counter, name, help_text, labelnames=labelnames)
+
+
+def gauge(name, help_text, labelnames=()):
+    """Get or create a gauge in the worker's registry"""
+    return _get_or_create(Gauge, name, help_text, labelnames=labelnames)
+
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Get or create a histogram in the worker's registry"""
+    return _get_or_create(Histogram, name, help_text, labelnames=labelnames, buckets=buckets)
+
+
+def summary(name, help_text, labelnames=(), quantiles=(0.5, 0.95, 0.99)):
+    """Get or create a summary in the worker's registry"""
+    return _get_or_create(Summary, name, help_text, labelnames=labelnames, quantiles=quantiles)
+
+
+def register_collector(collector):
+    """Run collector() right before every snapshot, e.g. to update gauges"""
+    _collectors.append(collector)
+
+
+def snapshot():
+    """
+    Get the current value of every metric in this worker
+
+    Returns:
+        Dictionary keyed by metric name
+    """
+    for collector in _collectors:
+        try:
+            collector()
+        except Exception as e:
+            logger.debug(f"Metrics collector {collector.__name__} failed: {e}")
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {metric.name: metric.snapshot() for metric in metrics}
+
+
+POOL_CHECKOUT_SECONDS = histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a connection from the pool'
+)
+POOL_CHECKOUTS = counter('db_pool_checkouts_total', 'Connections handed out by the pool')
+POOL_TIMEOUTS = counter('db_pool_checkout_timeouts_total', 'Checkouts that gave up after pool_timeout')
+POOL_CONNECTS = counter('db_pool_connections_opened_total', 'New database connections opened')
+POOL_SIZE = gauge('db_pool_size', 'Configured pool_size')
+POOL_CHECKED_OUT = gauge('db_pool_checked_out', 'Connections currently checked out')
+POOL_CHECKED_OUT_PEAK = gauge('db_pool_checked_out_peak', 'Most connections checked out at once')
+POOL_OVERFLOW = gauge('db_pool_overflow', 'Connections currently open beyond pool_size')
+POOL_OVERFLOW_PEAK = gauge('db_pool_overflow_peak', 'Most connections open beyond pool_size at once')
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited and whether it timed out"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+
+
+def instrument_pool(engine):
+    """
+    Track checkouts, checked-out counts and overflow usage of an engine's pool
+
+    Args:
+        engine: SQLAlchemy engine, ideally created with InstrumentedQueuePool
+            so checkout waits and timeouts are recorded as well
+    """
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        POOL_CONNECTS.inc()
+
+    @event.listens_for(engine, 'checkout')
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_CHECKOUTS.inc()
+        POOL_CHECKED_OUT_PEAK.set_max(engine.pool.checkedout())
+        POOL_OVERFLOW_PEAK.set_max(max(engine.pool.overflow(), 0))
+
+    def _collect_pool_usage():
+        # Read at snapshot time; the checkin event fires before the pool
+        # has taken the connection back
+        POOL_CHECKED_OUT.set(engine.pool.checkedout())
+        POOL_OVERFLOW.set(max(engine.pool.overflow(), 0))
+
+    register_collector(_collect_pool_usage)
+    POOL_SIZE.set(engine.pool.size())
+
+
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def _snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f"worker-{pid}.json")
+
+
+def write_snapshot():
+    """Write this worker's metrics where the other workers can read them"""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _snapshot_path(os.getpid())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"pid": os.getpid(), "written_at": time.time(), "metrics": snapshot()}, f)
+    os.replace(tmp_path, path)
+
+
+def _writer_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            write_snapshot()
+        except Exception as e:
+            logger.debug(f"Could not write metrics snapshot: {e}")
+
+
+def _ensure_writer():
+    """Start the snapshot writer once per worker process (also after a fork)"""
+    global _writer_pid
+    if _writer_pid == os.getpid():
+        return
+    with _writer_lock:
+        if _writer_pid != os.getpid():
+            _writer_pid = os.getpid()
+            threading.Thread(target=_writer_loop, name='metrics-writer', daemon=True).start()
+
+
+def _read_snapshots():
+    """Read every live worker's snapshot, with this worker's taken fresh"""
+    own_pid = os.getpid()
+    snapshots = {str(own_pid): snapshot()}
+    if not os.path.isdir(METRICS_DIR):
+        return snapshots
+
+    now = time.time()
+    for filename in os.listdir(METRICS_DIR):
+        if not (filename.startswith('worker-') and filename.endswith('.json')):
+            continue
+        path = os.path.join(METRICS_DIR, filename)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if data.get("pid") == own_pid:
+            continue
+        if now - data.get("written_at", 0) > METRICS_STALE_SECONDS:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        snapshots[str(data["pid"])] = data["metrics"]
+    return snapshots
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _render_samples(lines, name, metric, samples, worker):
+    labelnames = metric["labelnames"]
+    worker_label = (('worker', worker),)
+    for label_values, value in samples:
+        if metric["type"] == 'summary':
+            for q in metric["quantiles"]:
+                estimate = quantile(value["reservoir"], q)
+                if estimate is None:
+                    continue
+                labels = _labels(labelnames, label_values, worker_label + (('quantile', str(q)),))
+                lines.append(f"{name}{labels} {_format_number(estimate)}")
+            lines.append(f"{name}_sum{_labels(labelnames, label_values, worker_label)} {_format_number(value['sum'])}")
+            lines.append(f"{name}_count{_labels(labelnames, label_values, worker_label)} {value['count']}")
+            continue
+        if metric["type"] != 'histogram':
+            lines.append(f"{name}{_labels(labelnames, label_values, worker_label)} {_format_number(value)}")
+            continue
+        # Bucket counts are already cumulative
+        for bound, count in zip(metric["bucket_bounds"], value["buckets"]):
+            le = (('le', _format_number(float(bound))),)
+            lines.append(f"{name}_bucket{_labels(labelnames, label_values, worker_label + le)} {count}")
+        lines.append(f"{name}_bucket{_labels(labelnames, label_values, worker_label + (('le', '+Inf'),))} {value['count']}")
+        lines.append(f"{name}_sum{_labels(labelnames, label_values, worker_label)} {_format_number(value['sum'])}")
+        lines.append(f"{name}_count{_labels(labelnames, label_values, worker_label)} {value['count']}")
+
+
+def _sum_samples(metric_type, per_worker):
+    totals = {}
+    for samples in per_worker:
+        for label_values, value in samples:
+            key = tuple(label_values)
+            if metric_type == 'summary':
+                total = totals.setdefault(key, {"reservoir": [], "sum": 0.0, "count": 0})
+                total["reservoir"].extend(value["reservoir"])
+                total["sum"] += value["sum"]
+                total["count"] += value["count"]
+                continue
+            if metric_type != 'histogram':
+                totals[key] = totals.get(key, 0) + value
+                continue
+            total = totals.get(key)
+            if total is None:
+                totals[key] = {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]}
+            else:
+                total["buckets"] = [a + b for a, b in zip(total["buckets"], value["buckets"])]
+                total["sum"] += value["sum"]
+                total["count"] += value["count"]
+    return [[list(key), value] for key, value in totals.items()]
+
+
+def render_metrics():
+    """
+    Render the metrics of every worker in the Prometheus text format
+
+    Each sample is reported once per worker (worker="<pid>"). Counters,
+    histograms and summaries are also summed over all live workers
+    (worker="all"), with summary quantiles computed from the merged samples of
+    every worker. Gauges (including peak values) are only reported per worker,
+    since their sum means nothing.
+
+    Returns:
+        Exposition text
+    """
+    snapshots = _read_snapshots()
+    names = sorted({name for metrics in snapshots.values() for name in metrics})
+
+    lines = []
+    for name in names:
+        per_worker = [(pid, metrics[name]) for pid, metrics in sorted(snapshots.items()) if name in metrics]
+        metric = per_worker[0][1]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        if metric["type"] != 'gauge':
+            totals = _sum_samples(metric["type"], [m["samples"] for _, m in per_worker])
+            _render_samples(lines, name, metric, totals, 'all')
+        for pid, worker_metric in per_worker:
+            _render_samples(lines, name, worker_metric, worker_metric["samples"], pid)
+    return '\n'.join(lines) + '\n'
+
+
+def register_metrics(server):
+    """
+    Serve Prometheus metrics for all workers on /metrics
+
+    Args:
+        server: Flask server the Dash app runs on
+    """
+    @server.before_request
+    def _start_metrics_writer():
+        _ensure_writer()
+
+    if not METRICS_TOKEN and not METRICS_PUBLIC:
+        logger.warning("METRICS_TOKEN is not set - /metrics is disabled (set METRICS_PUBLIC=true to serve it openly)")
+        return
+
+    @server.route('/metrics')
+    def _metrics():
+        if METRICS_TOKEN and not hmac.compare_digest(
+            request.headers.get('Authorization', ''), f"Bearer {METRICS_TOKEN}"
+        ):
+            abort(401)
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
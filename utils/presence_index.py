@@ -0,0 +1,380 @@
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from .database import STUDY_START_DATE, engine
+from .logging_config import get_logger
+from .shared_cache import get_data_version
+
+logger = get_logger(__name__)
+
+# Day 0 of every bitset; rows dated earlier are not indexed
+PRESENCE_INDEX_EPOCH = datetime.strptime(
+    os.environ.get('PRESENCE_INDEX_EPOCH', STUDY_START_DATE.isoformat()), '%Y-%m-%d'
+).date()
+
+# Trailing days re-read from Postgres whenever the source tables change
+PRESENCE_INDEX_TAIL_DAYS = int(os.environ.get('PRESENCE_INDEX_TAIL_DAYS', '14'))
+
+# Backfilled rows older than the tail are picked up by a periodic full rebuild
+PRESENCE_INDEX_REBUILD_SECONDS = float(os.environ.get('PRESENCE_INDEX_REBUILD_SECONDS', '3600'))
+
+# Wait this long before retrying after a failed build
+_RETRY_SECONDS = 30
+
+# Index kind -> table whose rows mark a day as having data
+KINDS = {
+    'health': 'health_metrics',
+    'questionnaire': 'questionnaire_data',
+}
+
+PRESENCE_SOURCES = ('health_metrics', 'questionnaire_data', 'user_groups', 'groups')
+
+
+def _pack(offsets):
+    """Turn a list of day offsets into an int with those bits set"""
+    if not offsets:
+        return 0
+    offsets = np.asarray(offsets, dtype=np.int64)
+    offsets = offsets[offsets >= 0]
+    if offsets.size == 0:
+        return 0
+    flags = np.zeros(int(offsets.max()) + 1, dtype=np.uint8)
+    flags[offsets] = 1
+    return int.from_bytes(np.packbits(flags, bitorder='little').tobytes(), 'little')
+
+
+def _unpack(bits, n):
+    """Turn the low n bits of an int into a 0/1 array"""
+    raw = bits.to_bytes((n + 7) // 8, 'little')
+    return np.unpackbits(np.frombuffer(raw, dtype=np.uint8), count=n, bitorder='little')
+
+
+class PresenceIndex:
+    """
+    Per-participant bitsets of the days with health and questionnaire data
+
+    Bit i of a participant's bitset is set when they have at least one row
+    dated epoch + i days. Queries over a date range shift and mask the bitsets
+    and count bits, so they never touch Postgres.
+    """
+
+    def __init__(self, epoch=PRESENCE_INDEX_EPOCH):
+        self.epoch = epoch
+        self.bits = {kind: {} for kind in KINDS}
+        self.groups = {}
+        self.members = {}
+        self.user_groups = {}
+        self.source_versions = None
+        self.built_at = 0.0
+        self._refresh_lock = threading.Lock()
+
+    def _load_bits(self, conn, kind, since):
+        rows = conn.execute(text(f"""
+            SELECT user_id, array_agg(DISTINCT date - CAST(:epoch AS date))
+            FROM {KINDS[kind]}
+            WHERE date >= :since
+            GROUP BY user_id
+        """), {"epoch": self.epoch, "since": since}).fetchall()
+        return {user_id: _pack(offsets) for user_id, offsets in rows}
+
+    def _load_groups(self, conn):
+        groups = dict(conn.execute(text("SELECT id, group_name FROM groups")).fetchall())
+        rows = conn.execute(text("""
+            SELECT ug.group_id, ug.user_id
+            FROM user_groups ug
+            JOIN users u ON ug.user_id = u.id
+            WHERE u.role = 'participant'
+        """)).fetchall()
+
+        members = {group_id: [] for group_id in groups}
+        user_groups = {}
+        for group_id, user_id in rows:
+            members.setdefault(group_id, []).append(user_id)
+            user_groups.setdefault(user_id, []).append(group_id)
+        return (
+            groups,
+            {group_id: tuple(sorted(ids)) for group_id, ids in members.items()},
+            {user_id: tuple(sorted(ids)) for user_id, ids in user_groups.items()},
+        )
+
+    def build(self):
+        """Load every bitset and the group memberships from scratch"""
+        start = time.perf_counter()
+        versions = get_data_version(PRESENCE_SOURCES, fresh=True)
+        with engine.connect() as conn:
+            bits = {kind: self._load_bits(conn, kind, self.epoch) for kind in KINDS}
+            groups, members, user_groups = self._load_groups(conn)
+
+        self.bits = bits
+        self.groups, self.members, self.user_groups = groups, members, user_groups
+        self.source_versions = versions
+        self.built_at = time.monotonic()
+        logger.info(
+            f"Built presence index for {len(user_groups)} participants "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+    def refresh_tail(self):
+        """Re-read the trailing PRESENCE_INDEX_TAIL_DAYS and the group memberships"""
+        versions = get_data_version(PRESENCE_SOURCES, fresh=True)
+        since = max(self.epoch, datetime.now().date() - timedelta(days=PRESENCE_INDEX_TAIL_DAYS))
+        keep_mask = (1 << (since - self.epoch).days) - 1
+
+        with engine.connect() as conn:
+            tails = {kind: self._load_bits(conn, kind, since) for kind in KINDS}
+            groups, members, user_groups = self._load_groups(conn)
+
+        bits = {}
+        for kind, tail in tails.items():
+            current = self.bits[kind]
+            # Clearing the tail first also drops days whose rows were deleted
+            bits[kind] = {
+                user_id: (current.get(user_id, 0) & keep_mask) | tail.get(user_id, 0)
+                for user_id in current.keys() | tail.keys()
+            }
+
+        self.bits = bits
+        self.groups, self.members, self.user_groups = groups, members, user_groups
+        self.source_versions = versions
+
+    def _rebuild(self):
+        """Run build() in a background thread, then let the next refresh through"""
+        try:
+            self.build()
+        except Exception as e:
+            logger.warning(f"Could not rebuild presence index: {e}")
+            # Retry after _RETRY_SECONDS rather than on the next request
+            self.built_at = time.monotonic() - PRESENCE_INDEX_REBUILD_SECONDS + _RETRY_SECONDS
+        finally:
+            self._refresh_lock.release()
+
+    def maybe_refresh(self):
+        """
+        Bring the index up to date if the source tables changed
+
+        Only one thread refreshes at a time; the others keep reading the
+        current bitsets instead of waiting. The periodic full rebuild reads
+        every source row, so it runs in a background thread and the current
+        bitsets keep being served until the new ones are swapped in.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        if time.monotonic() - self.built_at > PRESENCE_INDEX_REBUILD_SECONDS:
+            # The rebuild thread releases the lock when it is done
+            threading.Thread(target=self._rebuild, name='presence-index-rebuild', daemon=True).start()
+            return
+        try:
+            if get_data_version(PRESENCE_SOURCES) != self.source_versions:
+                self.refresh_tail()
+        except Exception as e:
+            logger.warning(f"Could not refresh presence index: {e}")
+        finally:
+            self._refresh_lock.release()
+
+    def _window(self, bits, start_date, end_date):
+        """Get the bits for [start_date, end_date] shifted down to bit 0"""
+        start = (start_date - self.epoch).days
+        n = (end_date - start_date).days + 1
+        if start < 0:
+            # Days before the epoch are never set
+            return (bits << -start) & ((1 << n) - 1), n
+        return (bits >> start) & ((1 << n) - 1), n
+
+    def days_with_data(self, user_id, start_date, end_date, kind='health'):
+        """
+        Count the days in [start_date, end_date] on which a participant has data
+
+        Args:
+            user_id: Participant ID
+            start_date: First day of the range
+            end_date: Last day of the range
+            kind: 'health' or 'questionnaire'
+
+        Returns:
+            Number of days with data
+        """
+        if end_date < start_date:
+            return 0
+        window, _ = self._window(self.bits[kind].get(user_id, 0), start_date, end_date)
+        return window.bit_count()
+
+    def dates_with_data(self, user_id, start_date, end_date, kind='health'):
+        """
+        List the days in [start_date, end_date] on which a participant has data
+
+        Returns:
+            Sorted list of dates
+        """
+        if end_date < start_date:
+            return []
+        window, n = self._window(self.bits[kind].get(user_id, 0), start_date, end_date)
+        offsets = np.flatnonzero(_unpack(window, n))
+        return [start_date + timedelta(days=int(offset)) for offset in offsets]
+
+    def group_daily_counts(self, group_id, start_date, end_date, kind='health'):
+        """
+        Count, for each day in [start_date, end_date], the group members with data
+
+        Args:
+            group_id: Group ID
+            start_date: First day of the range
+            end_date: Last day of the range
+            kind: 'health' or 'questionnaire'
+
+        Returns:
+            NumPy array with one count per day
+        """
+        n = (end_date - start_date).days + 1
+        if n <= 0:
+            return np.zeros(0, dtype=np.int32)
+
+        counts = np.zeros(n, dtype=np.int32)
+        bits = self.bits[kind]
+        for user_id in self.members.get(group_id, ()):
+            window, _ = self._window(bits.get(user_id, 0), start_date, end_date)
+            if window:
+                counts += _unpack(window, n)
+        return counts
+
+    def participants_with_data(self, group_id, day, kind='health'):
+        """Count the members of a group with data on a single day"""
+        offset = (day - self.epoch).days
+        if offset < 0:
+            return 0
+        bits = self.bits[kind]
+        return sum((bits.get(user_id, 0) >> offset) & 1 for user_id in self.members.get(group_id, ()))
+
+    def daily_counts_rows(self, start_date, end_date):
+        """
+        Build the rows get_group_daily_data_counts returns from the index
+
+        Returns:
+            List of dictionaries with date, group_id, group_name, physio_count
+            and questionnaire_count, ordered by date and group name
+        """
+        n = (end_date - start_date).days + 1
+        if n <= 0:
+            return []
+
+        dates = [start_date + timedelta(days=offset) for offset in range(n)]
+        by_group = []
+        for group_id, group_name in sorted(self.groups.items(), key=lambda item: item[1]):
+            physio = self.group_daily_counts(group_id, start_date, end_date, 'health').tolist()
+            questionnaire = self.group_daily_counts(group_id, start_date, end_date, 'questionnaire').tolist()
+            by_group.append((group_id, group_name, physio, questionnaire))
+
+        return [
+            {
+                "date": day,
+                "group_id": group_id,
+                "group_name": group_name,
+                "physio_count": physio[offset],
+                "questionnaire_count": questionnaire[offset],
+            }
+            for offset, day in enumerate(dates)
+            for group_id, group_name, physio, questionnaire in by_group
+        ]
+
+    def group_mates(self, user_id):
+        """Get the participants sharing a group with user_id, including themselves"""
+        mates = {user_id}
+        for group_id in self.user_groups.get(user_id, ()):
+            mates.update(self.members.get(group_id, ()))
+        return sorted(mates)
+
+    def group_history(self, user_id, start_date, end_date, kind='health'):
+        """
+        List every (participant, day) with data for the user's group
+
+        Same shape as get_group_historical_data, so the result can go through
+        count_days_per_period and rank_over_time before being plotted with
+        create_ranking_over_time_figure.
+
+        Returns:
+            DataFrame with participant_id and date columns
+        """
+        participant_ids = []
+        dates = []
+        for mate in self.group_mates(user_id):
+            mate_dates = self.dates_with_data(mate, start_date, end_date, kind)
+            participant_ids.extend([mate] * len(mate_dates))
+            dates.extend(mate_dates)
+        return pd.DataFrame({"participant_id": participant_ids, "date": dates})
+
+    def group_presence_summary(self, user_id, start_date, end_date, kind='health'):
+        """
+        Days with data and completion rate for everyone in the user's group
+
+        Returns:
+            List of dictionaries with participant_id, days_with_data and
+            completion_rate (percent of days in the range)
+        """
+        total_days = max((end_date - start_date).days + 1, 1)
+        summary = []
+        for mate in self.group_mates(user_id):
+            days = self.days_with_data(mate, start_date, end_date, kind)
+            summary.append({
+                "participant_id": mate,
+                "days_with_data": days,
+                "completion_rate": round(100.0 * days / total_days, 1),
+            })
+        return summary
+
+
+_index = None
+_index_lock = threading.Lock()
+_last_failure = 0.0
+_building = threading.Event()
+
+
+def _build_index():
+    global _index, _last_failure
+    try:
+        index = PresenceIndex()
+        index.build()
+        _index = index
+    except Exception as e:
+        _last_failure = time.monotonic()
+        logger.warning(f"Could not build presence index: {e}")
+    finally:
+        _building.clear()
+
+
+def get_presence_index(wait=True):
+    """
+    Get this worker's presence index, refreshed if the source tables changed
+
+    Args:
+        wait: Build the index in this thread if it does not exist yet. When
+            False, the build is started in the background and None is
+            returned so the caller can fall back to Postgres.
+
+    Returns:
+        PresenceIndex, or None if it is not available
+    """
+    if _index is not None:
+        _index.maybe_refresh()
+        return _index
+
+    if time.monotonic() - _last_failure < _RETRY_SECONDS:
+        return None
+
+    with _index_lock:
+        if _index is None and not _building.is_set():
+            _building.set()
+            if wait:
+                _build_index()
+            else:
+                threading.Thread(target=_build_index, name='presence-index', daemon=True).start()
+    return _index
+
+
+def warm_presence_index():
+    """Start building the presence index in the background"""
+    get_presence_index(wait=False)
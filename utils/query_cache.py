@@ -0,0 +1,172 @@
+import copy
+import functools
+import os
+import threading
+import time
+
+import pandas as pd
+from flask import g, has_request_context, request
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# How long page-scoped results stay valid. A page load fires its callbacks as
+# separate HTTP requests within a second or two of each other, so a few seconds
+# is enough to collapse them without serving noticeably stale data.
+PAGE_MEMO_TTL = float(os.environ.get('QUERY_MEMO_PAGE_TTL', '5'))
+PAGE_MEMO_MAX_ENTRIES = int(os.environ.get('QUERY_MEMO_PAGE_MAX_ENTRIES', '2048'))
+
+_MISSING = object()
+
+_stats_lock = threading.Lock()
+_stats = {
+    'calls': 0,
+    'request_hits': 0,
+    'page_hits': 0,
+}
+
+_page_lock = threading.Lock()
+_page_memo = {}
+
+
+def _freeze(value):
+    """Turn lists, sets and dicts into hashable equivalents for use in a key"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def _make_key(func, args, kwargs):
+    key = (func.__module__, func.__qualname__, _freeze(args), _freeze(kwargs))
+    hash(key)
+    return key
+
+
+def _copy_result(value):
+    """Hand every caller its own copy so one callback cannot mutate another's data"""
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    return value
+
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def _page_get(key):
+    with _page_lock:
+        entry = _page_memo.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del _page_memo[key]
+            return _MISSING
+        return value
+
+
+def _page_set(key, value):
+    now = time.monotonic()
+    with _page_lock:
+        if len(_page_memo) >= PAGE_MEMO_MAX_ENTRIES:
+            # Drop expired entries first, then the oldest ones
+            for stale_key in [k for k, (exp, _) in _page_memo.items() if exp < now]:
+                del _page_memo[stale_key]
+            while len(_page_memo) >= PAGE_MEMO_MAX_ENTRIES:
+                del _page_memo[next(iter(_page_memo))]
+        _page_memo[key] = (now + PAGE_MEMO_TTL, value)
+
+
+def memoize_query(page_scope=False):
+    """
+    Collapse repeated calls with identical arguments into one database query
+
+    Results are kept on flask.g for the lifetime of the current request. With
+    page_scope=True they are also kept in a small per-worker table for
+    QUERY_MEMO_PAGE_TTL seconds, so the separate callback requests fired by a
+    single page load share them too. Outside a request the function is called
+    directly.
+
+    Args:
+        page_scope: Also share results across requests for a few seconds
+
+    Returns:
+        Decorator for read-only database functions
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not has_request_context():
+                return func(*args, **kwargs)
+
+            try:
+                key = _make_key(func, args, kwargs)
+            except TypeError:
+                # Unhashable argument - nothing sensible to memoize on
+                return func(*args, **kwargs)
+
+            _count('calls')
+            memo = g.setdefault('_query_memo', {})
+            value = memo.get(key, _MISSING)
+            if value is not _MISSING:
+                _count('request_hits')
+                g._query_memo_hits = g.get('_query_memo_hits', 0) + 1
+                return _copy_result(value)
+
+            if page_scope and PAGE_MEMO_TTL > 0:
+                value = _page_get(key)
+                if value is not _MISSING:
+                    _count('page_hits')
+                    g._query_memo_hits = g.get('_query_memo_hits', 0) + 1
+                    memo[key] = value
+                    return _copy_result(value)
+
+            value = func(*args, **kwargs)
+            memo[key] = value
+            if page_scope and PAGE_MEMO_TTL > 0:
+                _page_set(key, value)
+            return _copy_result(value)
+
+        return wrapper
+    return decorator
+
+
+def get_query_memo_stats():
+    """
+    Get memoization counters for this worker
+
+    Returns:
+        Dictionary with total memoized calls and hits saved per scope
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['queries_saved'] = stats['request_hits'] + stats['page_hits']
+    return stats
+
+
+def clear_page_memo():
+    """Drop all page-scoped results held by this worker"""
+    with _page_lock:
+        _page_memo.clear()
+
+
+def register_query_memo(server):
+    """
+    Log how many queries the memo saved at the end of each request
+
+    Args:
+        server: Flask server the Dash app runs on
+    """
+    @server.teardown_request
+    def _log_query_memo_hits(exc):
+        hits = g.get('_query_memo_hits', 0)
+        if hits:
+            logger.debug(f"Query memo saved {hits} queries for {request.path}")
@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+
+RANKING_COLUMNS = [
+    'period', 'period_label', 'days_with_data', 'cumulative_days',
+    'period_rank', 'cumulative_rank', 'participants',
+]
+
+
+def count_days_per_period(df_history, interval='week'):
+    """
+    Count each participant's days with data per week or month
+
+    Args:
+        df_history: DataFrame with participant_id and date columns, one row
+            per participant and day with data
+        interval: 'week' or 'month'
+
+    Returns:
+        DataFrame with period, participant_id and days_with_data columns
+    """
+    if df_history is None or df_history.empty:
+        return pd.DataFrame(columns=['period', 'participant_id', 'days_with_data'])
+
+    freq = 'W' if interval == 'week' else 'M'
+    periods = pd.to_datetime(df_history['date']).dt.to_period(freq)
+    return (
+        df_history.assign(period=periods)
+        .groupby(['period', 'participant_id'])
+        .size()
+        .reset_index(name='days_with_data')
+    )
+
+
+def summarize_history_chunks(chunks, interval='week'):
+    """
+    Fold chunks of historical data into per-period day counts
+
+    Only the running counts (participants x periods) are kept in memory, so
+    the history itself can be streamed from the database.
+
+    Args:
+        chunks: Iterable of DataFrames with participant_id and date columns
+        interval: 'week' or 'month'
+
+    Returns:
+        DataFrame with period, participant_id and days_with_data columns
+    """
+    totals = None
+    for chunk in chunks:
+        counts = count_days_per_period(chunk, interval)
+        if counts.empty:
+            continue
+        if totals is None:
+            totals = counts
+        else:
+            # A participant's period can span two chunks
+            totals = (
+                pd.concat([totals, counts], ignore_index=True)
+                .groupby(['period', 'participant_id'], as_index=False)['days_with_data']
+                .sum()
+            )
+    if totals is None:
+        return count_days_per_period(None, interval)
+    return totals
+
+
+def period_matrix(period_data):
+    """
+    Pivot per-period day counts into a participants x periods matrix
+
+    Args:
+        period_data: DataFrame with period, participant_id and days_with_data
+
+    Returns:
+        Tuple of (participant ids, sorted periods, int64 matrix) where
+        participant-periods without data are 0
+    """
+    participant_codes, participants = pd.factorize(period_data['participant_id'], sort=True)
+    period_codes, periods = pd.factorize(period_data['period'], sort=True)
+
+    matrix = np.zeros((len(participants), len(periods)), dtype=np.int64)
+    np.add.at(matrix, (participant_codes, period_codes), period_data['days_with_data'].to_numpy(dtype=np.int64))
+    return np.asarray(participants), list(periods), matrix
+
+
+def competition_ranks(matrix):
+    """
+    Rank every column of a matrix, highest value first, ties sharing a rank
+
+    A value's rank is one more than the number of strictly higher values in
+    its column ("1224" ranking). All columns are ranked in one sort: each
+    column is shifted into its own value range, so a single searchsorted over
+    the flattened, sorted matrix finds where every value first appears.
+
+    Args:
+        matrix: Participants x periods array of numbers
+
+    Returns:
+        int64 array of ranks with the same shape
+    """
+    n_rows, n_columns = matrix.shape
+    if matrix.size == 0:
+        return np.zeros(matrix.shape, dtype=np.int64)
+
+    negated = -matrix.astype(np.float64)
+    span = negated.max() - negated.min() + 1
+    shifted = negated + np.arange(n_columns) * span
+
+    ordered = np.sort(shifted, axis=0).ravel(order='F')
+    first_position = np.searchsorted(ordered, shifted.ravel(order='F'), side='left')
+    ranks = first_position - np.repeat(np.arange(n_columns) * n_rows, n_rows) + 1
+    return ranks.reshape((n_rows, n_columns), order='F')
+
+
+def rank_over_time(period_data, user_id, interval='week'):
+    """
+    Compute a participant's rank per period and cumulatively
+
+    Args:
+        period_data: Output of count_days_per_period or summarize_history_chunks
+        user_id: Participant to report the ranks for
+        interval: 'week' or 'month'
+
+    Returns:
+        DataFrame with one row per period and RANKING_COLUMNS. A participant
+        without any data is ranked as if they had 0 days.
+    """
+    if period_data is None or period_data.empty:
+        return pd.DataFrame(columns=RANKING_COLUMNS)
+
+    participants, periods, matrix = period_matrix(period_data)
+    cumulative = np.cumsum(matrix, axis=1)
+
+    user_row = np.flatnonzero(participants == user_id)
+    if len(user_row):
+        row = user_row[0]
+        period_ranks = competition_ranks(matrix)[row]
+        cumulative_ranks = competition_ranks(cumulative)[row]
+        user_days = matrix[row]
+        user_cumulative = cumulative[row]
+    else:
+        user_days = np.zeros(len(periods), dtype=np.int64)
+        user_cumulative = user_days
+        period_ranks = (matrix > 0).sum(axis=0) + 1
+        cumulative_ranks = (cumulative > 0).sum(axis=0) + 1
+
+    label_format = '%b %d' if interval == 'week' else '%b %Y'
+    return pd.DataFrame({
+        'period': periods,
+        'period_label': [period.start_time.strftime(label_format) for period in periods],
+        'days_with_data': user_days,
+        'cumulative_days': user_cumulative,
+        'period_rank': period_ranks,
+        'cumulative_rank': cumulative_ranks,
+        'participants': len(participants),
+    }, columns=RANKING_COLUMNS)
@@ -0,0 +1,271 @@
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+from .aggregates import (
+    WATERMARK_OVERLAP, ensure_aggregate_tables, get_refresh_state, has_column, rewrite_counters,
+    save_refresh_state,
+)
+from .database import QUESTIONNAIRE_RANKING_TABLES, RANKING_TABLES, STUDY_START_DATE, engine
+from .logging_config import get_logger
+from .shared_cache import get_data_version
+
+logger = get_logger(__name__)
+
+# Source tables whose writes make the snapshots stale
+RANKING_SNAPSHOT_SOURCES = tuple(dict.fromkeys(RANKING_TABLES + QUESTIONNAIRE_RANKING_TABLES))
+
+
+def ensure_ranking_snapshot_table():
+    """Create the ranking_snapshots table if it does not exist yet"""
+    ensure_aggregate_tables()
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS ranking_snapshots (
+                user_id INTEGER NOT NULL,
+                snapshot_date DATE NOT NULL,
+                group_id INTEGER NOT NULL,
+                consistency_rank INTEGER,
+                questionnaire_rank INTEGER,
+                total_participants INTEGER,
+                data_volume_mb DOUBLE PRECISION,
+                completion_rate DOUBLE PRECISION,
+                consistency JSONB,
+                questionnaire JSONB,
+                group_consistency JSONB,
+                group_questionnaire JSONB,
+                refreshed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, snapshot_date)
+            )
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ranking_snapshots_group_idx
+            ON ranking_snapshots (group_id, snapshot_date)
+        """))
+
+
+def ensure_period_count_tables():
+    """Create the per-participant weekly count table if it does not exist yet"""
+    ensure_aggregate_tables()
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS participant_week_counts (
+                participant_id INTEGER NOT NULL,
+                week_start DATE NOT NULL,
+                days_with_data INTEGER NOT NULL,
+                PRIMARY KEY (participant_id, week_start)
+            )
+        """))
+
+
+def _changed_groups(conn, watermark):
+    """
+    Find the groups whose participants got new data since the watermark
+
+    Returns:
+        List of group ids, or None when the source tables do not track
+        created_at and every group has to be refreshed
+    """
+    if not (has_column(conn, 'health_metrics', 'created_at')
+            and has_column(conn, 'questionnaire_data', 'created_at')):
+        return None
+    rows = conn.execute(text("""
+        SELECT DISTINCT ug.group_id
+        FROM user_groups ug
+        WHERE ug.user_id IN (
+            SELECT user_id FROM health_metrics WHERE created_at > :since
+            UNION
+            SELECT user_id FROM questionnaire_data WHERE created_at > :since
+        )
+    """), {"since": watermark - WATERMARK_OVERLAP}).fetchall()
+    return [row[0] for row in rows]
+
+
+def refresh_ranking_snapshots(full=False):
+    """
+    Store today's rankings of every participant in ranking_snapshots
+
+    Runs the two per-participant ranking stored functions for each
+    participant and the two group ranking functions once per group, through
+    one representative member, joining their rows back on participant_id.
+    Groups without new data since the last refresh keep their snapshot
+    unless the day changed, memberships or roles changed, rows were updated
+    or deleted, or full is set.
+
+    Args:
+        full: Recompute every group
+
+    Returns:
+        Number of participant snapshots written
+    """
+    ensure_ranking_snapshot_table()
+
+    today = date.today()
+    source_versions = get_data_version(RANKING_SNAPSHOT_SOURCES, fresh=True)
+    started = datetime.now()
+
+    with engine.begin() as conn:
+        state = get_refresh_state(conn, 'ranking_snapshots')
+        # Membership, role, group, update and delete changes cannot be
+        # narrowed to the groups they touch through created_at
+        rewrites = rewrite_counters(conn) + get_data_version(('groups',), fresh=True)
+        groups = None
+        if (not full and state is not None and state["refreshed_at"].date() == today
+                and tuple(state["rewrite_versions"] or ()) == rewrites):
+            if tuple(state["source_versions"] or ()) == source_versions:
+                logger.info("ranking_snapshots already up to date")
+                return 0
+            groups = _changed_groups(conn, state["watermark"])
+            if groups == []:
+                save_refresh_state(conn, 'ranking_snapshots', started, source_versions, rewrites)
+                return 0
+
+        group_filter = "AND ug.group_id = ANY(:groups)" if groups is not None else ""
+        written = conn.execute(text(f"""
+            WITH participants AS (
+                SELECT DISTINCT ON (u.id) u.id AS user_id, ug.group_id
+                FROM users u
+                JOIN user_groups ug ON u.id = ug.user_id
+                WHERE u.role = 'participant' {group_filter}
+                ORDER BY u.id, ug.group_id
+            ),
+            representatives AS (
+                SELECT DISTINCT ON (group_id) group_id, user_id
+                FROM participants
+                ORDER BY group_id, user_id
+            ),
+            group_consistency AS (
+                SELECT DISTINCT ON (r.group_id, gc.participant_id)
+                    r.group_id, gc.participant_id, to_jsonb(gc) AS ranking
+                FROM representatives r
+                CROSS JOIN LATERAL get_group_participants_ranking(r.user_id, :start_date, :end_date) gc
+                ORDER BY r.group_id, gc.participant_id
+            ),
+            group_questionnaire AS (
+                SELECT DISTINCT ON (r.group_id, gq.participant_id)
+                    r.group_id, gq.participant_id, to_jsonb(gq) AS ranking
+                FROM representatives r
+                CROSS JOIN LATERAL get_group_questionnaire_ranking(r.user_id, :start_date, :end_date) gq
+                ORDER BY r.group_id, gq.participant_id
+            ),
+            snapshots AS (
+                SELECT
+                    p.user_id,
+                    p.group_id,
+                    to_jsonb(c) AS consistency,
+                    to_jsonb(q) AS questionnaire,
+                    gc.ranking AS group_consistency,
+                    gq.ranking AS group_questionnaire
+                FROM participants p
+                LEFT JOIN LATERAL get_participant_data_consistency_rank(p.user_id, :start_date, :end_date) c ON TRUE
+                LEFT JOIN LATERAL get_participant_questionnaire_rank(p.user_id, :start_date, :end_date) q ON TRUE
+                LEFT JOIN group_consistency gc ON gc.group_id = p.group_id AND gc.participant_id = p.user_id
+                LEFT JOIN group_questionnaire gq ON gq.group_id = p.group_id AND gq.participant_id = p.user_id
+            )
+            INSERT INTO ranking_snapshots (
+                user_id, snapshot_date, group_id, consistency_rank, questionnaire_rank,
+                total_participants, data_volume_mb, completion_rate,
+                consistency, questionnaire, group_consistency, group_questionnaire, refreshed_at
+            )
+            SELECT
+                user_id, :end_date, group_id,
+                (consistency->>'rank')::int,
+                (questionnaire->>'rank')::int,
+                (consistency->>'total_participants')::int,
+                (group_consistency->>'data_volume_mb')::float8,
+                (questionnaire->>'completion_rate')::float8,
+                consistency, questionnaire, group_consistency, group_questionnaire,
+                CURRENT_TIMESTAMP
+            FROM snapshots
+            ON CONFLICT (user_id, snapshot_date) DO UPDATE SET
+                group_id = EXCLUDED.group_id,
+                consistency_rank = EXCLUDED.consistency_rank,
+                questionnaire_rank = EXCLUDED.questionnaire_rank,
+                total_participants = EXCLUDED.total_participants,
+                data_volume_mb = EXCLUDED.data_volume_mb,
+                completion_rate = EXCLUDED.completion_rate,
+                consistency = EXCLUDED.consistency,
+                questionnaire = EXCLUDED.questionnaire,
+                group_consistency = EXCLUDED.group_consistency,
+                group_questionnaire = EXCLUDED.group_questionnaire,
+                refreshed_at = EXCLUDED.refreshed_at
+        """), {
+            "start_date": STUDY_START_DATE,
+            "end_date": today,
+            "groups": groups,
+        }).rowcount
+
+        save_refresh_state(conn, 'ranking_snapshots', started, source_versions, rewrites)
+
+    logger.info(f"Refreshed {written} ranking snapshots for {today}")
+    return written
+
+
+def refresh_participant_period_counts(full=False):
+    """
+    Bring the per-participant weekly day counts up to date
+
+    Only the (participant, week) pairs that received health_metrics rows
+    since the last refresh, by created_at, are recounted from health_metrics
+    and overwritten, so re-running never counts a day twice and late
+    backfills land in their own week. Everything is recounted when full is
+    set, on the first refresh, when health_metrics has no created_at column,
+    and after updates, deletes, membership or role changes.
+
+    Args:
+        full: Recount every week since STUDY_START_DATE
+
+    Returns:
+        Number of (participant, week) counts written
+    """
+    ensure_period_count_tables()
+
+    with engine.begin() as conn:
+        # Concurrent runs would interleave their recounts and watermarks
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('participant_period_counts'))"))
+
+        rewrites = rewrite_counters(conn)
+        state = get_refresh_state(conn, 'participant_period_counts')
+        tracks_created_at = has_column(conn, 'health_metrics', 'created_at')
+        latest = None
+        if tracks_created_at:
+            latest = conn.execute(text("SELECT MAX(created_at) FROM health_metrics")).scalar() or datetime.min
+
+        incremental = (
+            not full
+            and tracks_created_at
+            and state is not None
+            and state["watermark"] is not None
+            and tuple(state["rewrite_versions"] or ()) == rewrites
+        )
+        params = {"start_date": STUDY_START_DATE, "end_date": date.today()}
+        if incremental:
+            week_filter = """
+                AND (hm.user_id, date_trunc('week', hm.date)::date) IN (
+                    SELECT DISTINCT user_id, date_trunc('week', date)::date
+                    FROM health_metrics
+                    WHERE created_at > :since
+                )
+            """
+            params["since"] = state["watermark"] - WATERMARK_OVERLAP
+            watermark = max(latest, state["watermark"])
+        else:
+            week_filter = ""
+            watermark = latest or datetime.now()
+            conn.execute(text("TRUNCATE participant_week_counts"))
+
+        written = conn.execute(text(f"""
+            INSERT INTO participant_week_counts (participant_id, week_start, days_with_data)
+            SELECT hm.user_id, date_trunc('week', hm.date)::date, COUNT(DISTINCT hm.date)
+            FROM health_metrics hm
+            JOIN users u ON u.id = hm.user_id AND u.role = 'participant'
+            WHERE hm.date BETWEEN :start_date AND :end_date {week_filter}
+            GROUP BY hm.user_id, date_trunc('week', hm.date)
+            ON CONFLICT (participant_id, week_start) DO UPDATE SET
+                days_with_data = EXCLUDED.days_with_data
+        """), params).rowcount
+
+        save_refresh_state(conn, 'participant_period_counts', watermark, (), rewrites)
+
+    logger.info(f"Recounted {written} participant weeks")
+    return written
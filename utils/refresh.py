@@ -0,0 +1,68 @@
+"""
+Refresh the materialized tables the dashboard reads from
+
+Meant to run from cron (or a systemd timer) every few minutes after data
+ingestion. Each step only recomputes what changed since its last run unless
+--full is given.
+
+Usage:
+    python -m utils.refresh [--full] [--only group_daily_aggregates]
+"""
+import argparse
+import time
+
+from .aggregates import refresh_group_daily_aggregates
+from .anomaly_episodes import refresh_anomaly_episodes
+from .anomaly_rollups import refresh_anomaly_hourly
+from .anomaly_vectors import refresh_anomaly_vectors
+from .logging_config import get_logger
+from .ranking_snapshots import refresh_participant_period_counts, refresh_ranking_snapshots
+
+logger = get_logger(__name__)
+
+# Steps run in order; each takes a single `full` flag
+REFRESH_STEPS = {
+    'group_daily_aggregates': refresh_group_daily_aggregates,
+    'anomaly_score_vectors': refresh_anomaly_vectors,
+    'anomaly_hourly': refresh_anomaly_hourly,
+    'anomaly_episodes': refresh_anomaly_episodes,
+    'ranking_snapshots': refresh_ranking_snapshots,
+    'participant_period_counts': refresh_participant_period_counts,
+}
+
+
+def run_refresh(full=False, only=None):
+    """
+    Run the registered refresh steps
+
+    Args:
+        full: Recompute everything instead of only what changed
+        only: Optional list of step names to run
+
+    Returns:
+        True if every step succeeded
+    """
+    ok = True
+    for name, step in REFRESH_STEPS.items():
+        if only and name not in only:
+            continue
+        start = time.perf_counter()
+        try:
+            step(full=full)
+            logger.info(f"Refresh step {name} finished in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logger.error(f"Refresh step {name} failed: {e}")
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="recompute everything")
+    parser.add_argument("--only", action="append", choices=sorted(REFRESH_STEPS), help="run only this step")
+    args = parser.parse_args()
+    raise SystemExit(0 if run_refresh(full=args.full, only=args.only) else 1)
+
+
+if __name__ == "__main__":
+    main()
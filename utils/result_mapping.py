@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+
+# Compact dtypes for columns that show up in the larger result sets.
+# Counts and ids fit comfortably in 32 bits and averages do not need float64.
+COUNT_DTYPES = {
+    "group_id": "int32",
+    "physio_count": "int32",
+    "questionnaire_count": "int32",
+    "physio_data_count": "int32",
+    "questionnaire_data_count": "int32",
+}
+
+AVERAGE_DTYPES = {
+    "avg_resting_hr": "float32",
+    "avg_max_hr": "float32",
+    "avg_sleep_hours": "float32",
+    "avg_hrv_rest": "float32",
+    "avg_step_count": "float32",
+    "avg_sleep_quality": "float32",
+    "avg_fatigue_level": "float32",
+    "avg_motivation_level": "float32",
+}
+
+
+def row_to_dict(result, row):
+    """
+    Map a single row of a result to a dictionary
+
+    Args:
+        result: SQLAlchemy CursorResult the row came from
+        row: Row returned by fetchone(), or None
+
+    Returns:
+        Dictionary keyed by column name, or None if there is no row
+    """
+    if row is None:
+        return None
+    return dict(zip(result.keys(), row))
+
+
+def rows_to_dicts(result):
+    """
+    Map all remaining rows of a result to dictionaries in a single pass
+
+    Args:
+        result: SQLAlchemy CursorResult
+
+    Returns:
+        List of dictionaries keyed by column name
+    """
+    keys = tuple(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+
+def rows_to_columns(result, dtypes=None):
+    """
+    Transpose all remaining rows of a result into one NumPy array per column
+
+    Args:
+        result: SQLAlchemy CursorResult
+        dtypes: Optional mapping of column name to NumPy dtype. Columns
+            without an entry keep the dtype NumPy infers.
+
+    Returns:
+        Dictionary mapping column name to a NumPy array
+    """
+    keys = tuple(result.keys())
+    rows = result.fetchall()
+    dtypes = dtypes or {}
+
+    if rows:
+        transposed = zip(*rows)
+    else:
+        transposed = ((),) * len(keys)
+
+    columns = {}
+    for key, values in zip(keys, transposed):
+        dtype = dtypes.get(key)
+        try:
+            columns[key] = np.asarray(values, dtype=dtype)
+        except (TypeError, ValueError):
+            # NULLs in an integer column - keep the values as objects
+            columns[key] = np.asarray(values, dtype=object)
+    return columns
+
+
+def rows_to_frame(result, dtypes=None):
+    """
+    Build a DataFrame from all remaining rows of a result
+
+    Args:
+        result: SQLAlchemy CursorResult
+        dtypes: Optional mapping of column name to dtype. Integer columns
+            that contain NULLs fall back to the matching nullable pandas dtype.
+
+    Returns:
+        Pandas DataFrame
+    """
+    df = pd.DataFrame(rows_to_columns(result), copy=False)
+    return apply_dtypes(df, dtypes)
+
+
+def apply_dtypes(df, dtypes=None):
+    """
+    Downcast DataFrame columns to compact dtypes where they are present
+
+    Args:
+        df: Pandas DataFrame
+        dtypes: Mapping of column name to dtype
+
+    Returns:
+        The same DataFrame with converted columns
+    """
+    if not dtypes or df.empty:
+        return df
+
+    for col, dtype in dtypes.items():
+        if col not in df.columns:
+            continue
+        try:
+            df[col] = df[col].astype(dtype)
+        except (TypeError, ValueError):
+            # int32 -> Int32 handles integer columns with missing values
+            df[col] = df[col].astype(dtype.capitalize())
+    return df
@@ -0,0 +1,464 @@
+from datetime import date, datetime, time as time_of_day, timedelta
+from decimal import Decimal
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import stat
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Backend shared by all gunicorn workers: 'sqlite' (default), 'redis' or 'none'
+RESULT_CACHE_BACKEND = os.environ.get('RESULT_CACHE_BACKEND', 'sqlite').lower()
+# Kept in a directory only the app user can open (created with mode 0700),
+# never in a shared location such as /tmp
+RESULT_CACHE_PATH = os.environ.get(
+    'RESULT_CACHE_PATH',
+    os.path.join(os.path.dirname(__file__), '..', 'instance', 'cache', 'result_cache.sqlite3'),
+)
+RESULT_CACHE_URL = os.environ.get('RESULT_CACHE_URL', 'redis://localhost:6379/0')
+RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', str(6 * 3600)))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', '2000'))
+
+# How long a worker trusts the table versions it last read from Postgres
+DATA_VERSION_TTL = float(os.environ.get('DATA_VERSION_TTL', '30'))
+
+# Bump when the stored shape of cached results changes
+_KEY_VERSION = 2
+
+
+class NullCacheBackend:
+    """Backend that never stores anything"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def clear(self):
+        pass
+
+
+class SQLiteCacheBackend:
+    """
+    On-disk cache shared by every process that opens the same file
+
+    Entries expire after their TTL and the least recently used ones are
+    evicted once the table grows past max_entries.
+    """
+
+    _EVICT_EVERY = 50
+
+    def __init__(self, path, max_entries):
+        self.path = os.path.abspath(path)
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._sets = 0
+        self._lock = threading.Lock()
+        _check_private_path(self.path)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS result_cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS result_cache_accessed ON result_cache (accessed_at)")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value FROM result_cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE result_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key, value, ttl):
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO result_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, sqlite3.Binary(value), now + ttl, now),
+        )
+        with self._lock:
+            self._sets += 1
+            evict = self._sets % self._EVICT_EVERY == 0
+        if evict:
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM result_cache WHERE expires_at <= ?", (now,))
+        conn.execute("""
+            DELETE FROM result_cache WHERE key IN (
+                SELECT key FROM result_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+
+    def clear(self):
+        self._connect().execute("DELETE FROM result_cache")
+
+
+def _check_private_path(path):
+    """
+    Make sure only this process's user can write the cache file
+
+    The directory is created with mode 0700. An existing directory or file
+    owned by another user, or writable by group or others, is refused.
+
+    Raises:
+        PermissionError: If the location is not private
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    uid = os.getuid()
+    for target in (directory, path):
+        try:
+            info = os.lstat(target)
+        except FileNotFoundError:
+            continue
+        if stat.S_ISLNK(info.st_mode):
+            raise PermissionError(f"{target} is a symlink")
+        if info.st_uid != uid:
+            raise PermissionError(f"{target} is owned by uid {info.st_uid}, not {uid}")
+        if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise PermissionError(f"{target} is writable by other users")
+
+
+class RedisCacheBackend:
+    """
+    Cache stored in Redis (or any server speaking its protocol)
+
+    Size bounds come from the server's maxmemory / maxmemory-policy settings,
+    which should be set to allkeys-lru.
+    """
+
+    _PREFIX = 'fitonduty:result:'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RESULT_CACHE_BACKEND=redis requires the 'redis' package") from e
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._client.get(self._PREFIX + key)
+
+    def set(self, key, value, ttl):
+        self._client.setex(self._PREFIX + key, ttl, value)
+
+    def clear(self):
+        for key in self._client.scan_iter(self._PREFIX + '*'):
+            self._client.delete(key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'errors': 0}
+
+_versions_lock = threading.Lock()
+_versions = {}
+
+
+def get_cache_backend():
+    """
+    Get the configured cache backend for this worker
+
+    Returns:
+        Backend instance, or None when caching is disabled
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if RESULT_CACHE_BACKEND == 'redis':
+                    _backend = RedisCacheBackend(RESULT_CACHE_URL)
+                elif RESULT_CACHE_BACKEND == 'sqlite':
+                    try:
+                        _backend = SQLiteCacheBackend(RESULT_CACHE_PATH, RESULT_CACHE_MAX_ENTRIES)
+                    except PermissionError as e:
+                        logger.error(f"Refusing to use {RESULT_CACHE_PATH} for the result cache: {e}")
+                        _backend = NullCacheBackend()
+                else:
+                    _backend = NullCacheBackend()
+                logger.info(f"Using {type(_backend).__name__} for shared query results")
+    if isinstance(_backend, NullCacheBackend):
+        return None
+    return _backend
+
+
+def get_data_version(tables, fresh=False):
+    """
+    Get a version number for each table that changes whenever rows are written
+
+    Uses the insert/update/delete counters Postgres keeps in
+    pg_stat_user_tables, so no triggers or extra columns are needed. The
+    users table is the exception: its counters move on every last_login
+    update, so it is versioned by a fingerprint of each user's id, role and
+    is_active instead. Versions are re-read at most every DATA_VERSION_TTL
+    seconds per worker.
+
+    Args:
+        tables: Iterable of table names
+        fresh: Skip the per-worker cache and read the counters now
+
+    Returns:
+        Tuple of version numbers in the same order as tables
+    """
+    tables = tuple(tables)
+    now = time.monotonic()
+    with _versions_lock:
+        cached = _versions.get(tables)
+        if cached and cached[0] > now and not fresh:
+            return cached[1]
+
+    # Imported here because utils.database decorates its functions with this module
+    from .database import engine
+
+    query = text("""
+        SELECT relname, n_tup_ins + n_tup_upd + n_tup_del AS version
+        FROM pg_stat_user_tables
+        WHERE relname = ANY(:tables)
+    """)
+    with engine.connect() as conn:
+        rows = dict(conn.execute(query, {"tables": list(tables)}).fetchall())
+        if 'users' in tables:
+            rows['users'] = conn.execute(text("""
+                SELECT COALESCE(SUM(hashtext(id::text || ':' || role || ':' || is_active::text)::bigint), 0)
+                FROM users
+            """)).scalar()
+
+    versions = tuple(int(rows.get(table, 0)) for table in tables)
+    with _versions_lock:
+        _versions[tables] = (now + DATA_VERSION_TTL, versions)
+    return versions
+
+
+def get_stats_epoch():
+    """
+    Get a number that changes whenever the pg_stat counters restart
+
+    The counters start over after a crash, a server restart or a statistics
+    reset, so on their own an old version number could come back and match
+    a stale entry. Combined with this, it cannot.
+
+    Returns:
+        Seconds since the epoch of the later of the server start and the
+        last statistics reset of this database
+    """
+    now = time.monotonic()
+    with _versions_lock:
+        cached = _versions.get(None)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    from .database import engine
+
+    with engine.connect() as conn:
+        epoch = conn.execute(text("""
+            SELECT EXTRACT(EPOCH FROM GREATEST(
+                pg_postmaster_start_time(),
+                (SELECT stats_reset FROM pg_stat_database WHERE datname = current_database())
+            ))::bigint
+        """)).scalar()
+
+    with _versions_lock:
+        _versions[None] = (now + DATA_VERSION_TTL, int(epoch))
+    return int(epoch)
+
+
+def _encode(value):
+    """Turn a cached result into JSON-compatible data, tagging non-JSON types"""
+    if value is None or value is pd.NaT or isinstance(value, (bool, str)):
+        return None if value is pd.NaT else value
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        return value if np.isfinite(value) else {"__float__": repr(value)}
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, time_of_day):
+        return {"__time__": value.isoformat()}
+    if isinstance(value, timedelta):
+        return {"__timedelta__": value.total_seconds()}
+    if isinstance(value, Decimal):
+        return {"__decimal__": str(value)}
+    if isinstance(value, (list, tuple)):
+        items = [_encode(item) for item in value]
+        return items if isinstance(value, list) else {"__tuple__": items}
+    if isinstance(value, dict):
+        return {"__dict__": [[_encode(k), _encode(v)] for k, v in value.items()]}
+    if isinstance(value, pd.DataFrame):
+        index = None
+        if not isinstance(value.index, pd.RangeIndex) or value.index.start != 0 or value.index.step != 1:
+            index = {"name": _encode(value.index.name), "values": [_encode(item) for item in value.index.tolist()]}
+        return {"__frame__": {
+            "columns": [_encode(column) for column in value.columns],
+            "dtypes": [str(dtype) for dtype in value.dtypes],
+            "data": [[_encode(item) for item in value.iloc[:, i].tolist()] for i in range(value.shape[1])],
+            "index": index,
+        }}
+    raise TypeError(f"cannot cache values of type {type(value).__name__}")
+
+
+_TAGS = {
+    "__float__": float,
+    "__datetime__": datetime.fromisoformat,
+    "__date__": date.fromisoformat,
+    "__time__": time_of_day.fromisoformat,
+    "__timedelta__": lambda seconds: timedelta(seconds=seconds),
+    "__decimal__": Decimal,
+}
+
+
+def _decode(data):
+    """Inverse of _encode"""
+    if isinstance(data, list):
+        return [_decode(item) for item in data]
+    if not isinstance(data, dict):
+        return data
+    (tag, payload), = data.items()
+    if tag in _TAGS:
+        return _TAGS[tag](payload)
+    if tag == "__tuple__":
+        return tuple(_decode(item) for item in payload)
+    if tag == "__dict__":
+        return {_decode(k): _decode(v) for k, v in payload}
+    # __frame__
+    columns = [_decode(column) for column in payload["columns"]]
+    series = []
+    for values, dtype in zip(payload["data"], payload["dtypes"]):
+        column = pd.Series([_decode(item) for item in values], dtype=object)
+        if dtype != 'object':
+            column = pd.to_datetime(column) if dtype.startswith('datetime64') else column
+            column = column.astype(dtype)
+        series.append(column)
+    frame = pd.concat(series, axis=1, ignore_index=True) if series else pd.DataFrame()
+    frame.columns = columns
+    if payload["index"] is not None:
+        frame.index = pd.Index(
+            [_decode(item) for item in payload["index"]["values"]], name=_decode(payload["index"]["name"])
+        )
+    return frame
+
+
+def _dumps(value):
+    return json.dumps(_encode(value), separators=(',', ':')).encode()
+
+
+def _loads(raw):
+    return _decode(json.loads(raw))
+
+
+def _is_cacheable(value):
+    # Empty results are also what the database functions return on error
+    if value is None:
+        return False
+    if isinstance(value, pd.DataFrame):
+        return not value.empty
+    if isinstance(value, (list, dict)):
+        return len(value) > 0
+    return True
+
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def shared_cached(tables, ttl=None, key_func=None):
+    """
+    Cache a function's results in the backend shared by all workers
+
+    The key is built from the function name, its arguments (or whatever
+    key_func returns for them) and the current data version of each table in
+    tables, so any write to those tables makes earlier entries unreachable.
+
+    Args:
+        tables: Tables the result depends on
+        ttl: Seconds an entry stays valid (defaults to RESULT_CACHE_TTL)
+        key_func: Optional function mapping the call arguments to the part of
+            the key that identifies the result, e.g. a group instead of a user
+
+    Returns:
+        Decorator for read-only database functions
+    """
+    tables = tuple(tables)
+    ttl = ttl or RESULT_CACHE_TTL
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                backend = get_cache_backend()
+                if backend is None:
+                    return func(*args, **kwargs)
+                scope = key_func(*args, **kwargs) if key_func else (args, sorted(kwargs.items()))
+                raw_key = (
+                    _KEY_VERSION, func.__module__, func.__qualname__, scope,
+                    get_stats_epoch(), get_data_version(tables),
+                )
+                key = hashlib.sha256(repr(raw_key).encode()).hexdigest()
+                cached = backend.get(key)
+            except Exception as e:
+                _count('errors')
+                logger.warning(f"Shared cache unavailable for {func.__name__}: {e}")
+                return func(*args, **kwargs)
+
+            if cached is not None:
+                _count('hits')
+                return _loads(cached)
+
+            _count('misses')
+            value = func(*args, **kwargs)
+            if _is_cacheable(value):
+                try:
+                    backend.set(key, _dumps(value), ttl)
+                except Exception as e:
+                    _count('errors')
+                    logger.warning(f"Could not store {func.__name__} result in shared cache: {e}")
+            return value
+
+        return wrapper
+    return decorator
+
+
+def get_shared_cache_stats():
+    """
+    Get shared cache counters for this worker
+
+    Returns:
+        Dictionary with hits, misses and backend errors
+    """
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+from .database import engine, get_user_by_id, get_user_groups
+from .logging_config import get_logger
+from .metrics import counter
+from .shared_cache import DATA_VERSION_TTL, get_data_version
+
+logger = get_logger(__name__)
+
+# How long a loaded user (and their groups) is trusted without re-reading it
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '300'))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', '4096'))
+
+# Writes to these tables (group or membership changes) drop every cached
+# user within DATA_VERSION_TTL, in every worker. users is not listed: its
+# write counter also moves on every last_login update, so changes to it are
+# followed through _users_fingerprint instead
+USER_CACHE_TABLES = ('user_groups', 'groups')
+
+USER_CACHE_REQUESTS = counter('user_cache_requests_total', 'User lookups by Flask-Login', ('result',))
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+
+_fingerprint_lock = threading.Lock()
+_fingerprint = (0.0, None)
+
+
+def _users_fingerprint():
+    """
+    Get a number that changes when a user is added, removed, deactivated,
+    renamed, or changes role or password, but not on last_login updates
+
+    Kept per worker for DATA_VERSION_TTL seconds, like the table versions.
+    """
+    global _fingerprint
+    now = time.monotonic()
+    with _fingerprint_lock:
+        expires_at, value = _fingerprint
+        if expires_at > now:
+            return value
+
+    with engine.connect() as conn:
+        value = conn.execute(text("""
+            SELECT COALESCE(SUM(hashtext(
+                id::text || ':' || username || ':' || COALESCE(password_hash, '') || ':'
+                || role || ':' || is_active::text
+            )::bigint), 0)
+            FROM users
+        """)).scalar()
+
+    with _fingerprint_lock:
+        _fingerprint = (now + DATA_VERSION_TTL, int(value))
+    return int(value)
+
+
+def _current_version():
+    try:
+        return get_data_version(USER_CACHE_TABLES) + (_users_fingerprint(),)
+    except Exception as e:
+        logger.debug(f"Could not read user table versions: {e}")
+        return None
+
+
+def get_user_with_groups(user_id):
+    """
+    Get a user record and their groups, cached across requests
+
+    Every Dash callback is its own HTTP request and Flask-Login loads the user
+    for each of them. Entries expire after USER_CACHE_TTL seconds, when a
+    user's identity, role or status changes, when the user_groups/groups
+    tables change, or through invalidate_user. Logins alone do not expire
+    them, so the cached last_login may lag by up to USER_CACHE_TTL.
+
+    Args:
+        user_id: User ID
+
+    Returns:
+        Tuple of (user dictionary or None, list of group dictionaries or None).
+        Groups are only loaded for participants and supervisors.
+    """
+    now = time.monotonic()
+    version = _current_version()
+
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is not None:
+            expires_at, entry_version, value = entry
+            if expires_at > now and version is not None and entry_version == version:
+                _entries.move_to_end(user_id)
+                USER_CACHE_REQUESTS.inc(result='hit')
+                return value
+            del _entries[user_id]
+
+    USER_CACHE_REQUESTS.inc(result='miss')
+    user_data = get_user_by_id(user_id)
+    groups = None
+    if user_data and user_data.get('role', 'participant') in ('participant', 'supervisor'):
+        groups = get_user_groups(user_id)
+    value = (user_data, groups)
+
+    # Inactive or unknown users are not cached, so reactivation is seen at once
+    if user_data and version is not None:
+        with _lock:
+            _entries[user_id] = (now + USER_CACHE_TTL, version, value)
+            _entries.move_to_end(user_id)
+            while len(_entries) > USER_CACHE_MAX_ENTRIES:
+                _entries.popitem(last=False)
+    return value
+
+
+def invalidate_user(user_id=None):
+    """
+    Drop a cached user in this worker, or every cached user
+
+    Args:
+        user_id: User ID, or None to clear the whole cache
+    """
+    with _lock:
+        if user_id is None:
+            _entries.clear()
+        else:
+            _entries.pop(user_id, None)
@@ -67,21 +67,31 @@ def create_anomaly_timeline(df):
     return fig
 
 def create_anomaly_heatmap(df_week):
-    """Create a heatmap of anomaly scores across multiple days"""
+    """
+    Create a heatmap of anomaly scores across multiple days
+    
+    Accepts either per-minute scores (date, time_slot, score) or hourly
+    rollups that already have an hour column (date, hour, score).
+    """
     if df_week.empty:
         return create_empty_chart("No anomaly data available for the selected date range")
     
     # Ensure the dataframe has required columns
-    if not all(col in df_week.columns for col in ['date', 'time_slot', 'score']):
+    is_hourly = 'hour' in df_week.columns
+    slot_column = 'hour' if is_hourly else 'time_slot'
+    if not all(col in df_week.columns for col in ['date', slot_column, 'score']):
         return create_empty_chart("Invalid data format for anomaly heatmap")
     
     # For a meaningful heatmap, we need data for at least 2 days
     if df_week['date'].nunique() < 2:
         return create_empty_chart("Select a date range of at least 2 days for the heatmap view")
     
-    # Group data into hourly slots for better visualization
-    df_week['hour'] = df_week['time_slot'] // 60
-    df_grouped = df_week.groupby(['date', 'hour'])['score'].mean().reset_index()
+    if is_hourly:
+        df_grouped = df_week[['date', 'hour', 'score']]
+    else:
+        # Group data into hourly slots for better visualization
+        df_week['hour'] = df_week['time_slot'] // 60
+        df_grouped = df_week.groupby(['date', 'hour'])['score'].mean().reset_index()
     
     # Create pivot table
     pivot_df = df_grouped.pivot_table(
@@ -1,5 +1,4 @@
 import numpy as np
-import pandas as pd
 import plotly.graph_objects as go
 
 
@@ -237,75 +236,24 @@ def create_race_figure(participant_data: dict, current_participant_id: int) -> g
     return fig
 
 
-def create_ranking_over_time_figure(user_id, df_history, interval='week'):
+def create_ranking_over_time_figure(ranking, interval='week'):
     """
-    Create a ranking over time figure based on historical data.
+    Create a ranking over time figure
     
     Args:
-        user_id: Current user's ID
-        df_history: DataFrame with all participants' historical data
-        interval: 'week' or 'month' for grouping
+        ranking: Output of utils.ranking_engine.rank_over_time
+        interval: 'week' or 'month', used for the labels
         
     Returns:
-        Plotly figure object
+        Plotly figure object, or None without any periods
     """
-    if df_history.empty:
+    if ranking is None or ranking.empty:
         return None
     
-    # Group data by interval
-    if interval == 'week':
-        df_history['period'] = pd.to_datetime(df_history['date']).dt.to_period('W')
-        period_label = 'Week'
-    else:
-        df_history['period'] = pd.to_datetime(df_history['date']).dt.to_period('M')
-        period_label = 'Month'
-    
-    # Calculate data availability for each participant in each period
-    period_data = df_history.groupby(['period', 'participant_id']).size().reset_index(name='days_with_data')
-    
-    # Get unique periods and participants
-    periods = sorted(period_data['period'].unique())
-    participants = period_data['participant_id'].unique()
-    
-    # Initialize lists for tracking rankings
-    weekly_ranks = []
-    cumulative_ranks = []
-    period_labels = []
-    
-    cumulative_data = {p: 0 for p in participants}
-    
-    for period in periods:
-        # Get data for this period
-        period_df = period_data[period_data['period'] == period]
-        
-        # Calculate weekly ranking
-        period_values = {row['participant_id']: row['days_with_data'] 
-                        for _, row in period_df.iterrows()}
-        
-        # Fill missing participants with 0
-        for p in participants:
-            if p not in period_values:
-                period_values[p] = 0
-        
-        # Calculate rank for current user
-        user_value = period_values.get(user_id, 0)
-        user_rank = sum(1 for v in period_values.values() if v > user_value) + 1
-        weekly_ranks.append(user_rank)
-        
-        # Update cumulative data
-        for p, v in period_values.items():
-            cumulative_data[p] += v
-        
-        # Calculate cumulative rank
-        user_cumulative = cumulative_data[user_id]
-        cumulative_rank = sum(1 for v in cumulative_data.values() if v > user_cumulative) + 1
-        cumulative_ranks.append(cumulative_rank)
-        
-        # Format period label
-        if interval == 'week':
-            period_labels.append(period.start_time.strftime('%b %d'))
-        else:
-            period_labels.append(period.start_time.strftime('%b %Y'))
+    period_label = 'Week' if interval == 'week' else 'Month'
+    period_labels = list(ranking['period_label'])
+    weekly_ranks = list(ranking['period_rank'])
+    cumulative_ranks = list(ranking['cumulative_rank'])
     
     # Create figure
     fig = go.Figure()
@@ -333,7 +281,7 @@ def create_ranking_over_time_figure(user_id, df_history, interval='week'):
     ))
     
     # Calculate y-axis range
-    total_participants = len(participants)
+    total_participants = int(ranking['participants'].iloc[0])
     y_max = total_participants + (5 - (total_participants % 5)) + 1
     
     # Update layout
@@ -0,0 +1,203 @@
+import atexit
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import text
+
+from .database import engine, record_login
+from .logging_config import get_logger
+from .metrics import counter, gauge, histogram, register_collector
+
+logger = get_logger(__name__)
+
+# Set to 'false' to write logins synchronously inside the request
+WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'true').lower() == 'true'
+
+# A batch is written once it is this old or this large, whichever comes first
+WRITE_BEHIND_FLUSH_MS = float(os.environ.get('WRITE_BEHIND_FLUSH_MS', '200'))
+WRITE_BEHIND_MAX_BATCH = int(os.environ.get('WRITE_BEHIND_MAX_BATCH', '500'))
+
+# Beyond this many pending writes, logins are written synchronously again
+WRITE_BEHIND_MAX_QUEUE = int(os.environ.get('WRITE_BEHIND_MAX_QUEUE', '10000'))
+
+QUEUE_DEPTH = gauge('write_behind_queue_depth', 'Writes waiting in the write-behind queue')
+QUEUED = counter('write_behind_queued_total', 'Writes handed to the write-behind queue', ('kind',))
+WRITTEN = counter('write_behind_written_total', 'Writes flushed to the database', ('kind',))
+FAILED = counter('write_behind_failed_total', 'Writes lost because they failed alone too', ('kind',))
+RETRIED = counter('write_behind_retried_total', 'Writes retried one by one after their batch failed', ('kind',))
+SYNC_FALLBACKS = counter('write_behind_sync_fallbacks_total', 'Writes done in the request because the queue was full')
+FLUSH_SECONDS = histogram('write_behind_flush_seconds', 'Time spent writing one batch')
+
+_queue = queue.Queue(maxsize=WRITE_BEHIND_MAX_QUEUE)
+_flusher_lock = threading.Lock()
+# Held while a batch is collected and written, so flush() waits for it
+_batch_lock = threading.Lock()
+_flusher_pid = None
+_stopping = threading.Event()
+
+
+def _collect_queue_depth():
+    QUEUE_DEPTH.set(_queue.qsize())
+
+
+register_collector(_collect_queue_depth)
+
+
+def _write_batch(sessions, user_ids):
+    """
+    Write one batch as one multi-row INSERT and one multi-row UPDATE, in one transaction
+
+    last_login is stamped by the database, like every other timestamp
+    column, at the time the batch is written.
+    """
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        if user_ids:
+            conn.execute(text("""
+                UPDATE users SET last_login = CURRENT_TIMESTAMP
+                WHERE id = ANY(CAST(:user_ids AS integer[]))
+            """), {"user_ids": list(user_ids)})
+        if sessions:
+            # Sent as multi-row VALUES, so each value takes its column's type
+            conn.execute(text("""
+                INSERT INTO sessions (user_id, session_token, ip_address, user_agent, expires_at)
+                VALUES (:user_id, :session_token, :ip_address, :user_agent, :expires_at)
+            """), sessions)
+    FLUSH_SECONDS.observe(time.perf_counter() - start)
+
+
+def _drain(first=None, deadline=None):
+    """Take up to WRITE_BEHIND_MAX_BATCH items, waiting until the deadline for more"""
+    items = [first] if first is not None else []
+    while len(items) < WRITE_BEHIND_MAX_BATCH:
+        timeout = None if deadline is None else deadline - time.monotonic()
+        try:
+            if timeout is None or timeout <= 0:
+                items.append(_queue.get_nowait())
+            else:
+                items.append(_queue.get(timeout=timeout))
+        except queue.Empty:
+            break
+    return items
+
+
+def _flush_items(items):
+    """
+    Write a batch of queued items
+
+    If the batch fails, each write is retried in its own transaction so one
+    bad row (or a transient error) does not lose the rest.
+    """
+    sessions = [payload for kind, payload in items if kind == 'session']
+    user_ids = list(dict.fromkeys(payload for kind, payload in items if kind == 'last_login'))
+    try:
+        _write_batch(sessions, user_ids)
+        WRITTEN.inc(len(sessions), kind='session')
+        WRITTEN.inc(len(user_ids), kind='last_login')
+        return
+    except Exception as e:
+        logger.warning(f"Write-behind batch of {len(items)} writes failed, retrying one by one: {e}")
+
+    writes = [('last_login', [], [user_id]) for user_id in user_ids]
+    writes += [('session', [session], []) for session in sessions]
+    for kind, batch_sessions, batch_user_ids in writes:
+        RETRIED.inc(kind=kind)
+        try:
+            _write_batch(batch_sessions, batch_user_ids)
+            WRITTEN.inc(kind=kind)
+        except Exception as e:
+            logger.error(f"Write-behind {kind} write failed: {e}")
+            FAILED.inc(kind=kind)
+
+
+def _take_batch(first=None, deadline=None):
+    """Drain and write one batch, marking its items done on the queue"""
+    items = _drain(first, deadline)
+    try:
+        if items:
+            _flush_items(items)
+    finally:
+        for _ in items:
+            _queue.task_done()
+
+
+def _flusher_loop():
+    while not _stopping.is_set():
+        try:
+            first = _queue.get(timeout=1)
+        except queue.Empty:
+            continue
+        with _batch_lock:
+            _take_batch(first, time.monotonic() + WRITE_BEHIND_FLUSH_MS / 1000)
+
+
+def _ensure_flusher():
+    """Start the flusher thread once per worker process (also after a fork)"""
+    global _flusher_pid, _queue
+    if _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid != os.getpid():
+            if _flusher_pid is not None:
+                # Forked: whatever the copied queue holds is the parent's to write
+                _queue = queue.Queue(maxsize=WRITE_BEHIND_MAX_QUEUE)
+            _flusher_pid = os.getpid()
+            threading.Thread(target=_flusher_loop, name='write-behind', daemon=True).start()
+
+
+def flush():
+    """
+    Write everything still queued in this worker, e.g. at shutdown
+
+    Also waits for a batch the flusher thread already took off the queue.
+    """
+    with _batch_lock:
+        while not _queue.empty():
+            _take_batch()
+    _queue.join()
+
+
+def _shutdown():
+    _stopping.set()
+    flush()
+
+
+atexit.register(_shutdown)
+
+
+def queue_login(user_id, session_token, ip_address, user_agent, expires_at):
+    """
+    Record a login (last_login and the session row) without waiting for the database
+
+    The writes are batched with other logins by a background thread. When
+    write-behind is disabled or the queue is full they are written right away
+    through record_login instead.
+
+    Args:
+        user_id: User ID
+        session_token: Token of the new session
+        ip_address: Client address
+        user_agent: Client user agent
+        expires_at: When the session expires
+    """
+    if WRITE_BEHIND_ENABLED:
+        _ensure_flusher()
+        session = {
+            "user_id": user_id,
+            "session_token": session_token,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "expires_at": expires_at,
+        }
+        try:
+            _queue.put_nowait(('last_login', user_id))
+            QUEUED.inc(kind='last_login')
+            _queue.put_nowait(('session', session))
+            QUEUED.inc(kind='session')
+            return
+        except queue.Full:
+            SYNC_FALLBACKS.inc()
+            logger.warning("Write-behind queue full, recording login synchronously")
+    record_login(user_id, session_token, ip_address, user_agent, expires_at)
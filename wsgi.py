@@ -6,6 +6,10 @@ import index # noqa: F401
 # Import all callbacks to ensure they're registered
 from callbacks import admin_callbacks, participant_callbacks, supervisor_callbacks  # noqa: F401
 
+# Start loading the data-presence index so the first requests do not wait for it
+from utils.presence_index import warm_presence_index
+warm_presence_index()
+
 
 # Now the application is fully initialized and can be served by Gunicorn
 if __name__ == "__main__":